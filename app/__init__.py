@@ -5,8 +5,9 @@ from config import Config
 from .extensions import db, migrate, login_manager, csrf, bcrypt # mail
 from datetime import date
 # --- Импортируем классы Enum ---
-from app.models import User, TaskStatus, TaskPriority, Comment
+from app.models import TaskStatus, TaskPriority, Comment
 from flask_login import current_user
+from app.utils.server import notification_stream_enabled
 
 def create_app(config_class=Config):
     app = Flask(__name__)
@@ -14,12 +15,20 @@ def create_app(config_class=Config):
 
    
 
+    # Профиль движка БД: параметры пула - до создания движка, PRAGMA SQLite - на каждом соединении
+    from app.utils.db_profiles import configure_engine_options, install_profile
+    configure_engine_options(app)
+
     # Инициализация расширений...
     db.init_app(app)
+    with app.app_context():
+        install_profile(app, db.engine)
     migrate.init_app(app, db)
     login_manager.init_app(app)
     csrf.init_app(app)
     bcrypt.init_app(app)
+    from app.reports.cache import report_cache
+    report_cache.init_app(app)
 
     # Регистрация Blueprints...
     from app.auth import bp as auth_bp
@@ -34,14 +43,16 @@ def create_app(config_class=Config):
     app.register_blueprint(reports_bp, url_prefix='/reports') 
     from app.files import bp as files_bp
     app.register_blueprint(files_bp, url_prefix='/files') 
+    from app.api import bp as api_bp
+    app.register_blueprint(api_bp, url_prefix='/api/v1')
 
     # --- Регистрация CLI команд ---
     cli.register_commands(app)
 
     # Регистрация обработчика пользователя для Flask-Login...
-    @login_manager.user_loader
-    def load_user(user_id):
-        return User.query.get(int(user_id))
+    # Пользователь и роль - одним запросом, в пределах USER_CACHE_TTL - из кэша (app/utils/identity.py)
+    from app.utils.identity import load_user
+    login_manager.user_loader(load_user)
 
     # --- Контекстный процессор ---
     @app.context_processor
@@ -50,6 +61,8 @@ def create_app(config_class=Config):
         unread_notifications_count = 0
         if current_user.is_authenticated: # Только для аутентифицированных
             unread_notifications_count = current_user.new_notifications_count()
+        # Поток уведомлений открывается только под асинхронными воркерами (app/utils/server.py)
+        stream_enabled = current_user.is_authenticated and notification_stream_enabled(current_app)
         # Рассчитываем максимальный размер в МБ один раз здесь
         max_size_mb = 0
         max_length = current_app.config.get('MAX_CONTENT_LENGTH')
@@ -63,6 +76,7 @@ def create_app(config_class=Config):
             TaskStatus=TaskStatus,
             TaskPriority=TaskPriority,
              unread_notifications_count=unread_notifications_count,
+            notification_stream_enabled=stream_enabled,
             Comment=Comment, 
             # Передаем конкретные значения из конфига
             MAX_UPLOAD_SIZE_MB=max_size_mb,
@@ -0,0 +1,167 @@
+# app/api/batch.py
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import insert, select
+from app.extensions import db
+from app.models import (
+    Project, Task, TaskStatus, TaskPriority, TaskStatusEvent, TASK_STATUS_CODES, OPEN_TASK_STATUSES,
+    project_members
+)
+from app.utils.access import accessible_project_ids
+from app.utils.notifications import notify_tasks_assigned
+from app.api.validation import ValidationError, check_fields, enum_member, object_id, optional_id
+
+# Поля задачи, которые меняются пакетно
+BATCH_FIELDS = ('status', 'priority', 'assignee_id')
+
+
+def parse_task_update(item):
+    """Разбирает элемент пакета {"id": ..., "status"?, "priority"?, "assignee_id"?} -> (id, изменения)."""
+    if not isinstance(item, dict):
+        raise ValidationError("Элемент пакета должен быть JSON-объектом.")
+    check_fields(item, ('id',) + BATCH_FIELDS)
+    task_id = object_id(item.get('id'), 'id')
+    changes = {}
+    if 'status' in item:
+        changes['status'] = enum_member(TaskStatus, item, 'status')
+    if 'priority' in item:
+        changes['priority'] = enum_member(TaskPriority, item, 'priority')
+    if 'assignee_id' in item:
+        changes['assignee_id'] = optional_id(item, 'assignee_id')
+    if not changes:
+        raise ValidationError(f"Нет изменений: укажите хотя бы одно из полей {', '.join(BATCH_FIELDS)}.")
+    return task_id, changes
+
+
+def allowed_assignees(pairs):
+    """
+    Какие из пар (project_id, user_id) допустимы: исполнитель - владелец или участник проекта.
+    Два запроса на весь пакет, независимо от числа задач.
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return set()
+    project_ids = {project_id for project_id, _ in pairs}
+    user_ids = {user_id for _, user_id in pairs}
+    owners = db.session.execute(
+        select(Project.id, Project.owner_id).where(Project.id.in_(project_ids))
+    ).all()
+    members = db.session.execute(
+        select(project_members.c.project_id, project_members.c.user_id).where(
+            project_members.c.project_id.in_(project_ids),
+            project_members.c.user_id.in_(user_ids)
+        )
+    ).all()
+    return pairs & ({tuple(row) for row in owners} | {tuple(row) for row in members})
+
+
+def apply_task_updates(user, items, atomic=False):
+    """
+    Применяет пакет изменений задач в текущей транзакции (коммит - на вызывающей стороне).
+
+    Текущие значения читаются одним SELECT, задачи с одинаковым набором изменений обновляются
+    одним UPDATE ... WHERE id IN (...), журнал статусов и уведомления о назначении пишутся
+    bulk INSERT, версии данных проектов увеличиваются одним UPDATE.
+    Права те же, что у страниц проекта: владелец или участник проекта; исполнитель задачи
+    может менять только ее статус (как update_task_status).
+
+    Возвращает (результаты по элементам в порядке запроса, число измененных задач).
+    При atomic=True и хотя бы одной ошибке ничего не применяется.
+    """
+    results = [None] * len(items)
+    parsed = {} # task_id -> (индекс в пакете, изменения)
+    for index, item in enumerate(items):
+        item_id = item.get('id') if isinstance(item, dict) else None
+        try:
+            task_id, changes = parse_task_update(item)
+            if task_id in parsed:
+                raise ValidationError("Задача уже есть в пакете.")
+        except ValidationError as e:
+            results[index] = {'id': item_id, 'ok': False, 'error': str(e)}
+            continue
+        parsed[task_id] = (index, changes)
+
+    rows = {}
+    if parsed:
+        # FOR UPDATE (там, где БД его поддерживает): журнал статусов пишется от прочитанного значения
+        rows = {row.id: row for row in db.session.execute(
+            select(Task.id, Task.title, Task.project_id, Task.status, Task.priority, Task.assignee_id)
+            .where(Task.id.in_(parsed))
+            .with_for_update()
+        )}
+    project_ids = accessible_project_ids(user.id)
+
+    # Права доступа и допустимость исполнителей
+    for task_id, (index, changes) in list(parsed.items()):
+        row = rows.get(task_id)
+        if row is None:
+            error = "Задача не найдена."
+        elif row.project_id not in project_ids and not (row.assignee_id == user.id and set(changes) == {'status'}):
+            error = "Нет доступа к задаче."
+        else:
+            continue
+        results[index] = {'id': task_id, 'ok': False, 'error': error}
+        del parsed[task_id]
+
+    allowed = allowed_assignees(
+        (rows[task_id].project_id, changes['assignee_id'])
+        for task_id, (_, changes) in parsed.items() if changes.get('assignee_id') is not None
+    )
+    for task_id, (index, changes) in list(parsed.items()):
+        assignee_id = changes.get('assignee_id')
+        if assignee_id is not None and (rows[task_id].project_id, assignee_id) not in allowed:
+            results[index] = {'id': task_id, 'ok': False,
+                              'error': "Исполнитель не является участником проекта."}
+            del parsed[task_id]
+
+    if atomic and len(parsed) < len(items):
+        for task_id, (index, _) in parsed.items():
+            results[index] = {'id': task_id, 'ok': False, 'error': "Не применено: в пакете есть ошибки."}
+        return results, 0
+
+    # Фактические изменения (без полей, которые уже имеют нужное значение), сгруппированные
+    # по одинаковому набору: одна группа - один UPDATE
+    groups = defaultdict(list)
+    for task_id, (index, changes) in parsed.items():
+        row = rows[task_id]
+        effective = {field: value for field, value in changes.items() if getattr(row, field) != value}
+        results[index] = {'id': task_id, 'ok': True, 'changed': sorted(effective)}
+        if effective:
+            groups[tuple(sorted(effective.items()))].append(task_id)
+    if not groups:
+        return results, 0
+
+    now = datetime.utcnow()
+    status_events = []
+    assignments = []
+    for changes, task_ids in groups.items():
+        values = dict(changes)
+        if 'status' in values:
+            # То же, что Task.set_status: completed_at выставляется для DONE, сбрасывается для
+            # открытых статусов и сохраняется при архивировании
+            if values['status'] == TaskStatus.DONE:
+                values['completed_at'] = now
+            elif values['status'] in OPEN_TASK_STATUSES:
+                values['completed_at'] = None
+        Task.query.filter(Task.id.in_(task_ids)).update(values, synchronize_session=False)
+
+        for task_id in task_ids:
+            row = rows[task_id]
+            if 'status' in values:
+                status_events.append({
+                    'task_id': task_id, 'project_id': row.project_id, 'user_id': user.id,
+                    'from_status': TASK_STATUS_CODES[row.status],
+                    'to_status': TASK_STATUS_CODES[values['status']],
+                    'created_at': now
+                })
+            if values.get('assignee_id') is not None:
+                assignments.append((row, values['assignee_id']))
+
+    # Массовый UPDATE обходит обработчик after_update модели, поэтому журнал пишем сами
+    if status_events:
+        db.session.execute(insert(TaskStatusEvent), status_events)
+    changed_ids = [task_id for task_ids in groups.values() for task_id in task_ids]
+    Project.bump_data_versions(rows[task_id].project_id for task_id in changed_ids) # Кэш отчетов
+    if assignments:
+        notify_tasks_assigned(assignments, user)
+    return results, len(changed_ids)
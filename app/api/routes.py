@@ -0,0 +1,308 @@
+# app/api/routes.py
+from flask import jsonify, request, abort, current_app, url_for
+from flask_login import login_required, current_user
+from werkzeug.exceptions import HTTPException
+from app.extensions import db
+from app.api import bp
+from app.api.batch import apply_task_updates, allowed_assignees
+from app.api import validation
+from app.api.validation import ValidationError
+from app.models import Project, Task, TaskStatus, TaskPriority
+from app.utils.access import accessible_project_ids, invalidate_project_access
+from app.utils.notifications import notify_tasks_assigned
+from app.utils.pagination import keyset_page_from_request
+import traceback # Для отладки ошибок
+
+# --- JSON API v1 ---
+# Те же права, что у HTML-страниц (сессия Flask-Login); изменяющие запросы передают
+# CSRF-токен в заголовке X-CSRFToken, как и update_task_status.
+
+# Размер страницы списков: ?per_page=, не больше API_MAX_PAGE_SIZE
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 200
+
+# Порядок списков; id в конце - для стабильного курсора
+PROJECT_ORDER = [(Project.created_at, 'desc'), (Project.id, 'desc')]
+# Задачи - по id: новые задачи попадают в конец, синхронизации удобно идти по курсору
+TASK_ORDER = [(Task.id, 'asc')]
+
+PROJECT_FIELDS = ('name', 'description')
+TASK_FIELDS = ('title', 'description', 'status', 'priority', 'assignee_id', 'due_date')
+
+
+# === Ошибки - в JSON, а не HTML-страницей ===
+@bp.errorhandler(HTTPException)
+def handle_http_error(e):
+    return jsonify(error={'code': e.code, 'message': e.description}), e.code
+
+
+# === Сериализация ===
+def _iso(value):
+    return value.isoformat() if value else None
+
+def project_to_dict(project):
+    return {
+        'id': project.id,
+        'name': project.name,
+        'description': project.description,
+        'owner_id': project.owner_id,
+        'created_at': _iso(project.created_at),
+        'data_version': project.data_version,
+    }
+
+def task_to_dict(task):
+    return {
+        'id': task.id,
+        'project_id': task.project_id,
+        'title': task.title,
+        'description': task.description,
+        'status': task.status.name,
+        'priority': task.priority.name,
+        'assignee_id': task.assignee_id,
+        'creator_id': task.creator_id,
+        'due_date': task.due_date.date().isoformat() if task.due_date else None,
+        'created_at': _iso(task.created_at),
+        'completed_at': _iso(task.completed_at),
+    }
+
+def _page_response(page, serialize):
+    return jsonify(items=[serialize(item) for item in page.items],
+                   next_cursor=page.next_cursor, prev_cursor=page.prev_cursor)
+
+
+# === Разбор запроса ===
+def _json_body():
+    if not request.is_json:
+        abort(415, description="Ожидается JSON запрос.")
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        abort(400, description="Тело запроса должно быть JSON-объектом.")
+    return data
+
+def _per_page():
+    per_page = request.args.get('per_page', API_PAGE_SIZE, type=int)
+    return max(1, min(per_page, API_MAX_PAGE_SIZE))
+
+def _get_project(project_id):
+    project = db.session.get(Project, project_id)
+    if project is None:
+        abort(404, description="Проект не найден.")
+    if not current_user.can_access_project(project):
+        abort(403)
+    return project
+
+def _get_task(task_id):
+    task = db.session.get(Task, task_id)
+    if task is None:
+        abort(404, description="Задача не найдена.")
+    if not current_user.can_access_project(task.project):
+        abort(403)
+    return task
+
+def _check_assignee(project_id, assignee_id):
+    if assignee_id is not None and not allowed_assignees([(project_id, assignee_id)]):
+        raise ValidationError("Исполнитель не является участником проекта.")
+
+
+# === Проекты ===
+@bp.route('/projects', methods=['GET'])
+@login_required
+def list_projects():
+    """Проекты, где пользователь владелец или участник (пагинация по курсору ?after= / ?before=)."""
+    query = Project.query.filter(Project.id.in_(accessible_project_ids(current_user.id)))
+    page = keyset_page_from_request(query, PROJECT_ORDER, per_page=_per_page())
+    return _page_response(page, project_to_dict)
+
+
+@bp.route('/projects', methods=['POST'])
+@login_required
+def create_project():
+    data = _json_body()
+    try:
+        validation.check_fields(data, PROJECT_FIELDS)
+        project = Project(name=validation.string(data, 'name', 3, 150, required=True),
+                          description=validation.string(data, 'description', max_length=500),
+                          owner_id=current_user.id)
+    except ValidationError as e:
+        abort(400, description=str(e))
+    try:
+        db.session.add(project)
+        db.session.commit()
+        invalidate_project_access(current_user.id)
+    except Exception as e:
+        db.session.rollback()
+        print(f"API create project error: {e}")
+        traceback.print_exc()
+        abort(500, description="Ошибка при создании проекта.")
+    response = jsonify(project_to_dict(project))
+    response.headers['Location'] = url_for('api.get_project', project_id=project.id)
+    return response, 201
+
+
+@bp.route('/projects/<int:project_id>', methods=['GET'])
+@login_required
+def get_project(project_id):
+    return jsonify(project_to_dict(_get_project(project_id)))
+
+
+@bp.route('/projects/<int:project_id>', methods=['PATCH'])
+@login_required
+def update_project(project_id):
+    project = _get_project(project_id)
+    # ТОЛЬКО Владелец может редактировать проект
+    if project.owner_id != current_user.id:
+        abort(403)
+    data = _json_body()
+    try:
+        validation.check_fields(data, PROJECT_FIELDS)
+        if 'name' in data:
+            project.name = validation.string(data, 'name', 3, 150, required=True)
+        if 'description' in data:
+            project.description = validation.string(data, 'description', max_length=500)
+    except ValidationError as e:
+        abort(400, description=str(e))
+    try:
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"API update project error: {e}")
+        traceback.print_exc()
+        abort(500, description="Ошибка при обновлении проекта.")
+    return jsonify(project_to_dict(project))
+
+
+# === Задачи ===
+@bp.route('/projects/<int:project_id>/tasks', methods=['GET'])
+@login_required
+def list_tasks(project_id):
+    """Задачи проекта по курсору; фильтры ?status=TODO и ?assignee_id=<id> (или 'none')."""
+    project = _get_project(project_id)
+    query = Task.query.filter(Task.project_id == project.id)
+    try:
+        if request.args.get('status'):
+            query = query.filter(Task.status == validation.enum_member(TaskStatus, request.args, 'status'))
+    except ValidationError as e:
+        abort(400, description=str(e))
+    assignee = request.args.get('assignee_id')
+    if assignee == 'none':
+        query = query.filter(Task.assignee_id.is_(None))
+    elif assignee:
+        if not assignee.isdigit():
+            abort(400, description="Параметр 'assignee_id' должен быть числом или 'none'.")
+        query = query.filter(Task.assignee_id == int(assignee))
+    page = keyset_page_from_request(query, TASK_ORDER, per_page=_per_page())
+    return _page_response(page, task_to_dict)
+
+
+@bp.route('/projects/<int:project_id>/tasks', methods=['POST'])
+@login_required
+def create_task(project_id):
+    project = _get_project(project_id)
+    data = _json_body()
+    try:
+        validation.check_fields(data, TASK_FIELDS)
+        assignee_id = validation.optional_id(data, 'assignee_id')
+        _check_assignee(project.id, assignee_id)
+        task = Task(title=validation.string(data, 'title', 3, 200, required=True),
+                    description=validation.string(data, 'description', max_length=1000),
+                    priority=validation.enum_member(TaskPriority, data, 'priority')
+                             if 'priority' in data else TaskPriority.MEDIUM,
+                    due_date=validation.optional_date(data, 'due_date'),
+                    project_id=project.id,
+                    creator_id=current_user.id,
+                    assignee_id=assignee_id)
+        status = validation.enum_member(TaskStatus, data, 'status') if 'status' in data else TaskStatus.TODO
+    except ValidationError as e:
+        abort(400, description=str(e))
+    try:
+        task.set_status(status, current_user.id) # completed_at и журнал переходов
+        db.session.add(task)
+        db.session.flush() # ID для уведомления
+        Project.bump_data_version(project.id) # Инвалидирует кэш отчета проекта
+        notify_tasks_assigned([(task, task.assignee_id)], current_user)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"API create task error: {e}")
+        traceback.print_exc()
+        abort(500, description="Ошибка при создании задачи.")
+    response = jsonify(task_to_dict(task))
+    response.headers['Location'] = url_for('api.get_task', task_id=task.id)
+    return response, 201
+
+
+@bp.route('/tasks/<int:task_id>', methods=['GET'])
+@login_required
+def get_task(task_id):
+    return jsonify(task_to_dict(_get_task(task_id)))
+
+
+@bp.route('/tasks/<int:task_id>', methods=['PATCH'])
+@login_required
+def update_task(task_id):
+    task = _get_task(task_id)
+    data = _json_body()
+    old_assignee_id = task.assignee_id
+    try:
+        validation.check_fields(data, TASK_FIELDS)
+        if 'title' in data:
+            task.title = validation.string(data, 'title', 3, 200, required=True)
+        if 'description' in data:
+            task.description = validation.string(data, 'description', max_length=1000)
+        if 'priority' in data:
+            task.priority = validation.enum_member(TaskPriority, data, 'priority')
+        if 'due_date' in data:
+            task.due_date = validation.optional_date(data, 'due_date')
+        if 'assignee_id' in data:
+            task.assignee_id = validation.optional_id(data, 'assignee_id')
+            if task.assignee_id != old_assignee_id:
+                _check_assignee(task.project_id, task.assignee_id)
+        if 'status' in data:
+            task.set_status(validation.enum_member(TaskStatus, data, 'status'), current_user.id)
+    except ValidationError as e:
+        db.session.rollback() # Отменяем уже присвоенные поля
+        abort(400, description=str(e))
+    try:
+        if task.assignee_id != old_assignee_id:
+            notify_tasks_assigned([(task, task.assignee_id)], current_user)
+        Project.bump_data_version(task.project_id) # Инвалидирует кэш отчета проекта
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"API update task error: {e}")
+        traceback.print_exc()
+        abort(500, description="Ошибка при обновлении задачи.")
+    return jsonify(task_to_dict(task))
+
+
+@bp.route('/tasks/batch', methods=['POST'])
+@login_required
+def batch_update_tasks():
+    """
+    Пакетное изменение статуса, приоритета и исполнителя задач в одной транзакции:
+    {"updates": [{"id": 1, "status": "DONE"}, {"id": 2, "assignee_id": 5, "priority": "HIGH"}, ...],
+     "atomic": false}
+    Ответ - результат по каждому элементу в порядке запроса. Ошибочные элементы пропускаются;
+    с "atomic": true любая ошибка отменяет весь пакет (ответ 422).
+    """
+    data = _json_body()
+    updates = data.get('updates')
+    if not isinstance(updates, list) or not updates:
+        abort(400, description="Поле 'updates' должно быть непустым списком.")
+    max_items = current_app.config.get('API_BATCH_MAX_ITEMS') or 500
+    if len(updates) > max_items:
+        abort(413, description=f"В одном пакете не больше {max_items} элементов.")
+    atomic = bool(data.get('atomic'))
+
+    try:
+        results, updated = apply_task_updates(current_user, updates, atomic=atomic)
+        if atomic and not all(result['ok'] for result in results):
+            db.session.rollback() # Ничего не изменено; снимаем блокировки строк
+            return jsonify(results=results, updated=0), 422
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"API batch update error: {e}")
+        traceback.print_exc()
+        abort(500, description="Ошибка при пакетном обновлении задач.")
+    return jsonify(results=results, updated=updated)
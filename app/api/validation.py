@@ -0,0 +1,60 @@
+# app/api/validation.py
+from datetime import datetime
+
+
+class ValidationError(ValueError):
+    """Некорректное поле в JSON-запросе API; текст ошибки возвращается клиенту."""
+
+
+def check_fields(data, allowed):
+    """Неизвестные поля - ошибка: опечатка в имени поля не должна молча игнорироваться."""
+    unknown = sorted(set(data) - set(allowed))
+    if unknown:
+        raise ValidationError(f"Неизвестные поля: {', '.join(unknown)}.")
+
+
+def string(data, field, min_length=0, max_length=None, required=False):
+    value = data.get(field)
+    if value is None:
+        if required:
+            raise ValidationError(f"Поле '{field}' обязательно.")
+        return None
+    if not isinstance(value, str):
+        raise ValidationError(f"Поле '{field}' должно быть строкой.")
+    value = value.strip()
+    if len(value) < min_length or (max_length is not None and len(value) > max_length):
+        limit = f"от {min_length} до {max_length}" if max_length is not None else f"не меньше {min_length}"
+        raise ValidationError(f"Длина поля '{field}' должна быть {limit} символов.")
+    return value
+
+
+def enum_member(enum_class, data, field):
+    """Значение Enum по имени ('TODO', 'HIGH', ...), как в update_task_status."""
+    name = data.get(field)
+    if not isinstance(name, str) or name not in enum_class.__members__:
+        choices = ', '.join(enum_class.__members__)
+        raise ValidationError(f"Неверное значение поля '{field}': {name!r} (допустимо: {choices}).")
+    return enum_class[name]
+
+
+def object_id(value, field):
+    # bool - подкласс int, но ID им быть не может
+    if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+        raise ValidationError(f"Поле '{field}' должно быть положительным целым числом.")
+    return value
+
+
+def optional_id(data, field):
+    value = data.get(field)
+    return None if value is None else object_id(value, field)
+
+
+def optional_date(data, field):
+    """Дата 'ГГГГ-ММ-ДД' или null; хранится в DateTime-колонке (полночь)."""
+    value = data.get(field)
+    if value is None:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise ValidationError(f"Поле '{field}' должно быть датой в формате ГГГГ-ММ-ДД.")
@@ -7,6 +7,15 @@ from app.auth import bp
 from app.auth.forms import RegistrationForm, LoginForm # Импортируем LoginForm
 from app.models import User
 from app.models import User, Role # Убедимся, что Role импортирован, если нужен
+from app.utils.passwords import PasswordHashingBusy # Переполнение очереди хеширования паролей
+
+# Через сколько секунд повторить вход/регистрацию, если очередь хеширования заполнена
+BUSY_RETRY_AFTER_SECONDS = 5
+
+def _busy_response(template, **context):
+    # Волна входов: отвечаем сразу, а не держим воркер в очереди
+    flash('Сервис перегружен входами, повторите попытку через несколько секунд.', 'warning')
+    return render_template(template, **context), 503, {'Retry-After': str(BUSY_RETRY_AFTER_SECONDS)}
 
 @bp.route('/register', methods=['GET', 'POST'])
 def register():
@@ -17,7 +26,10 @@ def register():
     if form.validate_on_submit():
         # При создании User вызовется __init__, который назначит роль 'User'
         user = User(username=form.username.data, email=form.email.data)
-        user.set_password(form.password.data)
+        try:
+            user.set_password(form.password.data)
+        except PasswordHashingBusy:
+            return _busy_response('register.html', title='Регистрация', form=form)
         try:
             db.session.add(user)
             db.session.commit()
@@ -45,10 +57,25 @@ def login():
         user = User.query.filter_by(email=form.email.data).first()
 
         # Проверяем, найден ли пользователь и совпадает ли пароль
-        if user is None or not user.check_password(form.password.data):
+        try:
+            password_ok = user is not None and user.check_password(form.password.data)
+        except PasswordHashingBusy:
+            return _busy_response('login.html', title='Вход', form=form)
+        if not password_ok:
             flash('Неверный email или пароль.', 'danger') # Сообщение об ошибке
             return redirect(url_for('auth.login')) # Перезагружаем страницу входа
 
+        # Стоимость bcrypt изменилась (BCRYPT_LOG_ROUNDS) - пересчитываем хеш, пока пароль известен
+        if user.password_needs_rehash():
+            try:
+                user.set_password(form.password.data)
+                db.session.commit()
+            except PasswordHashingBusy:
+                pass # Пересчитаем при следующем входе
+            except Exception as e:
+                db.session.rollback()
+                print(f"Password rehash error (User ID {user.id}): {e}")
+
         # Если все верно, логиним пользователя
         # form.remember_me.data содержит True/False из чекбокса
         login_user(user, remember=form.remember_me.data)
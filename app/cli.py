@@ -1,8 +1,19 @@
 # app/cli.py
 import click
 from flask.cli import with_appcontext # Помогает с контекстом приложения
-from app.models import User, Role    # Импортируем модели
+from app.models import User, Role, Project # Импортируем модели
 from app.extensions import db        # Импортируем db из extensions
+from app.utils.notifications import rebuild_unread_counts
+from app.utils.query_plans import check_query_plans
+from app.reports.rollups import rollup_all_status_events
+from app.files.uploads import cleanup_stale_uploads
+from app.files.blobs import dedupe_legacy_files, collect_garbage, sweep_unreferenced_files, reshard_blobs
+from app.files.thumbnails import generate_missing_thumbnails, thumbnails_enabled
+from app.utils.search import rebuild_search_index, search_supported
+from app.utils.passwords import benchmark as benchmark_passwords, log_rounds
+from app.utils.bulk_import import import_file, IMPORT_KINDS, IMPORT_FORMATS, DEFAULT_CHUNK_SIZE
+from app.projects.export import stream_export, EXPORT_KINDS, EXPORT_FORMATS
+from app.utils.db_profiles import engine_report
 
 # Эта функция будет регистрировать все наши команды
 def register_commands(app):
@@ -53,3 +64,217 @@ def register_commands(app):
             db.session.rollback() # Откатываем транзакцию в случае ошибки
             click.echo(f"Ошибка при назначении роли: {e}")
             click.echo("Изменения не были сохранены.")
+
+
+    @app.cli.command('repair-notification-counts')
+    def repair_notification_counts():
+        """Rebuilds denormalized unread notification counters for all users."""
+        click.echo("Пересчет счетчиков непрочитанных уведомлений...")
+        try:
+            fixed = rebuild_unread_counts()
+            click.echo(f"Готово. Исправлено пользователей: {fixed}.")
+        except Exception as e:
+            db.session.rollback()
+            click.echo(f"Ошибка при пересчете счетчиков: {e}")
+
+    @app.cli.command('check-query-plans')
+    @click.option('--verbose', '-v', is_flag=True, help='Print full plans for every query.')
+    def check_query_plans_command(verbose):
+        """Runs EXPLAIN on hot queries and fails if any does a full table scan."""
+        failed = 0
+        for name, plan, scanned_tables in check_query_plans():
+            if scanned_tables:
+                failed += 1
+                click.echo(f"[FAIL] {name}: полный скан таблиц {', '.join(scanned_tables)}")
+            else:
+                click.echo(f"[ OK ] {name}")
+            if verbose or scanned_tables:
+                for line in plan:
+                    click.echo(f"         {line}")
+        if failed:
+            click.echo(f"Запросов с полным сканированием: {failed}. Примените миграции ('flask db upgrade').")
+            raise SystemExit(1)
+        click.echo("Все горячие запросы используют индексы.")
+
+    @app.cli.command('rollup-status-events')
+    @click.option('--batch-size', default=50000, show_default=True, help='Max events per transaction.')
+    def rollup_status_events_command(batch_size):
+        """Folds new task status events into daily per-project rollups."""
+        click.echo("Обработка новых событий смены статусов...")
+        try:
+            total = rollup_all_status_events(
+                batch_size,
+                progress=lambda done, mark: click.echo(f"  обработано {done}, водяной знак {mark}")
+            )
+            click.echo(f"Готово. Обработано событий: {total}.")
+        except Exception as e:
+            db.session.rollback()
+            click.echo(f"Ошибка при обработке событий: {e}")
+
+    @app.cli.command('cleanup-uploads')
+    @click.option('--hours', type=int, default=None, help='Max age of an unfinished upload (default: UPLOAD_PARTIAL_TTL_HOURS).')
+    def cleanup_uploads_command(hours):
+        """Removes unfinished chunked uploads with no recent activity."""
+        if hours is None:
+            hours = app.config.get('UPLOAD_PARTIAL_TTL_HOURS', 24)
+        removed = cleanup_stale_uploads(hours)
+        click.echo(f"Удалено незавершенных загрузок: {removed}.")
+
+    @app.cli.command('set-upload-limit')
+    @click.argument('project_id', type=int)
+    @click.argument('megabytes', type=int)
+    def set_upload_limit(project_id, megabytes):
+        """Sets the per-file upload limit for a project in MB (0 - use UPLOAD_MAX_FILE_SIZE)."""
+        project = db.session.get(Project, project_id)
+        if not project:
+            click.echo(f"Ошибка: Проект с ID {project_id} не найден.")
+            return
+        try:
+            project.max_upload_size = megabytes * 1024 * 1024 if megabytes > 0 else None
+            db.session.commit()
+            click.echo(f"Лимит файла для проекта '{project.name}': "
+                       f"{f'{megabytes} МБ' if megabytes > 0 else 'по умолчанию'}.")
+        except Exception as e:
+            db.session.rollback()
+            click.echo(f"Ошибка при изменении лимита: {e}")
+
+    @app.cli.command('dedupe-files')
+    @click.option('--batch-size', default=200, show_default=True, help='Files per transaction.')
+    def dedupe_files_command(batch_size):
+        """Moves legacy uploads into content-addressed storage, storing duplicates once."""
+        click.echo("Перенос файлов в хранилище по содержимому...")
+        try:
+            migrated, missing, freed = dedupe_legacy_files(
+                batch_size,
+                progress=lambda done, lost, saved: click.echo(f"  перенесено {done}, освобождено {saved // 1024} КБ")
+            )
+            click.echo(f"Готово. Перенесено: {migrated}, освобождено: {freed // 1024} КБ.")
+            if missing:
+                click.echo(f"Файлов нет на диске: {missing} (записи оставлены без изменений).")
+        except Exception as e:
+            db.session.rollback()
+            click.echo(f"Ошибка при переносе файлов: {e}")
+
+    @app.cli.command('gc-blobs')
+    @click.option('--grace-seconds', default=3600, show_default=True, help='Keep blobs touched more recently.')
+    def gc_blobs_command(grace_seconds):
+        """Deletes stored file contents that no File references any more."""
+        removed = collect_garbage(grace_seconds=grace_seconds)
+        swept = sweep_unreferenced_files(grace_seconds=grace_seconds)
+        click.echo(f"Удалено содержимого без ссылок: {removed + swept}.")
+
+    @app.cli.command('migrate-storage')
+    @click.option('--batch-size', default=500, show_default=True, help='Files per batch.')
+    def migrate_storage_command(batch_size):
+        """Moves existing uploads into the sharded storage layout; safe to run while serving."""
+        click.echo("Шаг 1: файлы старого формата -> хранилище по содержимому...")
+        try:
+            migrated, missing, freed = dedupe_legacy_files(batch_size)
+            click.echo(f"  перенесено {migrated}, освобождено {freed // 1024} КБ, нет на диске {missing}.")
+        except Exception as e:
+            db.session.rollback()
+            click.echo(f"Ошибка при переносе файлов: {e}")
+            return
+        click.echo("Шаг 2: плоская папка blobs -> подкаталоги...")
+        moved = reshard_blobs(batch_size, progress=lambda done: click.echo(f"  перенесено {done}"))
+        click.echo(f"Готово. Перенесено в подкаталоги: {moved}.")
+
+    @app.cli.command('generate-thumbnails')
+    @click.option('--batch-size', default=500, show_default=True, help='Files per batch.')
+    def generate_thumbnails_command(batch_size):
+        """Builds missing previews for image attachments uploaded earlier."""
+        if not thumbnails_enabled():
+            click.echo("Превью отключены: установите Pillow (pip install Pillow) и проверьте THUMBNAILS_ENABLED.")
+            return
+        built, failed = generate_missing_thumbnails(
+            batch_size,
+            progress=lambda done, errors: click.echo(f"  построено {done}, ошибок {errors}")
+        )
+        click.echo(f"Готово. Построено превью: {built}, ошибок: {failed}.")
+
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index_command():
+        """Recreates the full-text search index from tasks, comments and projects."""
+        if not search_supported():
+            click.echo("Полнотекстовый поиск (FTS5) доступен только для SQLite.")
+            return
+        try:
+            total = rebuild_search_index()
+            click.echo(f"Готово. Записей в поисковом индексе: {total}.")
+        except Exception as e:
+            click.echo(f"Ошибка при перестроении индекса: {e}")
+
+    @app.cli.command('bench-passwords')
+    @click.option('--rounds', '-r', type=int, multiple=True, help='bcrypt cost to test (repeatable; default: BCRYPT_LOG_ROUNDS).')
+    @click.option('--seconds', default=2.0, show_default=True, help='Duration of each measurement.')
+    @click.option('--threads', type=int, default=None, help='Parallel threads (default: CPU count).')
+    def bench_passwords_command(rounds, seconds, threads):
+        """Measures password checks (logins) per second per core for bcrypt costs."""
+        click.echo(f"Текущая стоимость BCRYPT_LOG_ROUNDS: {log_rounds()}")
+        for cost in rounds or (log_rounds(),):
+            ms, per_core, total, used_threads = benchmark_passwords(cost, seconds, threads)
+            click.echo(f"  стоимость {cost}: {ms:.1f} мс на вход, {per_core:.1f} входов/с на ядро, "
+                       f"{total:.1f} входов/с в {used_threads} потоках")
+
+    @app.cli.command('import')
+    @click.argument('kind', type=click.Choice(IMPORT_KINDS))
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'fmt', type=click.Choice(IMPORT_FORMATS), default=None, help='Input format (default: by file extension).')
+    @click.option('--chunk-size', default=DEFAULT_CHUNK_SIZE, show_default=True, help='Records per transaction.')
+    @click.option('--default-user', default=None, help='Email or username for unknown owners, creators and authors.')
+    @click.option('--restart', is_flag=True, help='Ignore the saved checkpoint and read the file from the start.')
+    def import_command(kind, path, fmt, chunk_size, default_user, restart):
+        """Streams projects, tasks or comments from a CSV/JSONL export of another tracker.
+
+        Import projects first, then tasks, then comments: records refer to each other by
+        their ids in the source system. An interrupted import resumes from its checkpoint.
+        """
+        def report(stats):
+            click.echo(f"  записей {stats.start_record + stats.read}, добавлено {stats.inserted}, "
+                       f"уже было {stats.existing}, отклонено {stats.rejected} ({stats.rate:.0f} записей/с)")
+        try:
+            stats = import_file(kind, path, fmt=fmt, chunk_size=chunk_size, default_user=default_user,
+                                restart=restart, progress=report)
+        except Exception as e:
+            db.session.rollback()
+            click.echo(f"Ошибка при импорте: {e}")
+            raise SystemExit(1)
+        if stats.start_record:
+            click.echo(f"Продолжено с записи {stats.start_record + 1}.")
+        click.echo(f"Готово. Добавлено: {stats.inserted}, уже было: {stats.existing}, отклонено: {stats.rejected}.")
+        for record_no, reason in stats.problems:
+            click.echo(f"  запись {record_no}: {reason}")
+        if stats.rejected > len(stats.problems):
+            click.echo(f"  ... и еще {stats.rejected - len(stats.problems)}")
+
+    @app.cli.command('export')
+    @click.argument('project_id', type=int)
+    @click.option('--kind', type=click.Choice(EXPORT_KINDS), default='tasks', show_default=True, help='What to export.')
+    @click.option('--format', 'fmt', type=click.Choice(EXPORT_FORMATS), default='csv', show_default=True, help='Output format.')
+    @click.option('--output', '-o', type=click.File('w', encoding='utf-8', lazy=True), default='-', help='Output file (default: stdout).')
+    def export_command(project_id, kind, fmt, output):
+        """Streams a project's tasks (with assignee names and comment counts) or comments as CSV/JSONL."""
+        project = db.session.get(Project, project_id)
+        if not project:
+            click.echo(f"Ошибка: Проект с ID {project_id} не найден.", err=True)
+            raise SystemExit(1)
+        for block in stream_export(project.id, kind, fmt):
+            output.write(block)
+
+    @app.cli.command('db-info')
+    def db_info_command():
+        """Shows the database engine profile and the settings actually in effect."""
+        try:
+            rows = engine_report(app, db.engine)
+        except Exception as e:
+            click.echo(f"Ошибка подключения к БД: {e}")
+            raise SystemExit(1)
+        mismatched = 0
+        for setting, requested, effective in rows:
+            line = f"  {setting:<16} {effective}"
+            if requested is not None and str(requested).upper() != str(effective).upper():
+                line += f"   (задано: {requested})"
+                mismatched += 1
+            click.echo(line)
+        if mismatched:
+            click.echo(f"Не применено параметров профиля: {mismatched}.")
@@ -1,10 +1,16 @@
 # app/dashboard/routes.py
-from flask import render_template, flash, abort, redirect, url_for, request
+from flask import render_template, flash, abort, redirect, url_for, request, current_app, Response, stream_with_context
 from flask_login import login_required, current_user, logout_user # Добавили logout_user
 from app.dashboard import bp
 from app.extensions import db # Импорт db
 from app.utils.decorators import admin_required # Декоратор админа
 from app.models import User, Notification,  Role # Модели
+from app.utils.notifications import mark_all_read # Пометка прочитанными одним UPDATE
+from app.utils.pagination import keyset_page_from_request # Пагинация по курсору
+from app.utils.notification_stream import notification_events, latest_notification_id # Поток SSE
+from app.utils.server import notification_stream_enabled # Поток только под асинхронными воркерами
+from app.utils.passwords import PasswordHashingBusy # Переполнение очереди хеширования паролей
+from app.utils.identity import invalidate_user # Кэш пользователя для Flask-Login
 from app.dashboard.forms import ProfileEditForm, ChangePasswordForm, AdminEditUserForm  # Формы
 from datetime import datetime # Для отметки времени прочтения уведомлений
 import traceback # Для отладки
@@ -36,6 +42,7 @@ def edit_profile():
         try:
             current_user.username = form.username.data
             current_user.email = form.email.data
+            invalidate_user(current_user.id)
             db.session.commit()
             flash('Ваш профиль успешно обновлен.', 'success')
             return redirect(url_for('dashboard.profile')) # Возвращаемся на страницу профиля
@@ -59,14 +66,22 @@ def change_password():
     form = ChangePasswordForm()
     if form.validate_on_submit():
         # Проверяем текущий пароль
-        if current_user.check_password(form.current_password.data):
+        try:
+            password_ok = current_user.check_password(form.current_password.data)
+        except PasswordHashingBusy:
+            flash('Сервис перегружен, повторите попытку через несколько секунд.', 'warning')
+            return render_template('change_password.html', title='Смена пароля', form=form), 503
+        if password_ok:
             try:
                 current_user.set_password(form.new_password.data)
+                invalidate_user(current_user.id)
                 db.session.commit()
                 flash('Пароль успешно изменен. Пожалуйста, войдите снова.', 'success')
                 # Выходим из системы после смены пароля для безопасности
                 logout_user()
                 return redirect(url_for('auth.login'))
+            except PasswordHashingBusy:
+                flash('Сервис перегружен, повторите попытку через несколько секунд.', 'warning')
             except Exception as e:
                 db.session.rollback()
                 flash(f'Ошибка при смене пароля: {e}', 'danger')
@@ -87,28 +102,56 @@ def settings():
 @bp.route('/notifications')
 @login_required
 def notifications():
-    """Отображает уведомления пользователя и помечает их как прочитанные."""
-    # Получаем недавние уведомления пользователя, сортируем по убыванию даты
-    # Можно добавить пагинацию для большого количества уведомлений
-    user_notifications = current_user.notifications.order_by(Notification.timestamp.desc()).all()
-
-    # Помечаем все непрочитанные как прочитанные
-    updated = False
-    try:
-        # Эффективнее сделать одним update, если записей много, но так проще для примера
-        for notification in current_user.notifications.filter_by(is_read=False):
-             notification.is_read = True
-             updated = True
-        if updated:
+    """Отображает уведомления пользователя (по страницам) и помечает их как прочитанные."""
+    # Лента по курсору (timestamp, id): каждая страница - ограниченный диапазон индекса
+    page = keyset_page_from_request(
+        Notification.query.filter_by(user_id=current_user.id),
+        [(Notification.timestamp, 'desc'), (Notification.id, 'desc')],
+        per_page=20
+    )
+
+    # Помечаем все непрочитанные как прочитанные одним UPDATE (только если они есть)
+    if current_user.new_notifications_count() > 0:
+        # Отсоединяем элементы страницы, чтобы коммит их не "протушил":
+        # шаблон покажет, какие уведомления были новыми, без повторной загрузки каждого
+        for notification in page.items:
+            db.session.expunge(notification)
+        try:
+            mark_all_read(current_user.id)
             db.session.commit()
-    except Exception as e:
-        db.session.rollback()
-        print(f"Error marking notifications as read for user {current_user.id}: {e}")
-        traceback.print_exc()
-        # Можно добавить flash сообщение об ошибке
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error marking notifications as read for user {current_user.id}: {e}")
+            traceback.print_exc()
+            # Можно добавить flash сообщение об ошибке
 
     return render_template('notifications.html', title='Уведомления',
-                           notifications=user_notifications)
+                           notifications=page.items, page=page)
+
+
+# --- Поток уведомлений (Server-Sent Events) ---
+@bp.route('/notifications/stream')
+@login_required
+def notifications_stream():
+    """Долгоживущий SSE-поток новых уведомлений и счетчика непрочитанных."""
+    if not notification_stream_enabled(current_app):
+        # Синхронные воркеры: поток занял бы воркер целиком. На ответ 204 EventSource не переподключается
+        return '', 204
+    user_id = current_user.id
+    # Переподключение продолжает с последнего полученного события, новое - с текущего момента
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    if last_event_id is None:
+        last_event_id = latest_notification_id(user_id)
+
+    events = notification_events(
+        user_id, last_event_id,
+        poll_seconds=current_app.config.get('NOTIFICATION_STREAM_POLL_SECONDS', 15),
+        max_seconds=current_app.config.get('NOTIFICATION_STREAM_MAX_SECONDS', 600)
+    )
+    response = Response(stream_with_context(events), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no' # Nginx не должен буферизовать поток
+    return response
 
 
 # --- Раздел Администрирования (Только для Админов) ---
@@ -140,6 +183,7 @@ def edit_user(user_id):
             user.email = form.email.data
             user.role = form.role.data # QuerySelectField возвращает объект Role
             user.is_active = form.is_active.data
+            invalidate_user(user.id)
             db.session.commit()
             flash(f'Данные пользователя {user.username} обновлены.', 'success')
             return redirect(url_for('dashboard.list_users'))
@@ -168,6 +212,7 @@ def toggle_user_active(user_id):
         return redirect(url_for('dashboard.list_users'))
     try:
         user.is_active = not user.is_active
+        invalidate_user(user.id)
         db.session.commit()
         status = "активирован" if user.is_active else "деактивирован"
         flash(f'Пользователь {user.username} был {status}.', 'success')
@@ -17,6 +17,8 @@ login_manager.login_view = 'auth.login'
 # Сообщение, которое будет показано пользователю при перенаправлении на логин
 login_manager.login_message = 'Пожалуйста, войдите в систему, чтобы получить доступ к этой странице.'
 login_manager.login_message_category = 'info' # Категория для flash сообщения
+# JSON API (/api/v1) не перенаправляет на страницу входа, а отвечает 401
+login_manager.blueprint_login_views['api'] = None
 
 csrf = CSRFProtect()
 bcrypt = Bcrypt()
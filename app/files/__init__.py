@@ -3,4 +3,5 @@ from flask import Blueprint
 
 bp = Blueprint('files', __name__)
 
-from app.files import routes
\ No newline at end of file
+from app.files import routes
+from app.files import blobs # Регистрирует обработчики счетчика ссылок на содержимое
\ No newline at end of file
@@ -0,0 +1,146 @@
+# app/files/archive.py
+import os
+import zipfile
+from flask import current_app
+from sqlalchemy import select, or_, literal, union_all
+from app.extensions import db
+from app.models import File, Task, Project
+from app.files.storage import get_storage
+from app.files.uploads import client_filename
+
+# Уже сжатые форматы кладем в архив без повторного сжатия (ZIP_STORED): экономим CPU, размер почти тот же
+STORED_EXTENSIONS = {'zip', 'rar', '7z', 'gz', 'png', 'jpg', 'jpeg', 'gif', 'webp',
+                     'docx', 'xlsx', 'pptx', 'pdf', 'mp3', 'mp4', 'mov', 'avi'}
+# Сколько строк метаданных читаем из БД за раз
+ARCHIVE_BATCH_SIZE = 500
+# Блок чтения файла; вместе с буфером архива это и есть потребление памяти
+ARCHIVE_BLOCK_SIZE = 256 * 1024
+
+
+def accessible_files_query(user_id, project_id=None, task_id=None, after_id=0, limit=ARCHIVE_BATCH_SIZE):
+    """
+    Порция файлов задачи или проекта, которые пользователь может скачать (те же правила,
+    что в download_file). Фильтр прав - в SQL, а не по одному файлу в Python.
+    Две ветки UNION ALL (файлы задач и файлы проекта) идут каждая по своему индексу.
+    """
+    columns = [File.id, File.original_filename, File.storage_filename, File.content_hash, File.uploaded_at]
+
+    # Файлы задач: владелец проекта, исполнитель задачи или загрузивший
+    task_files = select(*columns, File.task_id, Task.title) \
+        .join(Task, File.task_id == Task.id) \
+        .join(Project, Project.id == Task.project_id) \
+        .where(File.id > after_id,
+               or_(Project.owner_id == user_id, Task.assignee_id == user_id, File.user_id == user_id))
+    if task_id is not None:
+        task_files = task_files.where(File.task_id == task_id)
+    if project_id is not None:
+        task_files = task_files.where(Task.project_id == project_id)
+    if project_id is None:
+        return task_files.order_by(File.id).limit(limit)
+
+    # Файлы самого проекта (без задачи): владелец проекта или загрузивший
+    project_files = select(*columns, File.task_id, literal(None).label('title')) \
+        .join(Project, Project.id == File.project_id) \
+        .where(File.id > after_id, File.task_id.is_(None), File.project_id == project_id,
+               or_(Project.owner_id == user_id, File.user_id == user_id))
+    batch = union_all(task_files, project_files).subquery()
+    return select(batch).order_by(batch.c.id).limit(limit)
+
+
+class _StreamBuffer:
+    """Минимальный файловый объект для ZipFile: копит записанное, генератор забирает и очищает."""
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _folder_name(title):
+    """
+    Название задачи как имя папки: кириллица сохраняется (zipfile пишет имена в UTF-8),
+    заменяются только разделители пути и управляющие символы.
+    """
+    title = ''.join(char if char.isprintable() and char not in '/\\' else '_' for char in title or '')
+    return title.strip() or 'task'
+
+
+def _archive_name(row, used_names, by_task):
+    # Имя в БД пришло от клиента (в том числе до нормализации при загрузке): только базовое имя,
+    # чтобы запись архива не начиналась с '/' и не содержала '..' при распаковке
+    name = client_filename(row.original_filename) or client_filename(row.storage_filename) or f'file-{row.id}'
+    if by_task and row.task_id:
+        folder = f"{row.task_id} - {_folder_name(row.title)}"
+        name = f"{folder}/{name}"
+    # Одинаковые имена в одной папке: "файл (2).pdf"
+    base, ext = os.path.splitext(name)
+    candidate, counter = name, 2
+    while candidate in used_names:
+        candidate = f"{base} ({counter}){ext}"
+        counter += 1
+    used_names.add(candidate)
+    return candidate
+
+
+def stream_zip(user_id, project_id=None, task_id=None):
+    """
+    Генератор байтов ZIP-архива. Архив пишется в неперематываемый поток (размеры - в data descriptor),
+    поэтому нет ни временного файла, ни архива в памяти: в каждый момент в памяти один блок файла
+    и одна порция метаданных. Метаданные читаются порциями по id, соединение с БД между порциями
+    возвращается в пул. В архиве проекта файлы разложены по папкам задач.
+    """
+    by_task = project_id is not None
+    storage = get_storage()
+    buffer = _StreamBuffer()
+    used_names = set()
+    last_id = 0
+    with zipfile.ZipFile(buffer, mode='w', allowZip64=True) as archive:
+        while True:
+            rows = db.session.execute(
+                accessible_files_query(user_id, project_id, task_id, after_id=last_id)
+            ).all()
+            db.session.close()
+            if not rows:
+                break
+            for row in rows:
+                last_id = row.id
+                try:
+                    source = storage.open(row.content_hash) if row.content_hash \
+                        else open(_legacy_path(row.storage_filename), 'rb')
+                except FileNotFoundError:
+                    print(f"ZIP Archive: file {row.id} not found in storage, skipped")
+                    continue
+                info = zipfile.ZipInfo(_archive_name(row, used_names, by_task),
+                                       date_time=(row.uploaded_at.timetuple()[:6] if row.uploaded_at
+                                                  else (1980, 1, 1, 0, 0, 0)))
+                ext = os.path.splitext(row.original_filename or '')[1].lstrip('.').lower()
+                info.compress_type = zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+                with source, archive.open(info, mode='w', force_zip64=True) as dest:
+                    for block in iter(lambda: source.read(ARCHIVE_BLOCK_SIZE), b''):
+                        dest.write(block)
+                        data = buffer.drain()
+                        if data:
+                            yield data
+                data = buffer.drain() # Data descriptor после файла
+                if data:
+                    yield data
+    # Центральный каталог записывается при закрытии архива
+    yield buffer.drain()
+
+
+def _legacy_path(storage_filename):
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], storage_filename)
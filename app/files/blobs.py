@@ -0,0 +1,274 @@
+# app/files/blobs.py
+import hashlib
+import os
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import event, inspect, select
+from app.extensions import db
+from app.models import Blob, File
+from app.files.storage import get_storage
+
+# Размер блока при чтении/хешировании файлов
+HASH_BLOCK_SIZE = 64 * 1024
+# Свежие файлы содержимого не удаляем: их может прямо сейчас переиспользовать параллельная загрузка
+BLOB_GC_GRACE_SECONDS = 3600
+
+
+class BlobCorrupted(Exception):
+    """Содержимое на диске не совпадает с SHA-256 из БД."""
+
+
+# --- Запись содержимого ---
+def hash_file(path):
+    """SHA-256 и размер файла (чтение блоками)."""
+    hasher = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            hasher.update(block)
+            size += len(block)
+    return hasher.hexdigest(), size
+
+def save_stream(stream):
+    """
+    Сохраняет поток во временный файл, хешируя по мере записи.
+    Возвращает (путь к временному файлу, sha256, размер); дальше - store_blob.
+    """
+    folder = os.path.join(current_app.config['UPLOAD_FOLDER'], '.partial')
+    os.makedirs(folder, exist_ok=True)
+    tmp_path = os.path.join(folder, f'{uuid.uuid4().hex}.tmp')
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, 'wb') as f:
+            for block in iter(lambda: stream.read(HASH_BLOCK_SIZE), b''):
+                f.write(block)
+                hasher.update(block)
+                size += len(block)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return tmp_path, hasher.hexdigest(), size
+
+def discard_stream(tmp_path):
+    """Удаляет временный файл save_stream, который не пойдет в хранилище (например, больше лимита)."""
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+def store_blob(tmp_path, content_hash):
+    """
+    Переносит временный файл в хранилище содержимого. Если такое содержимое уже есть,
+    временный файл просто удаляется - хранится одна копия.
+    """
+    get_storage().save(content_hash, tmp_path)
+
+
+# --- Счетчик ссылок ---
+def _upsert_reference(connection, content_hash, size, delta):
+    table = Blob.__table__
+    if delta > 0:
+        if connection.dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        statement = insert(table).values(hash=content_hash, size=size or 0, ref_count=delta,
+                                         created_at=datetime.utcnow())
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=['hash'], set_={'ref_count': table.c.ref_count + delta}
+        ))
+    else:
+        connection.execute(table.update().where(table.c.hash == content_hash)
+                           .values(ref_count=table.c.ref_count + delta))
+
+def add_reference(content_hash, size, delta=1):
+    """Увеличивает счетчик ссылок на содержимое в текущей транзакции (создает Blob при необходимости)."""
+    _upsert_reference(db.session.connection(), content_hash, size, delta)
+
+
+# Счетчик меняется в том же flush, что и запись File, - при любом пути удаления
+# (удаление файла, каскад от задачи или проекта)
+@event.listens_for(File, 'after_insert')
+def _file_inserted(mapper, connection, file):
+    if file.content_hash:
+        _upsert_reference(connection, file.content_hash, file.size, 1)
+
+@event.listens_for(File, 'after_delete')
+def _file_deleted(mapper, connection, file):
+    session = inspect(file).session
+    if file.content_hash:
+        _upsert_reference(connection, file.content_hash, file.size, -1)
+        if session is not None:
+            session.info.setdefault('released_blobs', set()).add(file.content_hash)
+    elif session is not None:
+        # Старый файл без дедупликации удаляем с диска после коммита
+        session.info.setdefault('released_paths', set()).add(file.filepath)
+
+
+# --- Удаление содержимого без ссылок ---
+@event.listens_for(db.session, 'after_commit')
+def _release_after_commit(session):
+    hashes = session.info.pop('released_blobs', None)
+    paths = session.info.pop('released_paths', None)
+    for path in paths or ():
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    if hashes:
+        try:
+            collect_garbage(hashes)
+        except Exception as e:
+            # Не мешаем ответу: остатки уберет flask gc-blobs
+            print(f"Blob GC Error: {e}")
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('released_blobs', None)
+    session.info.pop('released_paths', None)
+
+def collect_garbage(hashes=None, grace_seconds=BLOB_GC_GRACE_SECONDS):
+    """
+    Удаляет Blob со счетчиком 0 и их файлы. hashes=None - проверить все такие Blob.
+    Строка удаляется условно (ref_count <= 0), поэтому параллельно появившаяся ссылка ее сохранит.
+    Возвращает число удаленных файлов.
+    """
+    table = Blob.__table__
+    storage = get_storage()
+    removed = 0
+    with db.engine.begin() as connection:
+        query = select(table.c.hash).where(table.c.ref_count <= 0)
+        if hashes is not None:
+            query = query.where(table.c.hash.in_(list(hashes)))
+        candidates = connection.execute(query).scalars().all()
+    cutoff = time.time() - grace_seconds
+    for content_hash in candidates:
+        try:
+            if storage.modified(content_hash) > cutoff:
+                continue
+        except FileNotFoundError:
+            pass
+        with db.engine.begin() as connection:
+            deleted = connection.execute(
+                table.delete().where(table.c.hash == content_hash, table.c.ref_count <= 0)
+            ).rowcount
+        if deleted and storage.exists(content_hash):
+            storage.delete(content_hash)
+            removed += 1
+    return removed
+
+def sweep_unreferenced_files(grace_seconds=BLOB_GC_GRACE_SECONDS):
+    """Удаляет содержимое без строки Blob (например, после неудачного коммита загрузки)."""
+    storage = get_storage()
+    known = set(db.session.execute(select(Blob.hash)).scalars())
+    cutoff = time.time() - grace_seconds
+    orphans = [key for key in storage.keys() if key not in known]
+    removed = 0
+    for key in orphans:
+        try:
+            if storage.modified(key) > cutoff:
+                continue
+        except FileNotFoundError:
+            continue
+        storage.delete(key)
+        removed += 1
+    return removed
+
+
+# --- Проверка при скачивании ---
+# Проверенное содержимое запоминаем по (хеш, размер, mtime), чтобы не перечитывать его на каждом скачивании
+_verified = {}
+_verified_lock = threading.Lock()
+_VERIFIED_MAX = 4096
+
+def verify_blob(content_hash):
+    """Сверяет содержимое с его SHA-256; при расхождении - BlobCorrupted, при отсутствии - FileNotFoundError."""
+    storage = get_storage()
+    key = (content_hash, storage.size(content_hash), storage.modified(content_hash))
+    with _verified_lock:
+        if key in _verified:
+            return
+    hasher = hashlib.sha256()
+    with storage.open(content_hash) as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            hasher.update(block)
+    actual_hash = hasher.hexdigest()
+    if actual_hash != content_hash:
+        raise BlobCorrupted(f'ожидался {content_hash}, получен {actual_hash}')
+    with _verified_lock:
+        if len(_verified) >= _VERIFIED_MAX:
+            _verified.clear()
+        _verified[key] = True
+
+
+# --- Перенос старых файлов в хранилище содержимого ---
+def dedupe_legacy_files(batch_size=200, progress=None):
+    """
+    Переводит файлы без content_hash на хранение по содержимому порциями по batch_size.
+    Содержимое сначала жестко связывается (или копируется) и передается в хранилище, затем коммит,
+    и только после него удаляется старый файл - прерывание на любом шаге ничего не теряет.
+    Возвращает (перенесено, отсутствует на диске, освобождено байт).
+    """
+    storage = get_storage()
+    staging = os.path.join(current_app.config['UPLOAD_FOLDER'], '.partial')
+    os.makedirs(staging, exist_ok=True)
+    migrated = missing = freed = 0
+    last_id = 0
+    while True:
+        files = File.query.filter(File.content_hash.is_(None), File.id > last_id) \
+            .order_by(File.id).limit(batch_size).all()
+        if not files:
+            break
+        legacy_paths = []
+        for file in files:
+            last_id = file.id
+            legacy_path = file.filepath
+            if not os.path.exists(legacy_path):
+                missing += 1
+                continue
+            content_hash, size = hash_file(legacy_path)
+            if storage.exists(content_hash):
+                freed += size
+            else:
+                staged_path = os.path.join(staging, f'{uuid.uuid4().hex}.tmp')
+                try:
+                    os.link(legacy_path, staged_path)
+                except OSError:
+                    shutil.copy2(legacy_path, staged_path)
+                storage.save(content_hash, staged_path)
+            file.content_hash = content_hash
+            file.size = size
+            add_reference(content_hash, size)
+            legacy_paths.append(legacy_path)
+            migrated += 1
+        db.session.commit()
+        for legacy_path in legacy_paths:
+            os.remove(legacy_path)
+        if progress:
+            progress(migrated, missing, freed)
+    return migrated, missing, freed
+
+
+# --- Перенос в разбитую по каталогам раскладку ---
+def reshard_blobs(batch_size=500, progress=None):
+    """
+    Переносит содержимое из плоской папки blobs в подкаталоги порциями, на работающем сервисе:
+    пока ключ не перенесен, хранилище читает его по старому пути. Возвращает число перенесенных.
+    """
+    storage = get_storage()
+    if not hasattr(storage, 'reshard'):
+        return 0
+    moved = 0
+    while True:
+        keys = storage.flat_keys(batch_size)
+        if not keys:
+            return moved
+        for key in keys:
+            storage.reshard(key)
+        moved += len(keys)
+        if progress:
+            progress(moved)
@@ -0,0 +1,50 @@
+# app/files/downloads.py
+import os
+from urllib.parse import quote
+from flask import current_app, request, send_file
+from werkzeug.utils import send_file as werkzeug_send_file
+
+# Режимы отдачи файла фронтовым прокси (после проверки прав в приложении)
+OFFLOAD_X_ACCEL = 'x-accel'       # Nginx: X-Accel-Redirect на internal-location
+OFFLOAD_X_SENDFILE = 'x-sendfile' # Apache mod_xsendfile, lighttpd: X-Sendfile с абсолютным путем
+
+
+def send_stored_file(path, download_name, etag=None):
+    """
+    Отдает сохраненный файл как вложение.
+    При FILE_OFFLOAD_MODE передачу выполняет прокси: воркер отвечает только заголовками.
+    Иначе файл отдается приложением с поддержкой Range (докачка, перемотка видео)
+    и условных запросов (ETag/Last-Modified -> 304 без тела).
+    etag - SHA-256 содержимого, если известен (стабилен между серверами, в отличие от mtime).
+    """
+    mode = (current_app.config.get('FILE_OFFLOAD_MODE') or '').lower()
+    if mode in (OFFLOAD_X_ACCEL, OFFLOAD_X_SENDFILE):
+        return _offloaded_response(path, download_name, etag, mode)
+
+    response = send_file(path, as_attachment=True, download_name=download_name,
+                         conditional=True, etag=etag if etag else True)
+    response.cache_control.private = True # Файлы доступны только после проверки прав
+    return response
+
+
+def _offloaded_response(path, download_name, etag, mode):
+    # Заголовки (Content-Type, Content-Disposition, ETag, Last-Modified) формирует Werkzeug,
+    # тело и Range обрабатывает прокси
+    response = werkzeug_send_file(path, request.environ, as_attachment=True, download_name=download_name,
+                                  conditional=False, etag=etag if etag else True, use_x_sendfile=True)
+    response.cache_control.private = True
+    # 304 отвечаем сами, без обращения к прокси за файлом
+    response = response.make_conditional(request.environ, accept_ranges=False)
+    sendfile_path = response.headers.pop('X-Sendfile', None)
+    if response.status_code == 304 or sendfile_path is None:
+        return response
+
+    # Длину тела выставит прокси (с учетом Range)
+    response.headers.pop('Content-Length', None)
+    if mode == OFFLOAD_X_ACCEL:
+        relative_path = os.path.relpath(sendfile_path, current_app.config['UPLOAD_FOLDER'])
+        prefix = current_app.config.get('FILE_OFFLOAD_PREFIX', '/protected-uploads/').rstrip('/')
+        response.headers['X-Accel-Redirect'] = f"{prefix}/{quote(relative_path.replace(os.sep, '/'))}"
+    else:
+        response.headers['X-Sendfile'] = sendfile_path
+    return response
@@ -1,14 +1,20 @@
 # app/files/routes.py
-import os
 from flask import (
     render_template, redirect, url_for, flash, request, abort,
-    current_app, send_from_directory
+    current_app, jsonify, send_file, Response, stream_with_context
 )
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename 
 from app.extensions import db
 from app.files import bp
 from app.models import File, Task, Project # Импортируем модели
+from app.files.uploads import ChunkedUpload, UploadError, client_filename # Порционная загрузка
+from app.files.blobs import save_stream, discard_stream, store_blob, verify_blob, BlobCorrupted # Хранение по содержимому
+from app.files.downloads import send_stored_file # Отдача файла (Range, 304, X-Accel-Redirect)
+from app.files.storage import get_storage # Бэкенд хранилища содержимого
+from app.files.archive import accessible_files_query, stream_zip # ZIP-архив на лету
+from app.files.thumbnails import schedule_thumbnail, find_thumbnail, is_previewable, thumbnails_enabled # Превью картинок
+from urllib.parse import quote
 
 # --- Загрузка Файла (Привязка к ЗАДАЧЕ) ---
 @bp.route('/upload/task/<int:task_id>', methods=['POST'])
@@ -30,6 +36,7 @@ def upload_task_file(task_id):
     file = request.files['file']
 
     # Если пользователь не выбрал файл, браузер может отправить пустое имя
+    file.filename = client_filename(file.filename) # Имя без пути, даже если клиент его прислал
     if file.filename == '':
         flash('Файл не выбран.', 'warning')
         return redirect(request.referrer or url_for('projects.view_project', project_id=project.id))
@@ -38,28 +45,35 @@ def upload_task_file(task_id):
     if file and File.is_allowed(file.filename):
         original_fname = file.filename
         storage_fname = File.generate_storage_filename(original_fname)
-        filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], storage_fname)
 
         try:
-            # Создаем папку uploads, если её нет
-            os.makedirs(current_app.config['UPLOAD_FOLDER'], exist_ok=True)
-            # Сохраняем файл на диск
-            file.save(filepath)
+            # Сохраняем файл на диск с подсчетом SHA-256; одинаковое содержимое хранится один раз
+            tmp_path, content_hash, size = save_stream(file.stream)
+            # Тот же лимит проекта, что и при порционной загрузке (flask set-upload-limit)
+            limit = project.upload_size_limit()
+            if limit and size > limit:
+                discard_stream(tmp_path)
+                flash(f'Файл больше допустимого для проекта размера ({round(limit / 1024 / 1024)} МБ).', 'warning')
+                return redirect(url_for('projects.view_project', project_id=project.id))
+            store_blob(tmp_path, content_hash)
 
-            # Создаем запись в БД
+            # Создаем запись в БД (счетчик ссылок на содержимое увеличится в том же коммите)
             db_file = File(storage_filename=storage_fname,
                            original_filename=original_fname,
                            user_id=current_user.id,
-                           task_id=task.id) # Привязываем к задаче
+                           task_id=task.id, # Привязываем к задаче
+                           size=size,
+                           content_hash=content_hash)
             db.session.add(db_file)
             db.session.commit()
+            # Превью строится в фоне, ответ его не ждет
+            schedule_thumbnail(content_hash, original_fname)
             flash(f'Файл "{original_fname}" успешно загружен.', 'success')
 
         except Exception as e:
             db.session.rollback()
-            # Удаляем частично загруженный файл, если он есть
-            if os.path.exists(filepath):
-                os.remove(filepath)
+            # Содержимое может быть общим с другими файлами - не удаляем его здесь,
+            # содержимое без ссылок уберет flask gc-blobs
             flash(f'Ошибка при загрузке файла: {e}', 'danger')
             print(f"File Upload Error: {e}") # Логирование ошибки
             import traceback
@@ -74,42 +88,234 @@ def upload_task_file(task_id):
     return redirect(url_for('projects.view_project', project_id=project.id))
 
 
+# --- Порционная (возобновляемая) загрузка файла к задаче ---
+# Протокол: init -> PUT порций (тело запроса пишется на диск потоком) -> complete.
+# Прерванную загрузку можно продолжить: GET возвращает принятое смещение.
+
+def _upload_error(message, status=400, **extra):
+    return jsonify(error=message, **extra), status
+
+def _get_own_upload(upload_id):
+    upload = ChunkedUpload.load(upload_id)
+    # Чужие загрузки не раскрываем
+    if upload is None or upload.meta.get('user_id') != current_user.id:
+        abort(404)
+    return upload
+
+@bp.route('/uploads/task/<int:task_id>', methods=['POST'])
+@login_required
+def init_chunked_upload(task_id):
+    task = Task.query.get_or_404(task_id)
+    project = task.project
+
+    # Права те же, что и у обычной загрузки: владелец проекта или исполнитель задачи
+    if project.owner_id != current_user.id and task.assignee_id != current_user.id:
+        abort(403)
+
+    data = request.get_json(silent=True) or {}
+    filename = client_filename(data.get('filename')) # Только имя, без пути клиента
+    size = data.get('size')
+    expected_hash = (data.get('sha256') or '').lower() or None
+
+    if not filename:
+        return _upload_error('Файл не выбран.')
+    if not File.is_allowed(filename):
+        allowed_ext_str = ", ".join(current_app.config.get('ALLOWED_EXTENSIONS', []))
+        return _upload_error(f'Недопустимый тип файла. Разрешены: {allowed_ext_str}')
+    if not isinstance(size, int) or size < 0:
+        return _upload_error('Не указан размер файла.')
+    limit = project.upload_size_limit()
+    if limit and size > limit:
+        return _upload_error(f'Файл больше допустимого для проекта размера ({round(limit / 1024 / 1024)} МБ).',
+                             413, limit=limit)
+
+    try:
+        upload = ChunkedUpload.create(filename, size, task.id, project.id, current_user.id, expected_hash)
+    except OSError as e:
+        print(f"Chunked Upload Init Error: {e}")
+        return _upload_error('Не удалось начать загрузку.', 500)
+    return jsonify(upload.to_dict()), 201
+
+@bp.route('/uploads/<upload_id>', methods=['GET'])
+@login_required
+def chunked_upload_status(upload_id):
+    return jsonify(_get_own_upload(upload_id).to_dict())
+
+@bp.route('/uploads/<upload_id>', methods=['PUT'])
+@login_required
+def append_chunk(upload_id):
+    upload = _get_own_upload(upload_id)
+    offset = request.headers.get('Upload-Offset', type=int)
+    if offset is None:
+        return _upload_error('Не указан заголовок Upload-Offset.')
+    try:
+        # request.stream - тело без буферизации в памяти
+        new_offset = upload.append(request.stream, offset, request.content_length)
+    except UploadError as e:
+        return _upload_error(str(e), e.status, offset=e.offset if e.offset is not None else upload.offset)
+    return jsonify(offset=new_offset, size=upload.size)
+
+@bp.route('/uploads/<upload_id>/complete', methods=['POST'])
+@login_required
+def complete_chunked_upload(upload_id):
+    upload = _get_own_upload(upload_id)
+    if not upload.is_complete:
+        return _upload_error('Файл загружен не полностью.', 409, offset=upload.offset)
+
+    task = Task.query.get_or_404(upload.meta['task_id'])
+    project = task.project
+    if project.owner_id != current_user.id and task.assignee_id != current_user.id:
+        abort(403)
+
+    content_hash = upload.digest()
+    expected_hash = upload.meta.get('sha256')
+    if expected_hash and expected_hash != content_hash:
+        upload.discard()
+        return _upload_error('Контрольная сумма не совпадает, загрузите файл заново.', 422)
+
+    original_fname = upload.meta['filename']
+    storage_fname = File.generate_storage_filename(original_fname)
+    try:
+        store_blob(upload.data_path, content_hash)
+        upload.discard()
+        db_file = File(storage_filename=storage_fname,
+                       original_filename=original_fname,
+                       user_id=current_user.id,
+                       task_id=task.id,
+                       size=upload.size,
+                       content_hash=content_hash)
+        db.session.add(db_file)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Chunked Upload Complete Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return _upload_error(f'Ошибка при сохранении файла: {e}', 500)
+
+    schedule_thumbnail(content_hash, original_fname) # Превью строится в фоне
+    flash(f'Файл "{original_fname}" успешно загружен.', 'success')
+    return jsonify(file_id=db_file.id, sha256=content_hash,
+                   redirect=url_for('projects.view_project', project_id=project.id, _anchor=f'task-{task.id}'))
+
+@bp.route('/uploads/<upload_id>', methods=['DELETE'])
+@login_required
+def abort_chunked_upload(upload_id):
+    _get_own_upload(upload_id).discard()
+    return '', 204
+
+
 # --- Скачивание Файла ---
+def _can_access_file(file_record):
+    # Доступ имеет владелец проекта, исполнитель задачи (если файл к задаче), или загрузивший пользователь
+    if file_record.task: # Файл привязан к задаче
+        project = file_record.task.project
+        return project.owner_id == current_user.id or \
+               file_record.task.assignee_id == current_user.id or \
+               file_record.user_id == current_user.id
+    if file_record.project: # Файл привязан к проекту (позже)
+        # Или участники проекта позже
+        return file_record.project.owner_id == current_user.id or file_record.user_id == current_user.id
+    # Файл не привязан, но загружен пользователем (возможно, такое не должно быть разрешено)
+    return file_record.user_id == current_user.id
+
 @bp.route('/download/<int:file_id>')
 @login_required
 def download_file(file_id):
     file_record = File.query.get_or_404(file_id)
 
     # --- Проверка прав ---
-    # Доступ имеет владелец проекта, исполнитель задачи (если файл к задаче), или загрузивший пользователь
-    can_access = False
-    if file_record.task: # Файл привязан к задаче
-        project = file_record.task.project
-        if project.owner_id == current_user.id or \
-           file_record.task.assignee_id == current_user.id or \
-           file_record.user_id == current_user.id:
-           can_access = True
-    elif file_record.project: # Файл привязан к проекту (позже)
-        project = file_record.project
-        if project.owner_id == current_user.id or \
-           file_record.user_id == current_user.id: # Или участники проекта позже
-           can_access = True
-    elif file_record.user_id == current_user.id: # Файл не привязан, но загружен пользователем
-         can_access = True # Возможно, такое не должно быть разрешено
-
-    if not can_access:
+    if not _can_access_file(file_record):
         abort(403)
 
-    # Используем send_from_directory для безопасной отправки файла
+    # Путь строится из хеша или сгенерированного имени, а не из пользовательского ввода
+    filepath = file_record.filepath
     try:
-        return send_from_directory(
-            current_app.config['UPLOAD_FOLDER'],
-            file_record.storage_filename,
-            as_attachment=True, # Скачать как вложение
-            download_name=file_record.original_filename # Использовать оригинальное имя
+        # Содержимое сверяется с SHA-256 из БД (результат проверки кэшируется)
+        if file_record.content_hash and current_app.config.get('FILE_VERIFY_ON_DOWNLOAD', True):
+            verify_blob(file_record.content_hash)
+        if filepath is None:
+            # Бэкенд без локальных файлов - отдаем поток
+            return send_file(get_storage().open(file_record.content_hash), as_attachment=True,
+                             download_name=file_record.original_filename, etag=file_record.content_hash)
+        # Range, ETag/Last-Modified или передача прокси (FILE_OFFLOAD_MODE)
+        return send_stored_file(
+            filepath,
+            download_name=file_record.original_filename, # Использовать оригинальное имя
+            etag=file_record.content_hash
         )
     except FileNotFoundError:
         abort(404, description="Файл не найден на сервере.")
+    except BlobCorrupted as e:
+        print(f"File Integrity Error (File ID {file_record.id}): {e}")
+        abort(500, description="Файл поврежден на сервере.")
+
+
+# --- Превью картинок ---
+@bp.app_template_global()
+def thumbnail_url(file):
+    """URL превью для шаблона или None, если превью для файла не бывает."""
+    if not file.content_hash or not is_previewable(file.original_filename) or not thumbnails_enabled():
+        return None
+    return url_for('files.file_thumbnail', file_id=file.id)
+
+@bp.route('/thumbnail/<int:file_id>')
+@login_required
+def file_thumbnail(file_id):
+    file_record = File.query.get_or_404(file_id)
+    if not _can_access_file(file_record):
+        abort(403)
+    if not file_record.content_hash or not is_previewable(file_record.original_filename) \
+            or not thumbnails_enabled():
+        abort(404)
+
+    path = find_thumbnail(file_record.content_hash)
+    if path is None:
+        # Еще строится или вытеснено из кэша - ставим в очередь, браузер получит превью в следующий раз
+        schedule_thumbnail(file_record.content_hash, file_record.original_filename)
+        abort(404)
+    # Содержимое файла не меняется, поэтому превью кэшируется браузером надолго и без перепроверки
+    response = send_file(path, mimetype='image/jpeg', conditional=True, etag=file_record.content_hash,
+                         max_age=current_app.config.get('THUMBNAIL_MAX_AGE', 365 * 24 * 3600))
+    response.cache_control.public = False # Только после проверки прав - общим кэшам не отдаем
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    return response
+
+
+# --- Скачивание всех файлов задачи или проекта одним ZIP ---
+def _zip_response(archive_name, project_id=None, task_id=None):
+    # Пустой архив не отдаем: проверяем, что есть хотя бы один доступный файл
+    first = db.session.execute(
+        accessible_files_query(current_user.id, project_id=project_id, task_id=task_id, limit=1)
+    ).first()
+    if first is None:
+        abort(404, description="Нет файлов, доступных для скачивания.")
+
+    response = Response(stream_with_context(stream_zip(current_user.id, project_id=project_id, task_id=task_id)),
+                        mimetype='application/zip')
+    ascii_name = secure_filename(archive_name) or 'files.zip'
+    response.headers['Content-Disposition'] = (
+        f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(archive_name)}"
+    )
+    response.headers['X-Accel-Buffering'] = 'no' # Архив идет потоком, без буферизации прокси
+    return response
+
+@bp.route('/archive/task/<int:task_id>')
+@login_required
+def download_task_archive(task_id):
+    task = Task.query.get_or_404(task_id)
+    if not current_user.can_access_project(task.project):
+        abort(403)
+    return _zip_response(f"{task.title}.zip", task_id=task.id)
+
+@bp.route('/archive/project/<int:project_id>')
+@login_required
+def download_project_archive(project_id):
+    project = Project.query.get_or_404(project_id)
+    if not current_user.can_access_project(project):
+        abort(403)
+    return _zip_response(f"{project.name}.zip", project_id=project.id)
 
 
 # --- Удаление Файла ---
@@ -139,19 +345,13 @@ def delete_file(file_id):
         abort(403)
 
     original_fname = file_record.original_filename
-    filepath = file_record.filepath
 
     try:
-        # Сначала удаляем запись из БД
+        # Удаляем запись из БД; физический файл удаляется после коммита,
+        # когда на его содержимое не остается ссылок (см. app/files/blobs.py)
         db.session.delete(file_record)
-        db.session.commit() # Коммитим удаление из БД
-
-        # Затем удаляем физический файл
-        if os.path.exists(filepath):
-            os.remove(filepath)
-            flash(f'Файл "{original_fname}" успешно удален.', 'success')
-        else:
-            flash(f'Запись о файле "{original_fname}" удалена, но сам файл не найден на сервере.', 'warning')
+        db.session.commit()
+        flash(f'Файл "{original_fname}" успешно удален.', 'success')
 
     except Exception as e:
         # Если удаление из БД прошло, но удаление файла - нет, откатывать БД не нужно
@@ -0,0 +1,185 @@
+# app/files/storage.py
+import os
+from abc import ABC, abstractmethod
+from importlib import import_module
+from flask import current_app
+
+
+class StorageBackend(ABC):
+    """
+    Интерфейс хранилища содержимого файлов. Ключ - SHA-256 содержимого (см. app/files/blobs.py),
+    поэтому объекты неизменяемы: запись по существующему ключу ничего не меняет.
+    Свой бэкенд подключается через FILE_STORAGE_BACKEND = 'модуль:Класс';
+    конструктор получает объект app. Бэкенд без любого из абстрактных методов
+    не создается (TypeError в get_storage), а не падает позже на первом обращении.
+    """
+
+    @abstractmethod
+    def save(self, key, source_path):
+        """Забирает временный файл source_path под ключом key (если ключ уже есть - удаляет source_path)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def open(self, key):
+        """Бинарный файловый объект для чтения; FileNotFoundError, если ключа нет."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, key):
+        """Удаляет ключ; отсутствие ключа не ошибка."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def exists(self, key):
+        raise NotImplementedError
+
+    @abstractmethod
+    def size(self, key):
+        raise NotImplementedError
+
+    @abstractmethod
+    def modified(self, key):
+        """Время последней записи/использования ключа (unix time) - для отсрочки сборки мусора."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def keys(self):
+        """Все хранимые ключи (для сверки с БД)."""
+        raise NotImplementedError
+
+    def local_path(self, key):
+        """Путь на локальном диске, если он есть (для send_file и X-Sendfile), иначе None."""
+        return None
+
+
+class LocalShardedStorage(StorageBackend):
+    """
+    Локальный диск с разбиением по подкаталогам: ключ abcdef... хранится как root/ab/cd/abcdef...
+    (depth уровней по width символов), так что в одном каталоге остаются сотни файлов, а не сотни тысяч.
+    Ключи в старой плоской раскладке (root/abcdef...) читаются, пока их не перенесет
+    flask migrate-storage.
+    """
+
+    def __init__(self, app, root=None, depth=2, width=2):
+        self.root = root or os.path.join(app.config['UPLOAD_FOLDER'], 'blobs')
+        self.depth = app.config.get('FILE_STORAGE_SHARD_DEPTH', depth)
+        self.width = width
+
+    # --- Пути ---
+    def sharded_path(self, key):
+        parts = [key[i * self.width:(i + 1) * self.width] for i in range(self.depth)]
+        return os.path.join(self.root, *parts, key)
+
+    def flat_path(self, key):
+        return os.path.join(self.root, key)
+
+    def _locate(self, key):
+        path = self.sharded_path(key)
+        if os.path.exists(path):
+            return path
+        flat = self.flat_path(key)
+        if os.path.exists(flat):
+            return flat
+        return None
+
+    # --- Интерфейс ---
+    def save(self, key, source_path):
+        existing = self._locate(key)
+        if existing:
+            os.remove(source_path)
+            os.utime(existing) # Отмечаем свежее использование (см. BLOB_GC_GRACE_SECONDS)
+            return
+        path = self.sharded_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(source_path, path)
+
+    def open(self, key):
+        try:
+            return open(self.sharded_path(key), 'rb')
+        except FileNotFoundError:
+            return open(self.flat_path(key), 'rb')
+
+    def delete(self, key):
+        for path in (self.sharded_path(key), self.flat_path(key)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def exists(self, key):
+        return self._locate(key) is not None
+
+    def size(self, key):
+        path = self._locate(key)
+        if path is None:
+            raise FileNotFoundError(key)
+        return os.path.getsize(path)
+
+    def modified(self, key):
+        path = self._locate(key)
+        if path is None:
+            raise FileNotFoundError(key)
+        return os.path.getmtime(path)
+
+    def keys(self):
+        if not os.path.isdir(self.root):
+            return
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                yield name
+
+    def local_path(self, key):
+        # Путь, по которому файл есть сейчас; для нового ключа - будущий путь в шардах
+        return self._locate(key) or self.sharded_path(key)
+
+    # --- Перенос из плоской раскладки ---
+    def flat_keys(self, limit):
+        """До limit ключей, которые еще лежат в корне без разбиения."""
+        if not os.path.isdir(self.root):
+            return []
+        keys = []
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    keys.append(entry.name)
+                    if len(keys) >= limit:
+                        break
+        return keys
+
+    def reshard(self, key):
+        """
+        Переносит ключ из плоской раскладки в шарды без окна недоступности:
+        сначала жесткая ссылка на новом месте (читатели сразу находят его), затем удаление старого имени.
+        """
+        flat = self.flat_path(key)
+        path = self.sharded_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            os.link(flat, path)
+        except FileExistsError:
+            pass
+        except OSError:
+            os.replace(flat, path) # ФС без жестких ссылок - атомарное переименование
+            return
+        os.remove(flat)
+
+
+BACKENDS = {
+    'local': LocalShardedStorage,
+}
+
+
+def get_storage():
+    """Бэкенд хранилища текущего приложения (создается один раз на приложение)."""
+    storage = current_app.extensions.get('file_storage')
+    if storage is None:
+        name = current_app.config.get('FILE_STORAGE_BACKEND') or 'local'
+        if name in BACKENDS:
+            backend_class = BACKENDS[name]
+        else:
+            module_name, _, class_name = name.partition(':')
+            backend_class = getattr(import_module(module_name), class_name)
+            if not (isinstance(backend_class, type) and issubclass(backend_class, StorageBackend)):
+                raise TypeError(f"FILE_STORAGE_BACKEND '{name}' должен наследовать StorageBackend.")
+        storage = current_app.extensions['file_storage'] = backend_class(current_app)
+    return storage
@@ -0,0 +1,234 @@
+# app/files/thumbnails.py
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor, wait
+from flask import current_app
+from sqlalchemy import select
+from app.extensions import db
+from app.models import File
+from app.files.storage import get_storage
+
+try:
+    from PIL import Image, ImageOps
+except ImportError: # Pillow не установлен - превью просто не строятся (см. README)
+    Image = ImageOps = None
+
+# Расширения, для которых строим превью
+THUMBNAIL_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+# Кэш превью внутри UPLOAD_FOLDER: .thumbs/ab/<sha256>-<размер>.jpg
+THUMBS_DIRNAME = '.thumbs'
+# После вытеснения кэш уменьшается до этой доли лимита, чтобы не чистить его на каждом новом превью
+CACHE_PRUNE_RATIO = 0.9
+
+
+def is_previewable(filename):
+    ext = filename.rsplit('.', 1)[-1].lower() if filename and '.' in filename else ''
+    return ext in THUMBNAIL_EXTENSIONS
+
+def thumbnails_enabled():
+    return Image is not None and current_app.config.get('THUMBNAILS_ENABLED', True)
+
+def cache_root():
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], THUMBS_DIRNAME)
+
+def thumbnail_path(content_hash, size=None):
+    """Путь превью. Ключ - хеш содержимого: одинаковые картинки делят одно превью, содержимое не меняется."""
+    size = size or current_app.config.get('THUMBNAIL_SIZE', 160)
+    return os.path.join(cache_root(), content_hash[:2], f'{content_hash}-{size}.jpg')
+
+
+# --- Построение (в дочернем процессе) ---
+def render_thumbnail(source_path, dest_path, size):
+    """
+    Уменьшает картинку до квадрата size x size (с сохранением пропорций) и пишет JPEG атомарно.
+    Выполняется в пуле процессов: декодирование и масштабирование занимают CPU и не должны
+    держать GIL воркера, который обслуживает запросы. Возвращает размер превью в байтах.
+    """
+    with Image.open(source_path) as image:
+        image.draft('RGB', (size, size)) # JPEG декодируется сразу в уменьшенном масштабе
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size))
+        if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+            # Прозрачность - на белый фон (JPEG без альфа-канала)
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        tmp_path = f'{dest_path}.{uuid.uuid4().hex}.tmp'
+        image.save(tmp_path, 'JPEG', quality=80, optimize=True)
+    os.replace(tmp_path, dest_path)
+    return os.path.getsize(dest_path)
+
+
+# --- Пул процессов (свой в каждом воркере, создается при первом превью) ---
+_executor = None
+_executor_lock = threading.Lock()
+_pending = set()    # Превью, которые сейчас строятся (путь назначения)
+_failed = set()     # Картинки, которые не удалось разобрать, - не пытаемся снова на каждом запросе
+_FAILED_MAX = 4096
+_cache_bytes = {}   # Оценка размера кэша по корню; точное значение пересчитывается при вытеснении
+
+
+def _get_executor(workers):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: дочерние процессы не наследуют потоки, соединения с БД и сокеты воркера
+            _executor = ProcessPoolExecutor(max_workers=workers,
+                                            mp_context=multiprocessing.get_context('spawn'))
+        return _executor
+
+def _reset_executor():
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def schedule_thumbnail(content_hash, filename):
+    """
+    Ставит построение превью в очередь пула и сразу возвращается (запрос не ждет обработки).
+    Возвращает Future или None, если превью не нужно, уже есть или уже строится.
+    Вызывается после коммита загрузки - превью строится только для сохраненного файла.
+    """
+    if not content_hash or not is_previewable(filename) or not thumbnails_enabled():
+        return None
+    config = current_app.config
+    size = config.get('THUMBNAIL_SIZE', 160)
+    dest_path = thumbnail_path(content_hash, size)
+    if os.path.exists(dest_path) or dest_path in _failed:
+        return None
+    source_path = get_storage().local_path(content_hash)
+    if source_path is None or not os.path.exists(source_path):
+        return None # Бэкенд без локальных файлов - превью не строим
+
+    with _executor_lock:
+        if dest_path in _pending:
+            return None
+        _pending.add(dest_path)
+    root = cache_root()
+    max_bytes = config.get('THUMBNAIL_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+    try:
+        future = _get_executor(config.get('THUMBNAIL_WORKERS', 2)).submit(
+            render_thumbnail, source_path, dest_path, size)
+    except Exception as e:
+        # Пул сломан (дочерний процесс убит) - пересоздадим его при следующем превью
+        with _executor_lock:
+            _pending.discard(dest_path)
+        _reset_executor()
+        print(f"Thumbnail Schedule Error: {e}")
+        return None
+    future.add_done_callback(lambda done: _thumbnail_done(done, dest_path, root, max_bytes))
+    return future
+
+def _thumbnail_done(future, dest_path, root, max_bytes):
+    with _executor_lock:
+        _pending.discard(dest_path)
+    try:
+        written = future.result()
+    except Exception as e:
+        if len(_failed) >= _FAILED_MAX:
+            _failed.clear()
+        _failed.add(dest_path)
+        print(f"Thumbnail Error ({os.path.basename(dest_path)}): {e}")
+        return
+    _account(root, written, max_bytes)
+
+
+# --- Ограниченный кэш на диске ---
+def find_thumbnail(content_hash):
+    """Путь готового превью или None. Обращение отмечается в mtime - по нему вытесняются давно не нужные."""
+    path = thumbnail_path(content_hash)
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+def _account(root, written, max_bytes):
+    with _executor_lock:
+        if root not in _cache_bytes:
+            _cache_bytes[root] = None
+        current = _cache_bytes[root]
+        _cache_bytes[root] = None if current is None else current + written
+    if current is None or current + written > max_bytes:
+        prune_cache(root, max_bytes)
+
+def prune_cache(root, max_bytes):
+    """
+    Удаляет давно не использованные превью (по mtime), пока кэш больше max_bytes * CACHE_PRUNE_RATIO.
+    Размер считается заново по диску: у каждого воркера своя оценка, истина - на диске.
+    Возвращает число удаленных файлов.
+    """
+    entries = []
+    total = 0
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+    removed = 0
+    if total > max_bytes:
+        target = max_bytes * CACHE_PRUNE_RATIO
+        entries.sort()
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+    with _executor_lock:
+        _cache_bytes[root] = total
+    return removed
+
+
+# --- Превью для уже загруженных файлов ---
+def generate_missing_thumbnails(batch_size=500, progress=None):
+    """
+    Строит недостающие превью для всех картинок (например, после установки Pillow или смены THUMBNAIL_SIZE).
+    Одинаковое содержимое обрабатывается один раз. Возвращает (построено, ошибок).
+    """
+    if not thumbnails_enabled():
+        return 0, 0
+    built = failed = 0
+    last_id = 0
+    seen = set()
+    while True:
+        rows = db.session.execute(
+            select(File.id, File.content_hash, File.original_filename)
+            .where(File.id > last_id, File.content_hash.isnot(None))
+            .order_by(File.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        futures = []
+        for row in rows:
+            last_id = row.id
+            if row.content_hash in seen:
+                continue
+            seen.add(row.content_hash)
+            future = schedule_thumbnail(row.content_hash, row.original_filename)
+            if future is not None:
+                futures.append(future)
+        # Ждем порцию целиком: очередь пула не растет без ограничений
+        for future in wait(futures).done:
+            if future.exception() is None:
+                built += 1
+            else:
+                failed += 1
+        if progress:
+            progress(built, failed)
+    return built, failed
@@ -0,0 +1,231 @@
+# app/files/uploads.py
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from flask import current_app, url_for
+
+# Папка незавершенных загрузок внутри UPLOAD_FOLDER: <id>.part (данные) и <id>.json (метаданные)
+PARTIAL_DIRNAME = '.partial'
+# Размер блока при чтении тела запроса и при перехешировании
+STREAM_BLOCK_SIZE = 64 * 1024
+
+
+def client_filename(name):
+    """
+    Имя файла от клиента без пути, как браузер отправляет поле multipart: последняя часть
+    после '/' или '\\' (без '.', '..' и пустых частей), без буквы диска и управляющих символов.
+    Пустая строка - имени нет.
+    """
+    parts = [part for part in str(name or '').replace('\\', '/').split('/')
+             if part.strip() not in ('', '.', '..')]
+    if not parts:
+        return ''
+    name = re.sub(r'^[A-Za-z]:', '', parts[-1]) # C:file.txt
+    name = ''.join(char for char in name if char.isprintable()).strip()
+    return '' if name in ('.', '..') else name
+
+
+class UploadError(Exception):
+    """Ошибка протокола порционной загрузки; status - HTTP-код ответа."""
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+# --- Состояние хеширования в памяти процесса ---
+# SHA-256 нельзя сериализовать, поэтому хешер живет в памяти воркера, который принимает порции.
+# Если порция пришла в другой воркер (или после перезапуска), уже принятая часть
+# перехешируется один раз с диска, дальше хеширование снова идет по мере поступления.
+_hashers = {}
+_hashers_lock = threading.Lock()
+_upload_locks = {}
+
+
+def _upload_lock(upload_id):
+    with _hashers_lock:
+        return _upload_locks.setdefault(upload_id, threading.Lock())
+
+
+def _forget(upload_id):
+    with _hashers_lock:
+        _hashers.pop(upload_id, None)
+        _upload_locks.pop(upload_id, None)
+
+
+class ChunkedUpload:
+    """Незавершенная загрузка: метаданные в JSON-файле рядом с данными, смещение = размер данных."""
+
+    def __init__(self, upload_id, meta):
+        self.id = upload_id
+        self.meta = meta
+
+    # --- Пути ---
+    @staticmethod
+    def partial_folder():
+        return os.path.join(current_app.config['UPLOAD_FOLDER'], PARTIAL_DIRNAME)
+
+    @property
+    def data_path(self):
+        return os.path.join(self.partial_folder(), f'{self.id}.part')
+
+    @property
+    def meta_path(self):
+        return os.path.join(self.partial_folder(), f'{self.id}.json')
+
+    # --- Свойства ---
+    @property
+    def size(self):
+        return self.meta['size']
+
+    @property
+    def offset(self):
+        try:
+            return os.path.getsize(self.data_path)
+        except FileNotFoundError:
+            return 0
+
+    @property
+    def is_complete(self):
+        return self.offset == self.size
+
+    def to_dict(self):
+        return {
+            'upload_id': self.id,
+            'url': url_for('files.chunked_upload_status', upload_id=self.id),
+            'filename': self.meta['filename'],
+            'size': self.size,
+            'offset': self.offset,
+            'chunk_size': current_app.config.get('UPLOAD_CHUNK_SIZE'),
+        }
+
+    # --- Создание и загрузка ---
+    @classmethod
+    def create(cls, filename, size, task_id, project_id, user_id, expected_hash=None):
+        folder = cls.partial_folder()
+        os.makedirs(folder, exist_ok=True)
+        upload = cls(uuid.uuid4().hex, {
+            'filename': filename,
+            'size': size,
+            'task_id': task_id,
+            'project_id': project_id,
+            'user_id': user_id,
+            'sha256': expected_hash,
+            'created_at': time.time(),
+        })
+        open(upload.data_path, 'wb').close()
+        # Метаданные пишем атомарно: сначала во временный файл, затем переименовываем
+        tmp_path = upload.meta_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(upload.meta, f)
+        os.replace(tmp_path, upload.meta_path)
+        return upload
+
+    @classmethod
+    def load(cls, upload_id):
+        """Загрузка по ID или None (ID - только hex, чтобы не выйти за пределы папки)."""
+        if not upload_id or not all(c in '0123456789abcdef' for c in upload_id):
+            return None
+        path = os.path.join(cls.partial_folder(), f'{upload_id}.json')
+        try:
+            with open(path, encoding='utf-8') as f:
+                return cls(upload_id, json.load(f))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def append(self, stream, offset, length=None):
+        """
+        Дописывает тело запроса в файл, начиная с offset, и хеширует его по мере записи.
+        offset должен совпадать с текущим размером, иначе UploadError(409) с актуальным смещением -
+        клиент продолжит с него (так же возобновляется прерванная загрузка).
+        """
+        with _upload_lock(self.id):
+            current = self.offset
+            if offset != current:
+                raise UploadError('Смещение порции не совпадает с принятым объемом.', 409, offset=current)
+            if length is not None and current + length > self.size:
+                raise UploadError('Порция выходит за объявленный размер файла.', 400, offset=current)
+
+            hasher = self._hasher_at(current)
+            written = 0
+            try:
+                with open(self.data_path, 'r+b') as f:
+                    f.seek(current)
+                    while True:
+                        block = stream.read(STREAM_BLOCK_SIZE)
+                        if not block:
+                            break
+                        if current + written + len(block) > self.size:
+                            raise UploadError('Порция выходит за объявленный размер файла.', 400)
+                        f.write(block)
+                        hasher.update(block)
+                        written += len(block)
+            except Exception:
+                # Обрываем файл до последнего целого состояния; хешер считаем недействительным
+                with open(self.data_path, 'r+b') as f:
+                    f.truncate(current)
+                with _hashers_lock:
+                    _hashers.pop(self.id, None)
+                raise
+
+            with _hashers_lock:
+                _hashers[self.id] = (current + written, hasher)
+            return current + written
+
+    def _hasher_at(self, offset):
+        with _hashers_lock:
+            state = _hashers.get(self.id)
+        if state and state[0] == offset:
+            return state[1]
+        # Нет состояния для этого смещения - перехешируем принятую часть с диска
+        hasher = hashlib.sha256()
+        with open(self.data_path, 'rb') as f:
+            remaining = offset
+            while remaining:
+                block = f.read(min(STREAM_BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                hasher.update(block)
+                remaining -= len(block)
+        return hasher
+
+    def digest(self):
+        """SHA-256 полностью принятого файла."""
+        with _upload_lock(self.id):
+            return self._hasher_at(self.offset).hexdigest()
+
+    def discard(self):
+        for path in (self.data_path, self.meta_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        _forget(self.id)
+
+
+def cleanup_stale_uploads(max_age_hours):
+    """Удаляет незавершенные загрузки, метаданные которых старше max_age_hours. Возвращает их число."""
+    folder = ChunkedUpload.partial_folder()
+    if not os.path.isdir(folder):
+        return 0
+    cutoff = time.time() - max_age_hours * 3600
+    removed = 0
+    for name in os.listdir(folder):
+        if not name.endswith('.json'):
+            continue
+        upload = ChunkedUpload.load(name[:-len('.json')])
+        if upload is None:
+            continue
+        # Свежая активность (новые порции) продлевает жизнь загрузки
+        try:
+            last_activity = max(upload.meta.get('created_at', 0), os.path.getmtime(upload.data_path))
+        except FileNotFoundError:
+            last_activity = upload.meta.get('created_at', 0)
+        if last_activity < cutoff:
+            upload.discard()
+            removed += 1
+    return removed
@@ -1,8 +1,19 @@
 # app/main/routes.py
-from flask import render_template
+from flask import render_template, request
+from flask_login import login_required, current_user
 from app.main import bp
+from app.utils.search import search, search_supported # Полнотекстовый поиск (FTS5)
 
 @bp.route('/')
 @bp.route('/index')
 def index():
-    return render_template("index.html", title="Главная")
\ No newline at end of file
+    return render_template("index.html", title="Главная")
+
+# --- Поиск по задачам, комментариям и проектам ---
+@bp.route('/search')
+@login_required
+def search_view():
+    query = request.args.get('q', '').strip()
+    supported = search_supported()
+    results = search(current_user.id, query) if query and supported else []
+    return render_template("search.html", title="Поиск", query=query, results=results, supported=supported)
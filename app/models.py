@@ -1,12 +1,14 @@
 # app/models.py
 from datetime import datetime
 from flask_login import UserMixin
-from app.extensions import db, bcrypt
+from app.extensions import db
+from app.utils.passwords import hash_password, verify_password, needs_rehash # bcrypt в ограниченном пуле
 import enum # Для статусов и приоритетов
 import uuid # Для генерации уникальных имен файлов
 import os
 from werkzeug.utils import secure_filename # Для безопасных имен файлов
 from flask import current_app # Для доступа к config
+from sqlalchemy import event, inspect # Для записи истории статусов задач
 
 
 # --- Enum для статусов и приоритетов ---
@@ -21,6 +23,18 @@ class TaskPriority(enum.Enum):
     MEDIUM = 'Средний'
     HIGH = 'Высокий'
 
+# Открытые статусы: переход в них сбрасывает completed_at; DONE и ARCHIVED - закрытые
+OPEN_TASK_STATUSES = (TaskStatus.TODO, TaskStatus.IN_PROGRESS)
+
+# Компактные коды статусов для журнала переходов (значения не менять - они хранятся в БД)
+TASK_STATUS_CODES = {
+    TaskStatus.TODO: 1,
+    TaskStatus.IN_PROGRESS: 2,
+    TaskStatus.DONE: 3,
+    TaskStatus.ARCHIVED: 4,
+}
+TASK_STATUS_BY_CODE = {code: status for status, code in TASK_STATUS_CODES.items()}
+
 # --- Таблица связей User <-> Project ---
 # Определяем таблицу вне классов моделей
 project_members = db.Table('project_members',
@@ -57,6 +71,8 @@ class User(UserMixin, db.Model):
     password_hash = db.Column(db.String(128), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
+    # Денормализованный счетчик непрочитанных уведомлений (обновляется вместе с уведомлениями)
+    unread_notifications_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
 
     # --- Внешний ключ и связь с Role ---
     role_id = db.Column(db.Integer, db.ForeignKey('role.id'))
@@ -85,9 +101,12 @@ class User(UserMixin, db.Model):
                                     foreign_keys='Notification.user_id')
 
     def set_password(self, password):
-        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        self.password_hash = hash_password(password)
     def check_password(self, password):
-        return bcrypt.check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+    def password_needs_rehash(self):
+        # Хеш построен с прежней стоимостью BCRYPT_LOG_ROUNDS
+        return needs_rehash(self.password_hash)
     def __repr__(self):
         return f'<User {self.username} ({self.role.name if self.role else "No Role"})>'
 
@@ -99,12 +118,14 @@ class User(UserMixin, db.Model):
         return self.projects_member_of.filter(project_members.c.project_id == project.id).count() > 0
 
     # ---  метод: проверка, имеет ли доступ к проекту (владелец ИЛИ участник) ---
+    # Участие берется из кэша ID доступных проектов (не больше одного запроса на request)
     def can_access_project(self, project):
-         return self.id == project.owner_id or self.is_member_of(project)
+         from app.utils.access import accessible_project_ids # Локальный импорт: utils импортирует models
+         return self.id == project.owner_id or project.id in accessible_project_ids(self.id)
 
-    # --- Метод для получения непрочитанных уведомлений ---
+    # --- Метод для получения непрочитанных уведомлений (без COUNT, из счетчика) ---
     def new_notifications_count(self):
-        return self.notifications.filter_by(is_read=False).count()
+        return self.unread_notifications_count or 0
 
 # --- Модель Project ---
 class Project(db.Model):
@@ -113,7 +134,10 @@ class Project(db.Model):
     description = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, index=True, default=datetime.utcnow)
     owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    
+    # Версия данных проекта: увеличивается при каждом изменении задач (ключ кэша отчетов)
+    data_version = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    # Лимит размера одного вложения (байт); NULL - общий лимит UPLOAD_MAX_FILE_SIZE
+    max_upload_size = db.Column(db.BigInteger, nullable=True)
 
     # --- Связи ---
     tasks = db.relationship('Task', backref='project', lazy='dynamic', cascade='all, delete-orphan', foreign_keys='Task.project_id')
@@ -123,6 +147,26 @@ class Project(db.Model):
     members = db.relationship('User', secondary=project_members,
                               back_populates='projects_member_of', lazy='dynamic')
 
+    # --- Лимит размера вложения для проекта ---
+    def upload_size_limit(self):
+        return self.max_upload_size or current_app.config.get('UPLOAD_MAX_FILE_SIZE')
+
+    # --- Статический метод: отметить изменение задач проекта (в текущей транзакции) ---
+    @staticmethod
+    def bump_data_version(project_id):
+        Project.query.filter_by(id=project_id).update(
+            {Project.data_version: Project.data_version + 1}, synchronize_session=False
+        )
+
+    # --- То же для нескольких проектов одним UPDATE (пакетные изменения задач) ---
+    @staticmethod
+    def bump_data_versions(project_ids):
+        project_ids = set(project_ids)
+        if project_ids:
+            Project.query.filter(Project.id.in_(project_ids)).update(
+                {Project.data_version: Project.data_version + 1}, synchronize_session=False
+            )
+
     # ... (__repr__) ...
     def __repr__(self):
         return f'<Project {self.name}>'
@@ -136,6 +180,8 @@ class Task(db.Model):
     priority = db.Column(db.Enum(TaskPriority), default=TaskPriority.MEDIUM, nullable=False)
     created_at = db.Column(db.DateTime, index=True, default=datetime.utcnow)
     due_date = db.Column(db.DateTime, nullable=True)
+    # Момент перехода в статус DONE (NULL, если задача не выполнена) - для отчетов по времени
+    completed_at = db.Column(db.DateTime, index=True, nullable=True)
     project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False)
     assignee_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     creator_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -146,6 +192,21 @@ class Task(db.Model):
     # cascade='all, delete-orphan': Комментарии удаляются вместе с задачей
     comments = db.relationship('Comment', backref='task', lazy='dynamic', cascade='all, delete-orphan')
 
+    # --- Смена статуса: единая точка, поддерживает completed_at и журнал переходов ---
+    def set_status(self, new_status, changed_by_id=None):
+        """Устанавливает статус; возвращает True, если он действительно изменился."""
+        if new_status == self.status:
+            return False
+        self.status = new_status
+        # Автор перехода попадет в task_status_event (см. _record_status_event)
+        self._status_changed_by_id = changed_by_id
+        if new_status == TaskStatus.DONE:
+            self.completed_at = datetime.utcnow()
+        elif new_status in OPEN_TASK_STATUSES:
+            self.completed_at = None
+        # ARCHIVED: момент выполнения сохраняется - архивирование не переписывает историю отчетов
+        return True
+
     # ... (__repr__) ...
     def __repr__(self):
         return f'<Task {self.title}>'
@@ -159,6 +220,10 @@ class File(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     task_id = db.Column(db.Integer, db.ForeignKey('task.id', ondelete='CASCADE'), nullable=True)
     project_id = db.Column(db.Integer, db.ForeignKey('project.id', ondelete='CASCADE'), nullable=True)
+    # Размер (байт) и SHA-256 содержимого; считаются при загрузке.
+    # content_hash указывает на общий Blob - одинаковые файлы хранятся на диске один раз
+    size = db.Column(db.BigInteger, nullable=True)
+    content_hash = db.Column(db.String(64), nullable=True)
 
     @staticmethod
     def generate_storage_filename(original_filename):
@@ -170,6 +235,10 @@ class File(db.Model):
         return f"{safe_basename}_{unique_id}{ext}"
     @property
     def filepath(self):
+        if self.content_hash:
+            from app.files.storage import get_storage # Локальный импорт: files импортирует models
+            return get_storage().local_path(self.content_hash)
+        # Старые файлы (до дедупликации) лежат под собственным именем
         return os.path.join(current_app.config['UPLOAD_FOLDER'], self.storage_filename)
     @staticmethod
     def is_allowed(filename):
@@ -180,6 +249,18 @@ class File(db.Model):
         return f'<File {self.original_filename} (Stored: {self.storage_filename})>'
 
 
+# --- Содержимое файлов (адресация по SHA-256, со счетчиком ссылок) ---
+class Blob(db.Model):
+    hash = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    # Сколько записей File ссылается на содержимое; при нуле файл удаляется с диска
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Blob {self.hash[:12]} refs={self.ref_count}>'
+
+
 # ---  Модель Комментария ---
 class Comment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -213,4 +294,99 @@ class Notification(db.Model):
 
 
     def __repr__(self):
-        return f'<Notification {self.id} for User {self.user_id}>'
\ No newline at end of file
+        return f'<Notification {self.id} for User {self.user_id}>'
+
+# --- Составные индексы под реальные пути доступа (миграция b7d2e4f19a63) ---
+# Страница проекта: задачи проекта в порядке status ASC, priority DESC, created_at DESC, id DESC
+db.Index('ix_task_project_order', Task.project_id, Task.status, Task.priority.desc(),
+         Task.created_at.desc(), Task.id.desc())
+db.Index('ix_task_assignee_id', Task.assignee_id)
+# Комментарии задач страницы: WHERE task_id IN (...) ORDER BY task_id, created_at
+db.Index('ix_comment_task_created', Comment.task_id, Comment.created_at)
+db.Index('ix_file_task_id', File.task_id)
+db.Index('ix_file_project_id', File.project_id)
+db.Index('ix_file_content_hash', File.content_hash)
+# Список проектов владельца по дате (created_at, id) и проверка доступа по owner_id
+db.Index('ix_project_owner_created', Project.owner_id, Project.created_at)
+# Непрочитанные уведомления пользователя (mark-as-read, пересчет счетчика)
+db.Index('ix_notification_user_read_timestamp', Notification.user_id, Notification.is_read, Notification.timestamp)
+# Лента уведомлений: WHERE user_id = ? ORDER BY timestamp DESC, id DESC
+db.Index('ix_notification_user_timestamp', Notification.user_id, Notification.timestamp, Notification.id)
+# Обратный поиск участников проекта (PK таблицы начинается с user_id)
+db.Index('ix_project_members_project_user', project_members.c.project_id, project_members.c.user_id)
+
+
+
+# --- Журнал переходов статусов задач (только добавление) ---
+class TaskStatusEvent(db.Model):
+    __tablename__ = 'task_status_event'
+    # id монотонно растет - по нему работает водяной знак инкрементальных агрегатов
+    id = db.Column(db.Integer, primary_key=True)
+    # Без внешних ключей: история переживает удаление задачи
+    task_id = db.Column(db.Integer, nullable=False, index=True)
+    project_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, nullable=True)
+    # Коды из TASK_STATUS_CODES; from_status = NULL для создания задачи
+    from_status = db.Column(db.SmallInteger, nullable=True)
+    to_status = db.Column(db.SmallInteger, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<TaskStatusEvent {self.id} task={self.task_id} {self.from_status}->{self.to_status}>'
+
+
+# --- Дневные агрегаты переходов и водяные знаки их обработки ---
+class TaskStatusDaily(db.Model):
+    __tablename__ = 'task_status_daily'
+    project_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.SmallInteger, primary_key=True)
+    entered = db.Column(db.Integer, nullable=False, default=0) # Сколько задач перешло В статус
+    left = db.Column(db.Integer, nullable=False, default=0)    # Сколько задач вышло ИЗ статуса
+
+
+class AnalyticsWatermark(db.Model):
+    __tablename__ = 'analytics_watermark'
+    name = db.Column(db.String(64), primary_key=True)
+    last_event_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=True)
+
+
+# --- Соответствие записей внешней системы записям Klopit (flask import) ---
+class ImportKey(db.Model):
+    __tablename__ = 'import_key'
+    # Тип записи ('project', 'task', 'comment') и ее ID во внешней системе
+    kind = db.Column(db.String(16), primary_key=True)
+    external_id = db.Column(db.String(64), primary_key=True)
+    # Без внешнего ключа, как в журнале статусов: удаление записи не трогает соответствие
+    local_id = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f'<ImportKey {self.kind}:{self.external_id} -> {self.local_id}>'
+
+
+def _insert_status_event(connection, task, from_status):
+    connection.execute(TaskStatusEvent.__table__.insert().values(
+        task_id=task.id,
+        project_id=task.project_id,
+        user_id=vars(task).pop('_status_changed_by_id', None), # Автор относится только к этому переходу
+        from_status=TASK_STATUS_CODES.get(from_status),
+        to_status=TASK_STATUS_CODES[task.status],
+        created_at=datetime.utcnow()
+    ))
+
+
+# Пишем событие в том же flush (и той же транзакции), что и изменение статуса
+@event.listens_for(Task, 'after_insert')
+def _record_status_on_insert(mapper, connection, task):
+    _insert_status_event(connection, task, None)
+
+
+@event.listens_for(Task, 'after_update')
+def _record_status_event(mapper, connection, task):
+    history = inspect(task).attrs.status.history
+    if not history.has_changes() or not history.deleted:
+        return
+    old_status = history.deleted[0]
+    if old_status != task.status:
+        _insert_status_event(connection, task, old_status)
@@ -0,0 +1,127 @@
+# app/projects/export.py
+import csv
+import enum
+import json
+from sqlalchemy import func, select
+from sqlalchemy.orm import aliased
+from app.extensions import db
+from app.models import Task, Comment, User
+
+# --- Потоковая выгрузка задач и комментариев проекта (CSV / JSONL) ---
+# Строки читаются курсором порциями по EXPORT_YIELD_PER (yield_per: на PostgreSQL - серверный курсор),
+# сериализуются и отдаются по мере чтения: в памяти одна порция строк и один блок вывода.
+# Колонки совпадают с форматом flask import, поэтому выгрузку можно загрузить в другой экземпляр Klopit.
+EXPORT_KINDS = ('tasks', 'comments')
+EXPORT_FORMATS = ('csv', 'jsonl')
+EXPORT_YIELD_PER = 1000
+# Размер блока вывода: строки склеиваются, чтобы не писать в сокет по одной
+EXPORT_BLOCK_SIZE = 64 * 1024
+
+EXPORT_COLUMNS = {
+    'tasks': ['id', 'project', 'title', 'description', 'status', 'priority', 'assignee', 'creator',
+              'due_date', 'created_at', 'completed_at', 'comments'],
+    'comments': ['id', 'task', 'author', 'body', 'created_at'],
+}
+EXPORT_MIMETYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+# Текст, который Excel и другие табличные редакторы считают формулой (=HYPERLINK(...), +1+1, @SUM):
+# в CSV такие ячейки начинаются с апострофа и открываются как текст. JSONL не меняется
+CSV_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+# Порядок индекса ix_task_project_order (как на странице проекта): строки идут прямо из индекса,
+# без сортировки всей выгрузки перед первой строкой
+TASK_EXPORT_ORDER = (Task.status.asc(), Task.priority.desc(), Task.created_at.desc(), Task.id.desc())
+
+
+def _tasks_query(project_id):
+    assignee = aliased(User)
+    creator = aliased(User)
+    # Число комментариев - по индексу ix_comment_task_created, без группировки всей выгрузки
+    comment_count = select(func.count(Comment.id)).where(Comment.task_id == Task.id) \
+        .correlate(Task).scalar_subquery()
+    return (
+        select(Task.id, Task.project_id.label('project'), Task.title, Task.description,
+               Task.status, Task.priority, assignee.username.label('assignee'),
+               creator.username.label('creator'), Task.due_date, Task.created_at, Task.completed_at,
+               comment_count.label('comments'))
+        .outerjoin(assignee, assignee.id == Task.assignee_id)
+        .outerjoin(creator, creator.id == Task.creator_id)
+        .where(Task.project_id == project_id)
+        .order_by(*TASK_EXPORT_ORDER)
+    )
+
+
+def _comments_query(project_id):
+    return (
+        select(Comment.id, Comment.task_id.label('task'), User.username.label('author'),
+               Comment.body, Comment.created_at)
+        .join(Task, Task.id == Comment.task_id)
+        .outerjoin(User, User.id == Comment.user_id)
+        .where(Task.project_id == project_id)
+        .order_by(*TASK_EXPORT_ORDER, Comment.created_at, Comment.id) # Комментарии - по ix_comment_task_created
+    )
+
+
+def _value(value):
+    if value is None:
+        return None
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, enum.Enum): # Имя, как в API и flask import
+        return value.name
+    return value
+
+
+def export_query(project_id, kind):
+    return _tasks_query(project_id) if kind == 'tasks' else _comments_query(project_id)
+
+
+def iter_rows(project_id, kind):
+    """Словари строк выгрузки; результат читается порциями по EXPORT_YIELD_PER."""
+    query = export_query(project_id, kind)
+    result = db.session.execute(query.execution_options(yield_per=EXPORT_YIELD_PER))
+    try:
+        for row in result.mappings():
+            yield {key: _value(value) for key, value in row.items()}
+    finally:
+        result.close() # Прерванная загрузка освобождает курсор
+
+
+def csv_cell(value):
+    """Значение ячейки CSV: пользовательский текст, похожий на формулу, экранируется апострофом."""
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class _Line:
+    """Буфер для csv.writer: запись возвращает строку, а не копит ее."""
+    def write(self, value):
+        return value
+
+
+def stream_export(project_id, kind='tasks', fmt='csv'):
+    """
+    Генератор текста выгрузки. Заголовок CSV отдается до запроса к БД, первая строка - сразу
+    после него, остальные - блоками до EXPORT_BLOCK_SIZE.
+    """
+    columns = EXPORT_COLUMNS[kind]
+    if fmt == 'csv':
+        writer = csv.writer(_Line())
+        # BOM - чтобы Excel открыл UTF-8 с кириллицей без мастера импорта
+        yield '\ufeff' + writer.writerow(columns)
+        format_row = lambda row: writer.writerow([csv_cell(row[column]) for column in columns])
+    else:
+        format_row = lambda row: json.dumps(row, ensure_ascii=False) + '\n'
+
+    block, size, first = [], 0, True
+    for row in iter_rows(project_id, kind):
+        line = format_row(row)
+        block.append(line)
+        size += len(line)
+        if size >= EXPORT_BLOCK_SIZE or first:
+            first = False
+            yield ''.join(block)
+            block, size = [], 0
+    if block:
+        yield ''.join(block)
@@ -0,0 +1,147 @@
+# app/projects/loaders.py
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional, Tuple
+from app.extensions import db
+from app.models import (
+    Project, Task, User, File, Comment, TaskStatus, TaskPriority, project_members
+)
+from app.utils.pagination import keyset_paginate, KeysetPage
+
+# --- Неизменяемые модели представления для страницы проекта ---
+# Шаблон получает только эти объекты, поэтому при рендеринге не может
+# случайно запустить ленивую загрузку связей (dynamic relationships).
+
+@dataclass(frozen=True)
+class UserView:
+    id: int
+    username: str
+
+@dataclass(frozen=True)
+class FileView:
+    id: int
+    original_filename: str
+    user_id: int
+    content_hash: Optional[str] = None
+
+@dataclass(frozen=True)
+class CommentView:
+    id: int
+    body: str
+    created_at: datetime
+    author: Optional[UserView]
+
+@dataclass(frozen=True)
+class TaskView:
+    id: int
+    title: str
+    description: Optional[str]
+    status: TaskStatus
+    priority: TaskPriority
+    created_at: datetime
+    due_date: Optional[datetime]
+    project_id: int
+    assignee_id: Optional[int]
+    creator_id: int
+    assignee: Optional[UserView]
+    creator: Optional[UserView]
+    comments: Tuple[CommentView, ...]
+    files: Tuple[FileView, ...]
+
+@dataclass(frozen=True)
+class ProjectView:
+    id: int
+    name: str
+    description: Optional[str]
+    created_at: datetime
+    owner_id: int
+    owner: UserView
+
+@dataclass(frozen=True)
+class ProjectPage:
+    project: ProjectView
+    tasks: Tuple[TaskView, ...]
+    tasks_page: KeysetPage
+    members: Tuple[UserView, ...]
+
+
+def load_project_header(project_id):
+    """Проект вместе с владельцем одним запросом; None, если проекта нет."""
+    row = db.session.query(
+        Project.id, Project.name, Project.description, Project.created_at, Project.owner_id, User.username
+    ).join(User, User.id == Project.owner_id).filter(Project.id == project_id).first()
+    if row is None:
+        return None
+    return ProjectView(id=row.id, name=row.name, description=row.description,
+                       created_at=row.created_at, owner_id=row.owner_id,
+                       owner=UserView(row.owner_id, row.username))
+
+
+def load_project_page(project, task_order, after=None, before=None, per_page=50):
+    """
+    Загружает страницу проекта фиксированным числом запросов, независимо от
+    количества задач и комментариев: страница задач, затем комментарии, файлы
+    и пользователи пачками через IN (...), и участники проекта.
+    project - ProjectView из load_project_header().
+    """
+    # 1. Страница задач (keyset, см. app/utils/pagination.py)
+    tasks_page = keyset_paginate(Task.query.filter(Task.project_id == project.id), task_order,
+                                 after=after, before=before, per_page=per_page)
+    task_ids = [task.id for task in tasks_page.items]
+
+    comments_by_task = defaultdict(list)
+    files_by_task = defaultdict(list)
+    user_ids = set()
+    for task in tasks_page.items:
+        user_ids.add(task.creator_id)
+        if task.assignee_id:
+            user_ids.add(task.assignee_id)
+
+    if task_ids:
+        # 2. Все комментарии страницы одним запросом
+        comment_rows = db.session.query(
+            Comment.id, Comment.task_id, Comment.body, Comment.created_at, Comment.user_id
+        ).filter(Comment.task_id.in_(task_ids)).order_by(Comment.task_id, Comment.created_at.asc(), Comment.id)
+        for row in comment_rows:
+            comments_by_task[row.task_id].append(row)
+            user_ids.add(row.user_id)
+
+        # 3. Все файлы страницы одним запросом
+        file_rows = db.session.query(
+            File.id, File.task_id, File.original_filename, File.user_id, File.content_hash
+        ).filter(File.task_id.in_(task_ids)).order_by(File.task_id, File.id)
+        for row in file_rows:
+            files_by_task[row.task_id].append(FileView(row.id, row.original_filename, row.user_id, row.content_hash))
+
+    # 4. Исполнители, создатели и авторы комментариев - одним запросом
+    users = {}
+    if user_ids:
+        users = {row.id: UserView(row.id, row.username)
+                 for row in db.session.query(User.id, User.username).filter(User.id.in_(user_ids))}
+
+    # 5. Участники проекта
+    members = tuple(
+        UserView(row.id, row.username)
+        for row in db.session.query(User.id, User.username)
+                            .join(project_members, project_members.c.user_id == User.id)
+                            .filter(project_members.c.project_id == project.id)
+                            .order_by(User.username)
+    )
+
+    tasks = tuple(
+        TaskView(
+            id=task.id, title=task.title, description=task.description,
+            status=task.status, priority=task.priority,
+            created_at=task.created_at, due_date=task.due_date,
+            project_id=task.project_id, assignee_id=task.assignee_id, creator_id=task.creator_id,
+            assignee=users.get(task.assignee_id),
+            creator=users.get(task.creator_id),
+            comments=tuple(CommentView(row.id, row.body, row.created_at, users.get(row.user_id))
+                           for row in comments_by_task.get(task.id, ())),
+            files=tuple(files_by_task.get(task.id, ()))
+        )
+        for task in tasks_page.items
+    )
+
+    return ProjectPage(project=project, tasks=tasks, tasks_page=tasks_page, members=members)
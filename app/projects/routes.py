@@ -1,7 +1,7 @@
 # app/projects/routes.py
 from flask import (
     render_template, redirect, url_for, flash, request, abort,
-    current_app 
+    current_app, Response, stream_with_context
 )
 from flask_login import login_required, current_user
 from sqlalchemy import or_ # Для сложных запросов SQLAlchemy
@@ -17,28 +17,50 @@ from app.projects.forms import (
 from app.utils.notifications import ( # Импортируем функции уведомлений
     notify_task_assigned, notify_new_comment, notify_user_added_to_project
 )
+from app.utils.access import invalidate_project_access # Сброс кэша прав доступа
+from app.utils.pagination import keyset_page_from_request, InvalidCursor # Пагинация по курсору
+from app.projects.loaders import load_project_header, load_project_page # Загрузка страницы проекта без N+1
+from app.projects.export import stream_export, EXPORT_KINDS, EXPORT_FORMATS, EXPORT_MIMETYPES # Выгрузка потоком
 import traceback # Для отладки ошибок
 
+# Размеры страниц для списков
+PROJECTS_PER_PAGE = 20
+TASKS_PER_PAGE = 50
+
+# Порядок задач на странице проекта; id в конце - для стабильного курсора
+TASK_PAGE_ORDER = [
+    (Task.status, 'asc'),
+    (Task.priority, 'desc'),
+    (Task.created_at, 'desc'),
+    (Task.id, 'desc'),
+]
+
 # === Маршруты Проектов ===
 
 @bp.route('/')
 @login_required
 def list_projects():
     """Отображает список проектов, где пользователь владелец или участник."""
-    # Эффективный запрос для получения всех доступных проектов
-    # Используем outerjoin и distinct для корректной работы с many-to-many
-    accessible_projects_query = Project.query.outerjoin(
-        project_members, (Project.id == project_members.c.project_id)
-    ).filter(
+    # Доступные проекты: владелец ИЛИ участник (подзапрос вместо outerjoin + distinct,
+    # чтобы сортировка шла по индексу и работала пагинация по курсору)
+    member_project_ids = db.session.query(project_members.c.project_id).filter(
+        project_members.c.user_id == current_user.id
+    )
+    accessible_projects_query = Project.query.filter(
         or_(
             Project.owner_id == current_user.id,
-            project_members.c.user_id == current_user.id
+            Project.id.in_(member_project_ids)
         )
-    ).distinct().order_by(Project.created_at.desc())
+    )
 
-    all_accessible_projects = accessible_projects_query.all()
+    # Пагинация по курсору: стабильный ключ (created_at, id)
+    page = keyset_page_from_request(
+        accessible_projects_query,
+        [(Project.created_at, 'desc'), (Project.id, 'desc')],
+        per_page=PROJECTS_PER_PAGE
+    )
 
-    return render_template('project_list.html', title='Мои проекты', projects=all_accessible_projects)
+    return render_template('project_list.html', title='Мои проекты', projects=page.items, page=page)
 
 
 @bp.route('/new', methods=['GET', 'POST'])
@@ -69,14 +91,24 @@ def create_project():
 @login_required
 def view_project(project_id):
     """Отображает детали конкретного проекта."""
-    project = Project.query.get_or_404(project_id)
+    # Проект с владельцем - одним запросом (неизменяемая модель представления)
+    project = load_project_header(project_id)
+    if project is None:
+        abort(404)
 
     # Проверка доступа (владелец или участник)
     if not current_user.can_access_project(project):
         abort(403)
 
-    tasks = project.tasks.order_by(Task.status.asc(), Task.priority.desc(), Task.created_at.desc()).all()
-    project_members = project.members.order_by(User.username).all()
+    # Задачи (по страницам, курсор в ?after= / ?before=), комментарии, файлы, пользователи
+    # и участники - фиксированным числом запросов, без N+1 в шаблоне
+    try:
+        page = load_project_page(project, TASK_PAGE_ORDER,
+                                 after=request.args.get('after') or None,
+                                 before=request.args.get('before') or None,
+                                 per_page=TASKS_PER_PAGE)
+    except InvalidCursor:
+        abort(400, description="Неверный курсор пагинации.")
 
     # Создаем экземпляры форм для передачи в шаблон
     comment_form = CommentForm()
@@ -85,8 +117,9 @@ def view_project(project_id):
     return render_template('project_detail.html',
                            title=project.name,
                            project=project,
-                           tasks=tasks,
-                           project_members=project_members,
+                           tasks=page.tasks,
+                           tasks_page=page.tasks_page,
+                           project_members=page.members,
                            comment_form=comment_form,
                            add_member_form=add_member_form
                            )
@@ -134,11 +167,17 @@ def delete_project(project_id):
         abort(403)
 
     project_name = project.name
+    # Запоминаем, чей кэш доступа нужно сбросить после удаления
+    affected_user_ids = [project.owner_id] + [
+        user_id for (user_id,) in db.session.query(project_members.c.user_id)
+                                            .filter(project_members.c.project_id == project.id)
+    ]
     try:
         # Удаляем проект (связанные задачи, файлы, комменты удалятся через cascade)
         # Записи в project_members удалятся через cascade
         db.session.delete(project)
         db.session.commit()
+        invalidate_project_access(*affected_user_ids)
         flash(f'Проект "{project_name}" был удален.', 'success')
     except Exception as e:
         db.session.rollback()
@@ -151,6 +190,29 @@ def delete_project(project_id):
     return redirect(url_for('projects.list_projects'))
 
 
+@bp.route('/<int:project_id>/export')
+@login_required
+def export_project(project_id):
+    """Выгрузка задач (?kind=tasks) или комментариев (?kind=comments) проекта в CSV или JSONL (?format=)."""
+    project = Project.query.get_or_404(project_id)
+
+    # Проверка доступа (владелец или участник)
+    if not current_user.can_access_project(project):
+        abort(403)
+
+    kind = request.args.get('kind', 'tasks')
+    fmt = request.args.get('format', 'csv')
+    if kind not in EXPORT_KINDS or fmt not in EXPORT_FORMATS:
+        abort(400, description="Неверный вид или формат выгрузки.")
+
+    # Строки читаются курсором и отдаются по мере чтения - выгрузка не собирается в памяти
+    response = Response(stream_with_context(stream_export(project.id, kind, fmt)),
+                        mimetype=EXPORT_MIMETYPES[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="project-{project.id}-{kind}.{fmt}"'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
 # === Маршруты Задач ===
 
 @bp.route('/<int:project_id>/tasks/new', methods=['GET', 'POST'])
@@ -193,15 +255,16 @@ def create_task(project_id):
 
             task = Task(title=form.title.data,
                         description=form.description.data,
-                        status=status_enum,
                         priority=priority_enum,
                         due_date=form.due_date.data,
                         project_id=project.id,
                         creator_id=current_user.id,
                         assignee_id=assignee_user.id if assignee_user else None)
+            task.set_status(status_enum, current_user.id) # Статус через set_status (completed_at, журнал)
 
             db.session.add(task)
             db.session.flush() # Получаем ID для уведомления
+            Project.bump_data_version(project.id) # Инвалидирует кэш отчета проекта
 
             # Отправка уведомления о назначении (если назначен исполнитель)
             if task.assignee_id:
@@ -274,7 +337,7 @@ def edit_task(task_id):
             # Обновляем поля задачи
             task.title = form.title.data
             task.description = form.description.data
-            task.status = status_enum
+            task.set_status(status_enum, current_user.id)
             task.priority = priority_enum
             task.due_date = form.due_date.data
             new_assignee_id = assignee_user.id if assignee_user else None
@@ -286,6 +349,8 @@ def edit_task(task_id):
             if new_assignee_id != old_assignee_id and new_assignee_id is not None:
                  notify_task_assigned(task, current_user, assignee_user)
 
+            Project.bump_data_version(project.id) # Инвалидирует кэш отчета проекта
+
             db.session.commit() # Коммитим все изменения
             print(">>> DB commit SUCCESSFUL (Edit)") # Отладка
             flash(f'Задача "{task.title}" успешно обновлена!', 'success')
@@ -326,6 +391,7 @@ def delete_task(task_id):
     task_title = task.title
     try:
         db.session.delete(task)
+        Project.bump_data_version(project_id) # Инвалидирует кэш отчета проекта
         db.session.commit()
         flash(f'Задача "{task_title}" удалена.', 'success')
     except Exception as e:
@@ -358,10 +424,10 @@ def add_comment(task_id):
                           task_id=task.id)
         try:
             db.session.add(comment)
-            db.session.flush() # Получаем comment.id и можем достучаться до comment.author
+            db.session.flush() # Получаем comment.id
 
-            # Отправка уведомлений о комментарии
-            notify_new_comment(comment, task)
+            # Отправка уведомлений о комментарии (проект и автор уже загружены)
+            notify_new_comment(comment, task, project=project, author=current_user)
 
             db.session.commit() # Коммитим все
             flash('Комментарий добавлен.', 'success')
@@ -400,7 +466,8 @@ def update_task_status(task_id):
 
     try:
         new_status_enum = TaskStatus[new_status_name] # Преобразуем имя статуса в Enum
-        task.status = new_status_enum
+        task.set_status(new_status_enum, current_user.id)
+        Project.bump_data_version(task.project_id) # Инвалидирует кэш отчета проекта
         db.session.commit()
         # Возвращаем JSON ответ
         return {'message': 'Статус обновлен', 'new_status_name': new_status_enum.name, 'new_status_value': new_status_enum.value}, 200
@@ -444,6 +511,7 @@ def add_member(project_id):
                 # Отправка уведомления пользователю
                 notify_user_added_to_project(user_to_add, project, current_user)
                 db.session.commit() # Коммитим все
+                invalidate_project_access(user_to_add.id)
                 flash(f'Пользователь {user_to_add.username} добавлен в проект.', 'success')
             except Exception as e:
                 db.session.rollback()
@@ -483,6 +551,7 @@ def remove_member(project_id, user_id):
         try:
             # TODO: Нужно ли уведомление об удалении?
             db.session.commit()
+            invalidate_project_access(user_id)
             flash(f'Пользователь {user_to_remove.username} удален из проекта.', 'success')
         except Exception as e:
             db.session.rollback()
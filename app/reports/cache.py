@@ -0,0 +1,95 @@
+# app/reports/cache.py
+import threading
+from collections import OrderedDict
+
+
+class _Flight:
+    """Вычисление, которое уже выполняется для ключа; остальные запросы ждут его результат."""
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.failed = False
+
+
+class ReportCache:
+    """
+    Ограниченный LRU-кэш отчетов в памяти процесса.
+    Ключ - (project_id, data_version): при изменении задач версия растет и старая запись
+    просто перестает запрашиваться (и вытесняется). Одновременные промахи по одному ключу
+    объединяются - отчет считает только первый запрос, остальные ждут его результат.
+    """
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def init_app(self, app):
+        self.maxsize = app.config.get('REPORT_CACHE_SIZE', self.maxsize)
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if not flight.failed:
+                return flight.value
+            return compute() # Первое вычисление упало - пробуем сами, без кэширования
+
+        try:
+            value = compute()
+        except Exception:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.failed = True
+            flight.done.set()
+            raise
+
+        with self._lock:
+            self.misses += 1
+            self._store(key, value)
+            self._inflight.pop(key, None)
+        flight.value = value
+        flight.done.set()
+        return value
+
+    def _store(self, key, value):
+        # Записи того же проекта со старыми версиями больше не понадобятся
+        project_id = key[0]
+        for stale_key in [k for k in self._data if k[0] == project_id and k != key]:
+            del self._data[stale_key]
+        self._data[key] = value
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+report_cache = ReportCache()
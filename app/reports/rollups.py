@@ -0,0 +1,148 @@
+# app/reports/rollups.py
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func, select, union_all, literal
+from app.extensions import db
+from app.models import TaskStatusEvent, TaskStatusDaily, AnalyticsWatermark
+from app.reports.service import _as_date
+
+# Имя водяного знака для дневных агрегатов переходов статусов
+STATUS_DAILY_WATERMARK = 'task_status_daily'
+# Граница безопасной обработки на серверных БД (см. _safe_event_id): наблюдаемый максимум id
+# и момент наблюдения ('seen'), а также уже "выдержанный" максимум ('safe')
+STATUS_DAILY_SEEN = 'task_status_daily:seen'
+STATUS_DAILY_SAFE = 'task_status_daily:safe'
+DEFAULT_SETTLE_SECONDS = 300
+
+
+class WatermarkMoved(RuntimeError):
+    """Водяной знак сдвинул параллельный запуск - текущая порция не применяется."""
+
+
+def _upsert(table, rows, key_columns, add_columns):
+    """INSERT ... ON CONFLICT DO UPDATE со сложением счетчиков (SQLite и PostgreSQL)."""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    statement = insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={column: table.c[column] + statement.excluded[column] for column in add_columns}
+    )
+    db.session.execute(statement, rows)
+
+
+def _watermark(name):
+    watermark = db.session.get(AnalyticsWatermark, name)
+    if watermark is None:
+        watermark = AnalyticsWatermark(name=name, last_event_id=0)
+        db.session.add(watermark)
+        db.session.flush()
+    return watermark
+
+
+def _safe_event_id():
+    """
+    Наибольший id события, до которого все транзакции с событиями уже завершены (None - без ограничения).
+
+    SQLite выполняет пишущие транзакции по одной, поэтому id становятся видимы строго по порядку.
+    На серверных БД долгая транзакция (пакет API, порция flask import) может получить id раньше
+    и закоммитить его позже, чем водяной знак уйдет дальше, - такое событие не было бы учтено.
+    Поэтому максимум id запоминается вместе с моментом наблюдения и становится границей обработки
+    только через STATUS_ROLLUP_SETTLE_SECONDS: все транзакции, которые тогда писали события
+    с меньшими id, к этому времени завершены, если они короче этого срока.
+    """
+    if db.engine.dialect.name == 'sqlite':
+        return None
+    settle = current_app.config.get('STATUS_ROLLUP_SETTLE_SECONDS', DEFAULT_SETTLE_SECONDS)
+    now = datetime.utcnow()
+    seen, safe = _watermark(STATUS_DAILY_SEEN), _watermark(STATUS_DAILY_SAFE)
+    if seen.updated_at is None or seen.updated_at <= now - timedelta(seconds=settle):
+        if seen.updated_at is not None:
+            safe.last_event_id = max(safe.last_event_id, seen.last_event_id)
+            safe.updated_at = now
+        seen.last_event_id = db.session.execute(select(func.max(TaskStatusEvent.id))).scalar() or 0
+        seen.updated_at = now
+    return safe.last_event_id
+
+
+def rollup_status_events(batch_size=50000):
+    """
+    Обрабатывает одну порцию событий новее водяного знака: агрегирует переходы
+    по (проект, день, статус) в SQL и прибавляет к task_status_daily.
+    Агрегаты и водяной знак меняются в одной транзакции, поэтому событие не учитывается дважды.
+    На серверных БД обрабатываются только события старше STATUS_ROLLUP_SETTLE_SECONDS
+    (см. _safe_event_id), иначе событие из еще не закоммиченной транзакции с меньшим id
+    было бы пропущено. Возвращает (обработано событий, новый водяной знак).
+    """
+    start_id = _watermark(STATUS_DAILY_WATERMARK).last_event_id
+    in_range = TaskStatusEvent.id > start_id
+    safe_id = _safe_event_id()
+    if safe_id is not None:
+        in_range &= TaskStatusEvent.id <= safe_id
+
+    # Граница порции: id последнего события в пределах batch_size
+    end_id = db.session.execute(
+        select(func.max(TaskStatusEvent.id)).where(in_range, TaskStatusEvent.id <= start_id + batch_size)
+    ).scalar()
+    if end_id is None:
+        # Пропуски в id больше порции: переходим к следующему существующему событию
+        end_id = db.session.execute(select(func.min(TaskStatusEvent.id)).where(in_range)).scalar()
+        if end_id is None:
+            db.session.commit() # Сохраняем наблюдение границы (_safe_event_id)
+            return 0, start_id
+
+    in_batch = (TaskStatusEvent.id > start_id) & (TaskStatusEvent.id <= end_id)
+    day = func.date(TaskStatusEvent.created_at)
+    entered = select(TaskStatusEvent.project_id.label('project_id'), day.label('day'),
+                     TaskStatusEvent.to_status.label('status'),
+                     literal(1).label('is_entry'), func.count().label('n')) \
+        .where(in_batch).group_by(TaskStatusEvent.project_id, day, TaskStatusEvent.to_status)
+    left = select(TaskStatusEvent.project_id.label('project_id'), day.label('day'),
+                  TaskStatusEvent.from_status.label('status'),
+                  literal(0).label('is_entry'), func.count().label('n')) \
+        .where(in_batch, TaskStatusEvent.from_status.isnot(None)) \
+        .group_by(TaskStatusEvent.project_id, day, TaskStatusEvent.from_status)
+
+    totals = {}
+    processed = 0
+    for project_id, bucket, status, is_entry, count in db.session.execute(union_all(entered, left)):
+        row = totals.setdefault((project_id, _as_date(bucket), status),
+                                {'project_id': project_id, 'day': _as_date(bucket), 'status': status,
+                                 'entered': 0, 'left': 0})
+        if is_entry:
+            row['entered'] += count
+            processed += count
+        else:
+            row['left'] += count
+
+    if totals:
+        _upsert(TaskStatusDaily.__table__, list(totals.values()),
+                ['project_id', 'day', 'status'], ['entered', 'left'])
+
+    # Сдвигаем знак, только если его никто не сдвинул параллельно
+    moved = db.session.execute(
+        AnalyticsWatermark.__table__.update()
+        .where(AnalyticsWatermark.name == STATUS_DAILY_WATERMARK,
+               AnalyticsWatermark.last_event_id == start_id)
+        .values(last_event_id=end_id, updated_at=datetime.utcnow())
+    ).rowcount
+    if not moved:
+        db.session.rollback()
+        raise WatermarkMoved(STATUS_DAILY_WATERMARK)
+    db.session.commit()
+    return processed, end_id
+
+
+def rollup_all_status_events(batch_size=50000, progress=None):
+    """Обрабатывает все накопившиеся события порциями; progress(total, watermark) - для вывода в CLI."""
+    total = 0
+    while True:
+        processed, watermark = rollup_status_events(batch_size)
+        if not processed:
+            return total
+        total += processed
+        if progress:
+            progress(total, watermark)
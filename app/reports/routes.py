@@ -1,11 +1,13 @@
 # app/reports/routes.py
-from flask import render_template, abort, current_app, jsonify
+from flask import render_template, abort, current_app, jsonify, request
+from datetime import date, timedelta
 from flask_login import login_required, current_user
-from sqlalchemy import func, case, or_
+from sqlalchemy import or_
 from app.reports import bp
-from app.models import Project, Task, TaskStatus, TaskPriority, User 
-from app.extensions import db
-import json # Для безопасной передачи данных в JS
+from app.reports.service import get_project_report, build_portfolio_series # Сервис агрегации отчетов
+from app.reports.cache import report_cache
+from app.utils.decorators import admin_required
+from app.models import Project, User
 
 @bp.route('/')
 @login_required
@@ -18,73 +20,83 @@ def index():
     return render_template('reports_index.html', title='Отчеты', projects=projects)
 
 
+def _get_accessible_project(project_id):
+    """Проект по ID с проверкой прав (владелец или участник)."""
+    project = Project.query.get_or_404(project_id)
+    if not current_user.can_access_project(project):
+        abort(403) # Запрещаем доступ
+    return project
+
+
 @bp.route('/project/<int:project_id>')
 @login_required
 def project_report(project_id):
     """Отображает статистику и графики по задачам для конкретного проекта."""
-    project = Project.query.get_or_404(project_id)
+    project = _get_accessible_project(project_id)
 
-    # --- Проверка прав доступа ---
-    # Отчет доступен владельцу или участнику проекта
-    if not current_user.can_access_project(project):
-        abort(403) # Запрещаем доступ
+    # --- Сбор статистики: один агрегирующий запрос (куб статус x приоритет x исполнитель), из кэша ---
+    report = get_project_report(project)
 
-    # --- Сбор статистики ---
-    # 1. По статусам
-    status_stats_query = db.session.query(
-            Task.status, func.count(Task.id).label('count')
-        ).filter(
-            Task.project_id == project.id
-        ).group_by(
-            Task.status
-        ).all()
-
-    status_stats = {status: 0 for status in TaskStatus} # Инициализируем нулями
-    total_tasks = 0
-    for status_enum, count in status_stats_query:
-        if status_enum in status_stats: # Убедимся, что статус из Enum
-            status_stats[status_enum] = count
-        total_tasks += count # Считаем общее количество
-
-    # 2. По приоритетам
-    priority_stats_query = db.session.query(
-            Task.priority, func.count(Task.id).label('count')
-         ).filter(
-             Task.project_id == project.id
-         ).group_by(
-             Task.priority
-         ).all()
-
-    priority_stats = {prio: 0 for prio in TaskPriority} # Инициализируем нулями
-    for prio_enum, count in priority_stats_query:
-         if prio_enum in priority_stats: # Убедимся, что приоритет из Enum
-            priority_stats[prio_enum] = count
-
-    # 3. Рассчитаем процент выполнения (если есть задачи)
-    completion_percentage = 0
-    if total_tasks > 0:
-        done_count = status_stats.get(TaskStatus.DONE, 0)
-        completion_percentage = round((done_count / total_tasks) * 100)
-
-    # --- Подготовка данных для JS (графики) ---
-    # Используем имена Enum как ключи и значения Enum для меток
-    chart_status_data = {s.name: status_stats.get(s, 0) for s in TaskStatus}
-    chart_priority_data = {p.name: priority_stats.get(p, 0) for p in TaskPriority}
-    status_enum_values = {s.name: s.value for s in TaskStatus}
-    priority_enum_values = {p.name: p.value for p in TaskPriority}
-
-    # Передаем все данные в шаблон
+    # Графики Chart.js подгружают данные асинхронно из project_report_data
     return render_template('project_report.html',
                            title=f'Отчет по проекту: {project.name}',
                            project=project,
-                           stats=status_stats, # Статистика для таблицы
-                           total_tasks=total_tasks,
-                           completion_percentage=completion_percentage,
-                           # --- Данные для графиков Chart.js ---
-                           # Безопасно передаем через json.dumps или фильтр |tojson
-                           chart_status_data_json=json.dumps(chart_status_data),
-                           chart_priority_data_json=json.dumps(chart_priority_data),
-                           status_enum_values_json=json.dumps(status_enum_values),
-                           priority_enum_values_json=json.dumps(priority_enum_values)
-                           )
+                           stats=report.by_status, # Статистика для таблицы
+                           assignee_stats=report.by_assignee,
+                           total_tasks=report.total_tasks,
+                           completion_percentage=report.completion_percentage)
+
+
+@bp.route('/project/<int:project_id>/data')
+@login_required
+def project_report_data(project_id):
+    """JSON с данными отчета (для графиков и внешних клиентов)."""
+    project = _get_accessible_project(project_id)
+    return jsonify(get_project_report(project).to_dict())
 
+
+@bp.route('/cache-stats')
+@login_required
+@admin_required
+def cache_stats():
+    """Счетчики кэша отчетов (только для админов)."""
+    return jsonify(report_cache.stats())
+
+
+# --- Портфельный отчет по всем проектам (только для админов) ---
+PORTFOLIO_DEFAULT_WEEKS = 12
+PORTFOLIO_MAX_WEEKS = 520
+
+def _portfolio_range():
+    """Период из ?start=YYYY-MM-DD&end=YYYY-MM-DD (по умолчанию - последние 12 недель)."""
+    try:
+        end = date.fromisoformat(request.args['end']) if request.args.get('end') else date.today()
+        start = date.fromisoformat(request.args['start']) if request.args.get('start') \
+            else end - timedelta(weeks=PORTFOLIO_DEFAULT_WEEKS)
+    except ValueError:
+        abort(400, description="Даты периода должны быть в формате ГГГГ-ММ-ДД.")
+    if start > end:
+        abort(400, description="Начало периода позже конца.")
+    if (end - start).days > PORTFOLIO_MAX_WEEKS * 7:
+        abort(400, description="Слишком длинный период.")
+    return start, end
+
+
+@bp.route('/portfolio')
+@login_required
+@admin_required
+def portfolio_report():
+    """Недельная динамика создания и выполнения задач по всем проектам."""
+    start, end = _portfolio_range()
+    series = build_portfolio_series(start, end)
+    return render_template('portfolio_report.html', title='Портфельный отчет',
+                           series=series, start=start, end=end)
+
+
+@bp.route('/portfolio/data')
+@login_required
+@admin_required
+def portfolio_report_data():
+    """JSON с недельными рядами портфельного отчета."""
+    start, end = _portfolio_range()
+    return jsonify(build_portfolio_series(start, end).to_dict())
@@ -0,0 +1,226 @@
+# app/reports/service.py
+from collections import Counter
+from dataclasses import dataclass, field, replace
+from datetime import date, datetime, timedelta
+from itertools import accumulate
+from typing import Dict, Optional, Tuple
+from sqlalchemy import func, select, literal, union_all, or_
+from app.extensions import db
+from app.models import Task, User, TaskStatus, TaskPriority
+from app.reports.cache import report_cache
+
+
+@dataclass(frozen=True)
+class CubeCell:
+    """Одна ячейка куба: количество задач с данными статусом, приоритетом и исполнителем."""
+    status: TaskStatus
+    priority: TaskPriority
+    assignee_id: Optional[int]
+    count: int
+
+
+@dataclass(frozen=True)
+class ProjectReport:
+    """
+    Отчет по проекту. Хранит только куб status x priority x assignee;
+    все разрезы и процент выполнения выводятся из него без обращений к БД.
+    Имена исполнителей не входят в кэшируемый куб (переименование пользователя не меняет
+    data_version проекта) и подставляются при выдаче отчета - см. get_project_report.
+    """
+    project_id: int
+    cube: Tuple[CubeCell, ...]
+    assignee_names: Dict[int, str] = field(default_factory=dict, compare=False)
+
+    @property
+    def total_tasks(self):
+        return sum(cell.count for cell in self.cube)
+
+    @property
+    def by_status(self):
+        counts = Counter()
+        for cell in self.cube:
+            counts[cell.status] += cell.count
+        return {status: counts.get(status, 0) for status in TaskStatus}
+
+    @property
+    def by_priority(self):
+        counts = Counter()
+        for cell in self.cube:
+            counts[cell.priority] += cell.count
+        return {priority: counts.get(priority, 0) for priority in TaskPriority}
+
+    @property
+    def by_assignee(self):
+        """Список словарей {id, username, total, done}, по убыванию числа задач."""
+        rows = {}
+        for cell in self.cube:
+            row = rows.setdefault(cell.assignee_id, {'id': cell.assignee_id,
+                                                     'username': self.assignee_names.get(cell.assignee_id),
+                                                     'total': 0, 'done': 0})
+            row['total'] += cell.count
+            if cell.status == TaskStatus.DONE:
+                row['done'] += cell.count
+        return sorted(rows.values(), key=lambda r: (-r['total'], r['username'] or ''))
+
+    @property
+    def completion_percentage(self):
+        total = self.total_tasks
+        if total == 0:
+            return 0
+        return round(self.by_status[TaskStatus.DONE] / total * 100)
+
+    def to_dict(self):
+        """Сериализация для JSON API (ключи - имена Enum)."""
+        return {
+            'project_id': self.project_id,
+            'total_tasks': self.total_tasks,
+            'completion_percentage': self.completion_percentage,
+            'by_status': {status.name: count for status, count in self.by_status.items()},
+            'by_priority': {priority.name: count for priority, count in self.by_priority.items()},
+            'by_assignee': self.by_assignee,
+            'cube': [{'status': cell.status.name, 'priority': cell.priority.name,
+                      'assignee_id': cell.assignee_id, 'count': cell.count} for cell in self.cube],
+            'labels': {
+                'status': {status.name: status.value for status in TaskStatus},
+                'priority': {priority.name: priority.value for priority in TaskPriority},
+            },
+        }
+
+
+def build_project_report(project_id):
+    """Считает куб status x priority x assignee одним GROUP BY (один проход по задачам проекта)."""
+    rows = db.session.query(
+        Task.status, Task.priority, Task.assignee_id, func.count(Task.id)
+    ).filter(
+        Task.project_id == project_id
+    ).group_by(
+        Task.status, Task.priority, Task.assignee_id
+    ).all()
+
+    cube = tuple(CubeCell(status, priority, assignee_id, count)
+                 for status, priority, assignee_id, count in rows)
+    return ProjectReport(project_id=project_id, cube=cube)
+
+
+def assignee_names(report):
+    """Текущие имена исполнителей куба: один запрос по первичному ключу."""
+    ids = {cell.assignee_id for cell in report.cube if cell.assignee_id is not None}
+    if not ids:
+        return {}
+    return dict(db.session.execute(select(User.id, User.username).where(User.id.in_(ids))).all())
+
+
+def get_project_report(project):
+    """
+    Отчет из кэша по ключу (project.id, project.data_version); куб считается заново,
+    только если задачи проекта менялись после последнего расчета. Имена исполнителей
+    читаются при каждой выдаче, поэтому переименование видно сразу.
+    """
+    report = report_cache.get_or_compute((project.id, project.data_version),
+                                         lambda: build_project_report(project.id))
+    return replace(report, assignee_names=assignee_names(report))
+
+
+# --- Портфельный отчет (все проекты, по неделям) ---
+
+@dataclass(frozen=True)
+class PortfolioSeries:
+    """Недельные ряды по всем проектам: создано, выполнено и открыто на конец недели."""
+    start: date
+    end: date
+    weeks: Tuple[date, ...]
+    created: Tuple[int, ...]
+    completed: Tuple[int, ...]
+    open_tasks: Tuple[int, ...]
+
+    def to_dict(self):
+        return {
+            'start': self.start.isoformat(),
+            'end': self.end.isoformat(),
+            'weeks': [week.isoformat() for week in self.weeks],
+            'created': list(self.created),
+            'completed': list(self.completed),
+            'open': list(self.open_tasks),
+        }
+
+
+def week_start(value):
+    """Понедельник недели для даты (Python-версия week_bucket)."""
+    return value - timedelta(days=value.weekday())
+
+
+def week_bucket(column):
+    """SQL-выражение: начало (понедельник) недели для колонки даты/времени."""
+    if db.engine.dialect.name == 'sqlite':
+        # weekday 0 - ближайшее воскресенье (или тот же день), минус 6 дней - понедельник
+        return func.date(column, 'weekday 0', '-6 days')
+    return func.date(func.date_trunc('week', column))
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value
+
+
+def build_portfolio_series(start, end):
+    """
+    Создание и выполнение задач по неделям за [start, end] по всем проектам сразу.
+    Задача закрыта с момента completed_at (DONE и архивированные выполненные); задачи, архивированные
+    без выполнения, момента закрытия не имеют и в ряды не входят - иначе они навсегда остались бы открытыми.
+    Вся агрегация - в SQL (GROUP BY по недельным бакетам, UNION ALL двух рядов)
+    плюс один скалярный запрос для остатка открытых задач на начало периода;
+    в Python обрабатываются только недельные суммы, а не строки задач.
+    """
+    start, end = week_start(start), end
+    range_start = datetime.combine(start, datetime.min.time())
+    range_end = datetime.combine(end + timedelta(days=1), datetime.min.time())
+
+    created_week = week_bucket(Task.created_at)
+    completed_week = week_bucket(Task.completed_at)
+    # Архивированные без выполнения считаются закрытыми и не учитываются
+    counted = or_(Task.status != TaskStatus.ARCHIVED, Task.completed_at.isnot(None))
+    created_q = select(literal('created').label('kind'), created_week.label('week'),
+                       func.count(Task.id).label('n')) \
+        .where(Task.created_at >= range_start, Task.created_at < range_end, counted) \
+        .group_by(created_week)
+    completed_q = select(literal('completed').label('kind'), completed_week.label('week'),
+                         func.count(Task.id).label('n')) \
+        .where(Task.completed_at >= range_start, Task.completed_at < range_end) \
+        .group_by(completed_week)
+    rows = db.session.execute(union_all(created_q, completed_q)).all()
+
+    # Открыто на начало периода: создано раньше и не выполнено до начала
+    open_before = db.session.execute(
+        select(func.count(Task.id)).where(
+            Task.created_at < range_start, counted,
+            or_(Task.completed_at.is_(None), Task.completed_at >= range_start)
+        )
+    ).scalar() or 0
+
+    weeks = []
+    week = start
+    while week <= end:
+        weeks.append(week)
+        week += timedelta(weeks=1)
+    index = {week: i for i, week in enumerate(weeks)}
+
+    created = [0] * len(weeks)
+    completed = [0] * len(weeks)
+    for kind, bucket, count in rows:
+        i = index.get(_as_date(bucket))
+        if i is None:
+            continue
+        if kind == 'created':
+            created[i] = count
+        else:
+            completed[i] = count
+
+    net = (c - d for c, d in zip(created, completed))
+    open_tasks = tuple(accumulate(net, initial=open_before))[1:]
+
+    return PortfolioSeries(start=start, end=end, weeks=tuple(weeks),
+                           created=tuple(created), completed=tuple(completed),
+                           open_tasks=open_tasks)
@@ -0,0 +1,142 @@
+// app/static/js/main.js
+
+// --- Поток уведомлений (Server-Sent Events) ---
+// Обновляет счетчик в навбаре без перезагрузки страницы.
+// EventSource сам переподключается и передает Last-Event-ID, поэтому уведомления не теряются.
+// Сервер дает адрес потока (data-stream-url) только под асинхронными воркерами; иначе
+// счетчик, как и раньше, обновляется при загрузке страницы.
+(function () {
+    const link = document.getElementById('notifications-link');
+    if (!link || !link.dataset.streamUrl || !window.EventSource) {
+        return;
+    }
+    const badge = document.getElementById('notifications-badge');
+    const counter = badge ? badge.querySelector('.js-unread-count') : null;
+
+    function setUnread(count) {
+        if (!badge || !counter) {
+            return;
+        }
+        counter.textContent = count;
+        badge.classList.toggle('d-none', count === 0);
+        link.classList.toggle('text-warning', count > 0);
+    }
+
+    const source = new EventSource(link.dataset.streamUrl);
+    source.addEventListener('notification', function (event) {
+        const data = JSON.parse(event.data);
+        setUnread(data.unread);
+        link.title = data.message;
+    });
+    source.addEventListener('unread', function (event) {
+        setUnread(JSON.parse(event.data).unread);
+    });
+})();
+
+// --- Порционная загрузка файлов к задачам ---
+// Файл отправляется порциями (PUT с заголовком Upload-Offset). Неудачная порция повторяется,
+// а ID незавершенной загрузки хранится в localStorage - при повторном выборе того же файла
+// загрузка продолжится с принятого сервером смещения.
+function uploadTaskFile(input) {
+    const form = input.form;
+    const file = input.files[0];
+    if (!file) {
+        return;
+    }
+    if (!window.fetch || !form.dataset.initUrl) {
+        form.submit(); // Старый браузер - обычная отправка формы
+        return;
+    }
+
+    const csrfToken = document.querySelector('meta[name="csrf-token"]').content;
+    const progress = form.querySelector('.js-upload-progress');
+    const resumeKey = 'upload:' + form.dataset.initUrl + ':' + file.name + ':' + file.size + ':' + file.lastModified;
+    const maxRetries = 5;
+
+    function showProgress(offset) {
+        if (progress) {
+            progress.textContent = file.size ? Math.floor(offset * 100 / file.size) + '%' : '';
+        }
+    }
+
+    function request(method, url, body, headers) {
+        return fetch(url, {
+            method: method,
+            body: body,
+            credentials: 'same-origin',
+            headers: Object.assign({'X-CSRFToken': csrfToken}, headers || {})
+        });
+    }
+
+    async function startOrResume() {
+        const savedUrl = localStorage.getItem(resumeKey);
+        if (savedUrl) {
+            const response = await fetch(savedUrl, {credentials: 'same-origin'});
+            if (response.ok) {
+                return {url: savedUrl, state: await response.json()};
+            }
+            localStorage.removeItem(resumeKey);
+        }
+        const response = await request('POST', form.dataset.initUrl,
+            JSON.stringify({filename: file.name, size: file.size}), {'Content-Type': 'application/json'});
+        const state = await response.json();
+        if (!response.ok) {
+            throw new Error(state.error || response.statusText);
+        }
+        localStorage.setItem(resumeKey, state.url);
+        return {url: state.url, state: state};
+    }
+
+    async function sendChunks(url, state) {
+        let offset = state.offset;
+        let retries = 0;
+        while (offset < file.size) {
+            const chunk = file.slice(offset, offset + state.chunk_size);
+            let response;
+            try {
+                response = await request('PUT', url, chunk,
+                    {'Content-Type': 'application/octet-stream', 'Upload-Offset': String(offset)});
+            } catch (networkError) {
+                response = null;
+            }
+            if (response && response.ok) {
+                offset = (await response.json()).offset;
+                retries = 0;
+                showProgress(offset);
+                continue;
+            }
+            if (response && response.status === 409) {
+                offset = (await response.json()).offset; // Сервер уже принял больше (или меньше) - сверяемся
+                continue;
+            }
+            if (response && response.status < 500 && response.status !== 408) {
+                throw new Error(((await response.json().catch(() => ({}))).error) || response.statusText);
+            }
+            if (++retries > maxRetries) {
+                throw new Error('Соединение прервано. Выберите файл снова, чтобы продолжить загрузку.');
+            }
+            await new Promise(resolve => setTimeout(resolve, 1000 * 2 ** retries));
+        }
+        const response = await request('POST', url + '/complete');
+        const result = await response.json();
+        if (!response.ok) {
+            throw new Error(result.error || response.statusText);
+        }
+        return result;
+    }
+
+    (async function () {
+        try {
+            const upload = await startOrResume();
+            showProgress(upload.state.offset);
+            const result = await sendChunks(upload.url, upload.state);
+            localStorage.removeItem(resumeKey);
+            window.location.href = result.redirect;
+        } catch (error) {
+            if (progress) {
+                progress.textContent = '';
+            }
+            alert('Ошибка при загрузке файла: ' + error.message);
+        }
+    })();
+}
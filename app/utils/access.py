@@ -0,0 +1,66 @@
+# app/utils/access.py
+import threading
+import time
+from flask import g, current_app, has_app_context
+from sqlalchemy import select, union
+from app.extensions import db
+from app.models import Project, project_members
+
+# --- Межзапросный кэш: user_id -> (время загрузки, frozenset ID проектов) ---
+# Живет в памяти процесса, поэтому в каждом воркере свой экземпляр.
+# Явная инвалидация действует только в текущем процессе, остальные воркеры
+# увидят изменения не позже чем через PROJECT_ACCESS_CACHE_TTL секунд.
+_shared_cache = {}
+_shared_lock = threading.Lock()
+
+
+def _cache_ttl():
+    if not has_app_context():
+        return 0
+    return current_app.config.get('PROJECT_ACCESS_CACHE_TTL', 0) or 0
+
+
+def _load_project_ids(user_id):
+    """Один запрос: проекты, где пользователь владелец, плюс проекты, где он участник."""
+    owned = select(Project.id).where(Project.owner_id == user_id)
+    member_of = select(project_members.c.project_id).where(project_members.c.user_id == user_id)
+    rows = db.session.execute(union(owned, member_of)).scalars()
+    return frozenset(rows)
+
+
+def accessible_project_ids(user_id):
+    """
+    Возвращает frozenset ID проектов, доступных пользователю (владелец или участник).
+    В пределах запроса загружается не больше одного раза (кэш в flask.g),
+    между запросами - опционально кэшируется на PROJECT_ACCESS_CACHE_TTL секунд.
+    """
+    request_cache = g.setdefault('_accessible_project_ids', {})
+    if user_id in request_cache:
+        return request_cache[user_id]
+
+    ttl = _cache_ttl()
+    project_ids = None
+    if ttl > 0:
+        with _shared_lock:
+            entry = _shared_cache.get(user_id)
+        if entry and time.monotonic() - entry[0] < ttl:
+            project_ids = entry[1]
+
+    if project_ids is None:
+        project_ids = _load_project_ids(user_id)
+        if ttl > 0:
+            with _shared_lock:
+                _shared_cache[user_id] = (time.monotonic(), project_ids)
+
+    request_cache[user_id] = project_ids
+    return project_ids
+
+
+def invalidate_project_access(*user_ids):
+    """Сбрасывает кэш доступа для указанных пользователей (вызывать после изменения состава проекта)."""
+    request_cache = g.get('_accessible_project_ids') if has_app_context() else None
+    with _shared_lock:
+        for user_id in user_ids:
+            _shared_cache.pop(user_id, None)
+            if request_cache is not None:
+                request_cache.pop(user_id, None)
@@ -0,0 +1,417 @@
+# app/utils/bulk_import.py
+import csv
+import gzip
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timezone
+from sqlalchemy import insert, select
+from app.extensions import db
+from app.projects.export import CSV_FORMULA_PREFIXES
+from app.models import (
+    User, Project, Task, Comment, TaskStatusEvent, AnalyticsWatermark, ImportKey,
+    TaskStatus, TaskPriority, TASK_STATUS_CODES, project_members
+)
+
+# --- Потоковый импорт из другого трекера (flask import) ---
+# Файл читается построчно и обрабатывается порциями по chunk_size записей: на порцию - несколько
+# запросов (поиск уже импортированных ID, INSERT ... executemany через Core, журнал статусов,
+# соответствия ID) и один коммит. ORM-объекты не создаются, память не растет с размером файла.
+# Ссылки между записями - по ID внешней системы (таблица import_key): проекты и пользователи
+# разрешаются по словарям в памяти (их немного), задачи для комментариев - одним IN-запросом на порцию.
+# Число обработанных записей файла хранится водяным знаком (analytics_watermark) и меняется
+# в той же транзакции, что и порция: прерванный импорт продолжается с первой незакоммиченной записи.
+IMPORT_KINDS = ('projects', 'tasks', 'comments')
+IMPORT_FORMATS = ('csv', 'jsonl')
+DEFAULT_CHUNK_SIZE = 2000
+# Сколько отклоненных записей перечислять в отчете (остальные только считаются)
+MAX_REPORTED_PROBLEMS = 20
+
+# Тип записи в import_key для каждого вида импорта
+_KEY_KINDS = {'projects': 'project', 'tasks': 'task', 'comments': 'comment'}
+# Длина колонки import_key.external_id: более длинный ID отклоняется, а не обрезается
+# (обрезанные ID с общим началом совпали бы, и вторая запись считалась бы уже импортированной)
+EXTERNAL_ID_MAX_LENGTH = ImportKey.__table__.c.external_id.type.length
+
+
+class RecordRejected(ValueError):
+    """Запись нельзя импортировать (нет обязательного поля, неизвестная ссылка и т.п.)."""
+
+
+class ImportStats:
+    def __init__(self, start_record=0):
+        self.start_record = start_record # Сколько записей было обработано до этого запуска
+        self.read = 0       # Прочитано записей в этом запуске
+        self.inserted = 0   # Добавлено
+        self.existing = 0   # Уже были импортированы ранее (по внешнему ID)
+        self.rejected = 0   # Отклонены
+        self.problems = []  # Первые MAX_REPORTED_PROBLEMS причин отклонения
+        self.started = time.monotonic()
+
+    def reject(self, record_no, reason):
+        self.rejected += 1
+        if len(self.problems) < MAX_REPORTED_PROBLEMS:
+            self.problems.append((record_no, reason))
+
+    @property
+    def rate(self):
+        return self.read / max(time.monotonic() - self.started, 1e-6)
+
+
+# === Чтение файла ===
+def detect_format(path):
+    name = path[:-3] if path.endswith('.gz') else path
+    return 'jsonl' if name.endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def _open_text(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, 'r', encoding='utf-8-sig', newline='')
+
+
+def _csv_value(value):
+    """Пустая ячейка - отсутствующее значение; апостроф перед формулой снимается (см. flask export)."""
+    if not value: # '' или None (в строке меньше ячеек, чем в заголовке)
+        return None
+    if value.startswith("'") and value[1:].startswith(CSV_FORMULA_PREFIXES):
+        return value[1:]
+    return value
+
+
+def read_records(path, fmt):
+    """Генератор записей файла (номер записи с 1, словарь полей); файл читается построчно."""
+    with _open_text(path) as stream:
+        if fmt == 'csv':
+            for number, row in enumerate(csv.DictReader(stream), start=1):
+                yield number, {key: _csv_value(value) for key, value in row.items() if key}
+        else:
+            number = 0
+            for line in stream:
+                if not line.strip():
+                    continue
+                number += 1
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                yield number, record if isinstance(record, dict) else {'__invalid__': line[:80]}
+
+
+def _chunks(records, chunk_size):
+    chunk = []
+    for item in records:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# === Разбор значений ===
+def _text(record, field, required=False, max_length=None):
+    value = record.get(field)
+    if value is not None and not isinstance(value, str):
+        value = str(value)
+    value = value.strip() if value else None
+    if required and not value:
+        raise RecordRejected(f"нет поля '{field}'")
+    if value and max_length and len(value) > max_length:
+        value = value[:max_length]
+    return value
+
+
+def _external_id(record, field):
+    value = _text(record, field)
+    if value and len(value) > EXTERNAL_ID_MAX_LENGTH:
+        raise RecordRejected(f"значение поля '{field}' длиннее {EXTERNAL_ID_MAX_LENGTH} символов")
+    return value
+
+
+def _datetime(record, field):
+    value = record.get(field)
+    if value in (None, ''):
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        raise RecordRejected(f"неверная дата в поле '{field}': {value!r}")
+    if parsed.tzinfo is not None: # В БД - наивное UTC-время, как datetime.utcnow()
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _enum(enum_class, record, field, default):
+    """Значение Enum по имени ('DONE') или по подписи ('Выполнено')."""
+    value = _text(record, field)
+    if value is None:
+        return default
+    if value.upper() in enum_class.__members__:
+        return enum_class[value.upper()]
+    for member in enum_class:
+        if member.value.lower() == value.lower():
+            return member
+    raise RecordRejected(f"неверное значение поля '{field}': {value!r}")
+
+
+def _list(record, field):
+    value = record.get(field)
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return [str(item) for item in value if item not in (None, '')]
+    return [item.strip() for item in str(value).replace(',', ';').split(';') if item.strip()]
+
+
+# === Словари соответствий ===
+class _Lookups:
+    """Пользователи (email и имя) и импортированные проекты: загружаются один раз на импорт."""
+    def __init__(self, default_user=None):
+        self.users = {}
+        for user_id, username, email in db.session.execute(select(User.id, User.username, User.email)):
+            self.users[email.lower()] = user_id
+            self.users[username] = user_id
+        self.default_user_id = None
+        if default_user:
+            self.default_user_id = self.user_id(default_user)
+            if self.default_user_id is None:
+                raise ValueError(f"Пользователь по умолчанию '{default_user}' не найден.")
+        self._projects = None
+
+    def user_id(self, value):
+        if not value:
+            return None
+        value = str(value).strip()
+        return self.users.get(value.lower()) or self.users.get(value)
+
+    def required_user_id(self, record, field):
+        """Обязательный пользователь (владелец, автор); неизвестный заменяется --default-user."""
+        user_id = self.user_id(record.get(field)) or self.default_user_id
+        if user_id is None:
+            raise RecordRejected(f"пользователь '{record.get(field)}' не найден (задайте --default-user)")
+        return user_id
+
+    @property
+    def projects(self):
+        if self._projects is None:
+            self._projects = dict(db.session.execute(
+                select(ImportKey.external_id, Project.id)
+                .join(Project, Project.id == ImportKey.local_id)
+                .where(ImportKey.kind == _KEY_KINDS['projects'])
+            ).all())
+        return self._projects
+
+
+def _existing_keys(kind, external_ids):
+    return set(db.session.execute(
+        select(ImportKey.external_id).where(ImportKey.kind == kind, ImportKey.external_id.in_(external_ids))
+    ).scalars())
+
+
+def _task_map(external_ids):
+    """Внешний ID задачи -> (ID задачи, ID проекта); один запрос на порцию комментариев."""
+    rows = db.session.execute(
+        select(ImportKey.external_id, Task.id, Task.project_id)
+        .join(Task, Task.id == ImportKey.local_id)
+        .where(ImportKey.kind == _KEY_KINDS['tasks'], ImportKey.external_id.in_(external_ids))
+    ).all()
+    return {row.external_id: (row.id, row.project_id) for row in rows}
+
+
+def _insert_returning_ids(table, rows):
+    """
+    INSERT многих строк одним executemany с получением новых ID в порядке строк
+    (SQLAlchemy 2.0 insertmanyvalues: SQLite >= 3.35, PostgreSQL). Без поддержки - построчно.
+    """
+    if not rows:
+        return []
+    dialect = db.session.get_bind().dialect
+    if dialect.insert_executemany_returning_sort_by_parameter_order:
+        result = db.session.execute(
+            insert(table).returning(table.c.id, sort_by_parameter_order=True), rows
+        )
+        return list(result.scalars())
+    return [db.session.execute(insert(table), row).inserted_primary_key[0] for row in rows]
+
+
+# === Порции по видам записей ===
+def _prepare_project(record, lookups, now):
+    values = {
+        'name': _text(record, 'name', required=True, max_length=150),
+        'description': _text(record, 'description'),
+        'owner_id': lookups.required_user_id(record, 'owner'),
+        'created_at': _datetime(record, 'created_at') or now,
+        'data_version': 0,
+        'max_upload_size': None,
+    }
+    members = {lookups.user_id(member) for member in _list(record, 'members')}
+    members.discard(None)
+    members.discard(values['owner_id'])
+    return values, members
+
+
+def _prepare_task(record, lookups, now):
+    project_key = _text(record, 'project')
+    project_id = lookups.projects.get(project_key) if project_key else None
+    if project_id is None:
+        raise RecordRejected(f"проект '{project_key}' не импортирован")
+    status = _enum(TaskStatus, record, 'status', TaskStatus.TODO)
+    created_at = _datetime(record, 'created_at') or now
+    completed_at = None
+    if status == TaskStatus.DONE: # Как Task.set_status: момент выполнения есть у DONE
+        completed_at = _datetime(record, 'completed_at') or created_at
+    elif status == TaskStatus.ARCHIVED: # и у архивированных выполненных задач
+        completed_at = _datetime(record, 'completed_at')
+    values = {
+        'title': _text(record, 'title', required=True, max_length=200),
+        'description': _text(record, 'description'),
+        'status': status,
+        'priority': _enum(TaskPriority, record, 'priority', TaskPriority.MEDIUM),
+        'created_at': created_at,
+        'due_date': _datetime(record, 'due_date'),
+        'completed_at': completed_at,
+        'project_id': project_id,
+        'assignee_id': lookups.user_id(record.get('assignee')), # Неизвестный исполнитель - без исполнителя
+        'creator_id': lookups.required_user_id(record, 'creator'),
+    }
+    return values, None
+
+
+def _prepare_comment(record, lookups, now, tasks):
+    task_key = _text(record, 'task')
+    task = tasks.get(task_key) if task_key else None
+    if task is None:
+        raise RecordRejected(f"задача '{task_key}' не импортирована")
+    values = {
+        'body': _text(record, 'body', required=True),
+        'created_at': _datetime(record, 'created_at') or now,
+        'user_id': lookups.required_user_id(record, 'author'),
+        'task_id': task[0],
+    }
+    return values, None
+
+
+_TABLES = {'projects': Project.__table__, 'tasks': Task.__table__, 'comments': Comment.__table__}
+
+
+def _import_chunk(kind, chunk, lookups, stats):
+    key_kind = _KEY_KINDS[kind]
+    now = datetime.utcnow()
+
+    # Внешние ID порции; повтор внутри файла считается уже импортированным
+    keyed = []
+    for record_no, record in chunk:
+        if '__invalid__' in record:
+            stats.reject(record_no, "строка не является JSON-объектом")
+            continue
+        try:
+            external_id = _external_id(record, 'id')
+        except RecordRejected as e:
+            stats.reject(record_no, str(e))
+            continue
+        if not external_id:
+            stats.reject(record_no, "нет поля 'id'")
+            continue
+        keyed.append((record_no, external_id, record))
+    if not keyed:
+        return
+
+    seen = _existing_keys(key_kind, {external_id for _, external_id, _ in keyed})
+    tasks = _task_map({_text(record, 'task') for _, _, record in keyed} - {None}) \
+        if kind == 'comments' else None
+
+    prepared = []
+    for record_no, external_id, record in keyed:
+        if external_id in seen:
+            stats.existing += 1
+            continue
+        seen.add(external_id)
+        try:
+            if kind == 'projects':
+                values, extra = _prepare_project(record, lookups, now)
+            elif kind == 'tasks':
+                values, extra = _prepare_task(record, lookups, now)
+            else:
+                values, extra = _prepare_comment(record, lookups, now, tasks)
+        except RecordRejected as e:
+            stats.reject(record_no, str(e))
+            continue
+        prepared.append((external_id, values, extra))
+    if not prepared:
+        return
+
+    new_ids = _insert_returning_ids(_TABLES[kind], [values for _, values, _ in prepared])
+    db.session.execute(insert(ImportKey), [
+        {'kind': key_kind, 'external_id': external_id, 'local_id': local_id}
+        for (external_id, _, _), local_id in zip(prepared, new_ids)
+    ])
+
+    if kind == 'projects':
+        member_rows = [{'project_id': local_id, 'user_id': user_id}
+                       for (_, _, members), local_id in zip(prepared, new_ids) for user_id in members]
+        if member_rows:
+            db.session.execute(insert(project_members), member_rows)
+        lookups.projects.update((external_id, local_id) for (external_id, _, _), local_id in zip(prepared, new_ids))
+    elif kind == 'tasks':
+        # Core INSERT не вызывает обработчик after_insert модели - журнал статусов пишем сами
+        db.session.execute(insert(TaskStatusEvent), [
+            {'task_id': local_id, 'project_id': values['project_id'], 'user_id': values['creator_id'],
+             'from_status': None, 'to_status': TASK_STATUS_CODES[values['status']],
+             'created_at': values['created_at']}
+            for (_, values, _), local_id in zip(prepared, new_ids)
+        ])
+        Project.bump_data_versions(values['project_id'] for _, values, _ in prepared) # Кэш отчетов
+    stats.inserted += len(new_ids)
+
+
+# === Импорт файла ===
+def checkpoint_name(kind, path):
+    """Имя водяного знака для файла: путь, размер и время изменения (другой файл - другой знак)."""
+    info = os.stat(path)
+    fingerprint = f"{os.path.realpath(path)}:{info.st_size}:{info.st_mtime_ns}"
+    return f"import:{kind}:{hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()[:16]}"
+
+
+def import_file(kind, path, fmt=None, chunk_size=DEFAULT_CHUNK_SIZE, default_user=None,
+                restart=False, progress=None):
+    """
+    Импортирует записи kind ('projects', 'tasks', 'comments') из CSV или JSONL файла порциями.
+    Каждая порция и водяной знак файла коммитятся вместе; повторный запуск продолжает
+    с места остановки (restart=True - с начала; уже импортированные записи пропускаются по ID).
+    progress(stats) вызывается после каждой порции. Возвращает ImportStats.
+    """
+    if kind not in IMPORT_KINDS:
+        raise ValueError(f"Неизвестный вид записей: {kind}")
+    fmt = fmt or detect_format(path)
+    lookups = _Lookups(default_user)
+
+    name = checkpoint_name(kind, path)
+    watermark = db.session.get(AnalyticsWatermark, name)
+    if watermark is None:
+        watermark = AnalyticsWatermark(name=name, last_event_id=0)
+        db.session.add(watermark)
+    if restart:
+        watermark.last_event_id = 0
+    start_record = watermark.last_event_id # Для импорта - номер последней обработанной записи
+    db.session.commit()
+
+    stats = ImportStats(start_record)
+    records = ((number, record) for number, record in read_records(path, fmt) if number > start_record)
+    for chunk in _chunks(records, chunk_size):
+        try:
+            _import_chunk(kind, chunk, lookups, stats)
+            db.session.execute(
+                AnalyticsWatermark.__table__.update()
+                .where(AnalyticsWatermark.name == name)
+                .values(last_event_id=chunk[-1][0], updated_at=datetime.utcnow())
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        stats.read += len(chunk)
+        if progress:
+            progress(stats)
+    return stats
@@ -0,0 +1,197 @@
+# app/utils/db_profiles.py
+import logging
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+logger = logging.getLogger(__name__)
+
+# --- Профили движка БД (DATABASE_PROFILE) ---
+# SQLite: PRAGMA выполняются на каждом новом соединении (часть из них действует только на соединение).
+#   WAL - читатели не блокируют писателя и наоборот; synchronous=NORMAL в режиме WAL безопасен
+#   для целостности и не делает fsync на каждый коммит; busy_timeout - писатель ждет блокировку
+#   вместо немедленной ошибки "database is locked" при записи из нескольких воркеров Gunicorn.
+# Серверные БД (PostgreSQL, MySQL): размер пула соединений на процесс, проверка соединения перед
+#   выдачей из пула (pre_ping) и пересоздание старых соединений (recycle) после обрывов и таймаутов.
+ENGINE_PROFILES = {
+    'sqlite-wal': {
+        'pragmas': {
+            'busy_timeout': 5000,           # мс; первым - смена режима журнала тоже ждет блокировку
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'cache_size': -64 * 1024,       # отрицательное значение - в КБ: 64 МБ на соединение
+            'mmap_size': 256 * 1024 * 1024, # байт
+            'temp_store': 'MEMORY',
+        },
+    },
+    # Файл БД на сетевой файловой системе, где WAL недоступен: прежний журнал, но с ожиданием блокировки
+    'sqlite-legacy': {
+        'pragmas': {
+            'busy_timeout': 5000,
+            'journal_mode': 'DELETE',
+        },
+    },
+    'server': {
+        'engine_options': {
+            'pool_size': 10,
+            'max_overflow': 20,
+            'pool_timeout': 30,
+            'pool_pre_ping': True,
+            'pool_recycle': 1800,
+        },
+    },
+    # Много воркеров при ограниченном max_connections сервера (или пулер соединений перед БД)
+    'server-small': {
+        'engine_options': {
+            'pool_size': 2,
+            'max_overflow': 3,
+            'pool_timeout': 30,
+            'pool_pre_ping': True,
+            'pool_recycle': 1800,
+        },
+    },
+}
+
+# Переопределения параметров профиля из конфигурации (None - значение профиля)
+_POOL_OVERRIDES = {'DB_POOL_SIZE': 'pool_size', 'DB_MAX_OVERFLOW': 'max_overflow', 'DB_POOL_RECYCLE': 'pool_recycle'}
+_PRAGMA_OVERRIDES = {'SQLITE_BUSY_TIMEOUT_MS': 'busy_timeout', 'SQLITE_CACHE_SIZE_KB': 'cache_size',
+                     'SQLITE_MMAP_SIZE': 'mmap_size'}
+
+# Значения PRAGMA, которые SQLite возвращает не в том виде, в каком их задают
+_PRAGMA_NAMES = {
+    'synchronous': {0: 'OFF', 1: 'NORMAL', 2: 'FULL', 3: 'EXTRA'},
+    'temp_store': {0: 'DEFAULT', 1: 'FILE', 2: 'MEMORY'},
+}
+
+
+def is_sqlite(uri):
+    return make_url(uri).get_backend_name() == 'sqlite'
+
+
+def _is_memory(uri):
+    return make_url(uri).database in (None, '', ':memory:')
+
+
+def resolve_profile(config):
+    """
+    Имя и параметры профиля из DATABASE_PROFILE ('auto' - по типу БД в SQLALCHEMY_DATABASE_URI)
+    с учетом переопределений из конфигурации. Профиль для БД другого типа - ошибка конфигурации.
+    """
+    uri = config['SQLALCHEMY_DATABASE_URI']
+    name = config.get('DATABASE_PROFILE') or 'auto'
+    if name == 'auto':
+        name = 'sqlite-wal' if is_sqlite(uri) else 'server'
+    if name not in ENGINE_PROFILES:
+        raise ValueError(f"Неизвестный DATABASE_PROFILE '{name}' (допустимо: auto, {', '.join(ENGINE_PROFILES)}).")
+    if name.startswith('sqlite') != is_sqlite(uri):
+        raise ValueError(f"DATABASE_PROFILE '{name}' не подходит для {make_url(uri).get_backend_name()}.")
+
+    profile = ENGINE_PROFILES[name]
+    pragmas = dict(profile.get('pragmas', {}))
+    for key, pragma in _PRAGMA_OVERRIDES.items():
+        if pragmas and config.get(key) is not None:
+            pragmas[pragma] = -config[key] if pragma == 'cache_size' else config[key]
+    engine_options = dict(profile.get('engine_options', {}))
+    for key, option in _POOL_OVERRIDES.items():
+        if engine_options and config.get(key) is not None:
+            engine_options[option] = config[key]
+    return name, pragmas, engine_options
+
+
+def configure_engine_options(app):
+    """
+    Вызывается до db.init_app: добавляет параметры пула профиля в SQLALCHEMY_ENGINE_OPTIONS
+    (явно заданные там значения имеют приоритет). Возвращает (имя профиля, PRAGMA).
+    """
+    name, pragmas, engine_options = resolve_profile(app.config)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {**engine_options, **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})}
+    app.extensions['db_profile'] = {'name': name, 'pragmas': pragmas}
+    return name, pragmas
+
+
+def install_profile(app, engine):
+    """
+    Вызывается после db.init_app: PRAGMA профиля на каждом новом соединении SQLite и самопроверка
+    на первом соединении процесса (после fork у каждого воркера - свое). Самопроверка пишет
+    фактические настройки в лог (INFO), а не применившиеся значения - предупреждением.
+    """
+    profile = app.extensions['db_profile']
+    pragmas = profile['pragmas']
+    if pragmas:
+        @event.listens_for(engine, 'connect')
+        def _apply_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                for pragma, value in pragmas.items():
+                    cursor.execute(f"PRAGMA {pragma} = {value}")
+            finally:
+                cursor.close()
+
+    # Соединение без запроса к БД при старте: проверка выполняется, когда соединение понадобится
+    @event.listens_for(engine, 'connect', once=True)
+    def _self_check(dbapi_connection, connection_record):
+        try:
+            if pragmas:
+                cursor = dbapi_connection.cursor()
+                try:
+                    compared = _compare(cursor, pragmas)
+                finally:
+                    cursor.close()
+                memory = _is_memory(str(engine.url)) # У БД в памяти свой журнал, WAL не применяется
+                for pragma, requested, effective in compared:
+                    if not memory and str(requested).upper() != str(effective).upper():
+                        logger.warning("Database profile %s: PRAGMA %s requested %s, effective %s",
+                                       profile['name'], pragma, requested, effective)
+                settings = ', '.join(f"{pragma}={effective}" for pragma, _, effective in compared)
+            else:
+                options = app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+                settings = ', '.join(f"{option}={value}" for option, value in options.items())
+            logger.info("Database profile %s (%s): %s", profile['name'], engine.dialect.name, settings)
+        except Exception as e: # Самопроверка не должна мешать работе соединения
+            logger.warning("Database profile self-check failed: %s", e)
+
+
+def _read_pragma(cursor, pragma):
+    row = cursor.execute(f"PRAGMA {pragma}").fetchone()
+    if row is None: # Например, mmap_size у БД в памяти
+        return None
+    return _PRAGMA_NAMES.get(pragma, {}).get(row[0], row[0])
+
+
+def _compare(cursor, pragmas):
+    return [(pragma, requested, _read_pragma(cursor, pragma)) for pragma, requested in pragmas.items()]
+
+
+def engine_report(app, engine):
+    """
+    Фактические настройки движка (flask db-info): профиль, для SQLite - PRAGMA, прочитанные
+    с живого соединения, для серверных БД - параметры пула и версия сервера.
+    Возвращает список строк (параметр, заданное значение, фактическое значение).
+    """
+    profile = app.extensions.get('db_profile', {})
+    rows = [('profile', profile.get('name'), profile.get('name')),
+            ('dialect', None, f"{engine.dialect.name}+{engine.dialect.driver}"),
+            ('pool', None, type(engine.pool).__name__)]
+    with engine.connect() as connection:
+        if engine.dialect.name == 'sqlite':
+            cursor = connection.connection.cursor()
+            try:
+                rows.append(('sqlite_version', None, cursor.execute("SELECT sqlite_version()").fetchone()[0]))
+                pragmas = profile.get('pragmas') or {}
+                for pragma in ('journal_mode', 'synchronous', 'busy_timeout', 'cache_size', 'mmap_size', 'temp_store'):
+                    rows.append((pragma, pragmas.get(pragma), _read_pragma(cursor, pragma)))
+            finally:
+                cursor.close()
+        else:
+            rows.append(('server_version', None, '.'.join(str(part) for part in engine.dialect.server_version_info or ())))
+            options = app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+            pool = engine.pool
+            effective = {
+                'pool_size': pool.size() if hasattr(pool, 'size') else None,
+                'max_overflow': getattr(pool, '_max_overflow', None),
+                'pool_timeout': getattr(pool, '_timeout', None),
+                'pool_pre_ping': getattr(pool, '_pre_ping', None),
+                'pool_recycle': getattr(pool, '_recycle', None),
+            }
+            for option, value in effective.items():
+                rows.append((option, options.get(option), value))
+    return rows
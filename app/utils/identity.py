@@ -0,0 +1,123 @@
+# app/utils/identity.py
+import threading
+import time
+from flask import current_app, has_app_context
+from sqlalchemy import event, select
+from sqlalchemy.orm import joinedload, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from app.extensions import db
+from app.models import User, Role
+
+# --- Кэш пользователя для Flask-Login: user_id -> (время загрузки, значения колонок User) ---
+# Храним значения, а не ORM-объекты: объект принадлежит сессии одного запроса.
+# Из значений объект собирается без запроса к БД и присоединяется к сессии текущего запроса.
+# Как и кэш доступа к проектам (app/utils/access.py), живет в памяти процесса:
+# явная инвалидация действует в текущем воркере, остальные увидят изменения не позже чем через USER_CACHE_TTL.
+_user_cache = {}
+_user_lock = threading.Lock()
+_USER_COLUMNS = tuple(column.key for column in User.__mapper__.column_attrs)
+
+# --- Кэш таблицы ролей: role_id -> name (две строки, меняются только через flask init-db) ---
+_roles = None
+_roles_lock = threading.Lock()
+
+
+def _cache_ttl():
+    if not has_app_context():
+        return 0
+    return current_app.config.get('USER_CACHE_TTL', 0) or 0
+
+
+def role_names():
+    """Словарь role_id -> имя роли; загружается одним запросом на процесс."""
+    global _roles
+    with _roles_lock:
+        roles = _roles
+    if roles is None:
+        roles = dict(db.session.execute(select(Role.id, Role.name)).all())
+        with _roles_lock:
+            _roles = roles
+    return roles
+
+
+def invalidate_roles():
+    global _roles
+    with _roles_lock:
+        _roles = None
+
+
+def load_user(user_id):
+    """
+    user_loader для Flask-Login. Пользователь и его роль загружаются одним запросом (JOIN),
+    а в пределах USER_CACHE_TTL - вообще без запросов, из кэша значений.
+    """
+    user_id = int(user_id)
+    ttl = _cache_ttl()
+    if ttl > 0:
+        with _user_lock:
+            entry = _user_cache.get(user_id)
+        if entry and time.monotonic() - entry[0] < ttl:
+            return _attach(entry[1])
+
+    user = db.session.execute(
+        select(User).options(joinedload(User.role)).where(User.id == user_id)
+    ).scalar_one_or_none()
+    if user is not None and ttl > 0:
+        values = {key: getattr(user, key) for key in _USER_COLUMNS}
+        with _user_lock:
+            _user_cache[user_id] = (time.monotonic(), values)
+    return user
+
+
+def _attach(values):
+    # Собираем User (и Role из кэша ролей) как уже загруженные и присоединяем к сессии без SELECT
+    user = User.__mapper__.class_manager.new_instance()
+    for key, value in values.items():
+        set_committed_value(user, key, value)
+    role = None
+    role_id = values.get('role_id')
+    roles = role_names()
+    if role_id is not None and role_id not in roles:
+        # Роль добавлена после загрузки кэша (flask init-db в другом процессе) - перечитываем таблицу
+        invalidate_roles()
+        roles = role_names()
+    role_name = roles.get(role_id)
+    if role_name is not None:
+        role = Role.__mapper__.class_manager.new_instance()
+        set_committed_value(role, 'id', role_id)
+        set_committed_value(role, 'name', role_name)
+        make_transient_to_detached(role)
+    set_committed_value(user, 'role', role)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+def invalidate_user(*user_ids):
+    """
+    Сбрасывает кэш указанных пользователей (без аргументов - всех). Вызывать при изменении
+    полей User. Сброс повторяется после коммита: запрос, прочитавший старые данные до коммита,
+    не оставит их в кэше.
+    """
+    _forget(user_ids)
+    if has_app_context():
+        pending = db.session.info.setdefault('invalidated_users', set())
+        pending.update(user_ids or (None,))
+
+
+def _forget(user_ids):
+    with _user_lock:
+        if not user_ids:
+            _user_cache.clear()
+        for user_id in user_ids:
+            _user_cache.pop(user_id, None)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_after_commit(session):
+    user_ids = session.info.pop('invalidated_users', None)
+    if user_ids:
+        _forget(() if None in user_ids else tuple(user_ids))
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('invalidated_users', None)
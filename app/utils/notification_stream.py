@@ -0,0 +1,140 @@
+# app/utils/notification_stream.py
+import json
+import queue
+import threading
+import time
+from sqlalchemy import event, select
+from app.extensions import db
+from app.models import Notification, User
+
+
+class NotificationHub:
+    """
+    Pub/sub в памяти процесса: подписчики - открытые SSE-потоки, ключ - ID пользователя.
+    Хаб передает только сигнал "есть новое"; сами уведомления поток читает из БД по курсору
+    (последний отданный id), поэтому сигнал можно потерять или получить дважды без вреда.
+    Очереди и блокировки из стандартной библиотеки под gevent становятся "зелеными",
+    так что ожидающий поток не занимает системный поток.
+    """
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        wakeup = queue.Queue(maxsize=1)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(wakeup)
+        return wakeup
+
+    def unsubscribe(self, user_id, wakeup):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers is not None:
+                subscribers.discard(wakeup)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def publish(self, user_ids):
+        with self._lock:
+            targets = [wakeup for user_id in user_ids for wakeup in self._subscribers.get(user_id, ())]
+        for wakeup in targets:
+            try:
+                wakeup.put_nowait(True)
+            except queue.Full:
+                pass # Сигнал уже ждет обработки
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+notification_hub = NotificationHub()
+
+
+# --- Публикация после коммита ---
+# add_notifications лишь запоминает получателей в сессии; сигнал уходит только после
+# успешного коммита, чтобы поток не прочитал БД раньше, чем уведомление станет видно.
+_PENDING_KEY = 'pending_notification_recipients'
+
+def queue_publish(user_ids):
+    db.session.info.setdefault(_PENDING_KEY, set()).update(user_ids)
+
+@event.listens_for(db.session, 'after_commit')
+def _publish_after_commit(session):
+    recipients = session.info.pop(_PENDING_KEY, None)
+    if recipients:
+        notification_hub.publish(recipients)
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+# --- Формирование потока ---
+def _sse(event_name, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event_name}')
+    lines.append(f'data: {json.dumps(data, ensure_ascii=False)}')
+    return '\n'.join(lines) + '\n\n'
+
+STREAM_BATCH_SIZE = 50
+
+def _fetch_new(user_id, last_id, limit=STREAM_BATCH_SIZE):
+    """Уведомления новее курсора и текущий счетчик непрочитанных (два запроса по индексам)."""
+    rows = db.session.execute(
+        select(Notification.id, Notification.message, Notification.related_url, Notification.timestamp)
+        .where(Notification.user_id == user_id, Notification.id > last_id)
+        .order_by(Notification.id).limit(limit)
+    ).all()
+    unread = db.session.execute(
+        select(User.unread_notifications_count).where(User.id == user_id)
+    ).scalar() or 0
+    return rows, unread
+
+def latest_notification_id(user_id):
+    return db.session.execute(
+        select(Notification.id).where(Notification.user_id == user_id)
+        .order_by(Notification.id.desc()).limit(1)
+    ).scalar() or 0
+
+def notification_events(user_id, last_id, poll_seconds=15, max_seconds=600):
+    """
+    Генератор событий SSE для пользователя.
+    Просыпается по сигналу хаба (тот же процесс) или по таймауту poll_seconds (уведомления,
+    созданные другими воркерами), между проверками соединение с БД возвращается в пул.
+    Через max_seconds поток завершается - браузер переподключится с Last-Event-ID.
+    """
+    wakeup = notification_hub.subscribe(user_id)
+    deadline = time.monotonic() + max_seconds
+    last_unread = None
+    try:
+        yield f'retry: {int(poll_seconds * 1000)}\n\n'
+        while True:
+            rows, unread = _fetch_new(user_id, last_id)
+            db.session.remove() # Не держим соединение, пока ждем
+            for notification_id, message, related_url, timestamp in rows:
+                last_id = notification_id
+                yield _sse('notification', {
+                    'id': notification_id,
+                    'message': message,
+                    'url': related_url,
+                    'timestamp': timestamp.isoformat() if timestamp else None,
+                    'unread': unread,
+                }, event_id=notification_id)
+            if unread != last_unread and not rows:
+                yield _sse('unread', {'unread': unread}) # Например, уведомления прочитаны в другой вкладке
+            last_unread = unread
+            if len(rows) == STREAM_BATCH_SIZE:
+                continue # Отстали больше чем на порцию - дочитываем без ожидания
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                wakeup.get(timeout=min(poll_seconds, remaining))
+            except queue.Empty:
+                yield ': ping\n\n' # Комментарий-heartbeat держит соединение через прокси
+    finally:
+        notification_hub.unsubscribe(user_id, wakeup)
@@ -1,28 +1,116 @@
 # app/utils/notifications.py
 from app.models import Notification, User
 from app.extensions import db
+from app.utils.notification_stream import queue_publish
+from app.utils.identity import invalidate_user # Счетчик хранится в кэше пользователя
+from collections import Counter, defaultdict
+from datetime import datetime
 from flask import url_for
+from sqlalchemy import case, func, insert, select
 
-def add_notification(recipient_id, message, related_url=None):
-    """Создает и сохраняет уведомление для пользователя."""
-    if not recipient_id:
-        print("WARNING: Tried to send notification without recipient_id")
-        return
+def adjust_unread_count(user_id, delta):
+    """Атомарно меняет счетчик непрочитанных уведомлений (в текущей транзакции, не ниже нуля)."""
+    counter = User.unread_notifications_count
+    User.query.filter_by(id=user_id).update(
+        {counter: case((counter + delta > 0, counter + delta), else_=0)},
+        synchronize_session=False
+    )
+    invalidate_user(user_id)
 
-    # Проверяем, существует ли пользователь (опционально, но полезно)
-    recipient = User.query.get(recipient_id)
-    if not recipient:
-        print(f"WARNING: Recipient user with ID {recipient_id} not found for notification.")
-        return
+def rebuild_unread_counts():
+    """
+    Пересчитывает счетчики непрочитанных уведомлений всех пользователей одним UPDATE.
+    Обновляются только расходящиеся строки; возвращает их количество.
+    """
+    actual_count = select(func.count(Notification.id)).where(
+        Notification.user_id == User.id,
+        Notification.is_read.is_(False)
+    ).scalar_subquery()
+    result = db.session.execute(
+        User.__table__.update()
+        .where(User.unread_notifications_count != actual_count)
+        .values(unread_notifications_count=actual_count)
+    )
+    invalidate_user()
+    db.session.commit()
+    return result.rowcount
+
+def mark_all_read(user_id):
+    """
+    Помечает все непрочитанные уведомления пользователя одним UPDATE
+    и уменьшает счетчик на число реально обновленных строк. Коммит - на вызывающей стороне.
+    """
+    marked_count = Notification.query.filter_by(user_id=user_id, is_read=False).update(
+        {Notification.is_read: True}, synchronize_session=False
+    )
+    if marked_count:
+        adjust_unread_count(user_id, -marked_count)
+        queue_publish([user_id]) # Другие вкладки обновят счетчик
+    return marked_count
+
+def add_notifications(recipient_ids, message, related_url=None):
+    """
+    Создает одно и то же уведомление для нескольких пользователей.
+    Получатели проверяются одним IN-запросом, уведомления пишутся одним bulk INSERT,
+    счетчики непрочитанных увеличиваются одним UPDATE. Коммит - на вызывающей стороне.
+    Возвращает число созданных уведомлений.
+    """
+    recipient_ids = {recipient_id for recipient_id in recipient_ids if recipient_id}
+    return _insert_notifications([(user_id, message, related_url) for user_id in sorted(recipient_ids)])
+
+def _insert_notifications(items):
+    """
+    Пишет уведомления (user_id, message, related_url) одним bulk INSERT.
+    Несуществующие получатели отбрасываются (один IN-запрос), счетчики непрочитанных
+    увеличиваются одним UPDATE на каждое различающееся число новых уведомлений.
+    """
+    items = [item for item in items if item[0]]
+    if not items:
+        return 0
 
+    # Отбрасываем несуществующих пользователей
+    recipient_ids = {user_id for user_id, _, _ in items}
+    existing_ids = set(db.session.execute(
+        select(User.id).where(User.id.in_(recipient_ids))
+    ).scalars())
+    missing_ids = recipient_ids - existing_ids
+    if missing_ids:
+        print(f"WARNING: Recipient users {sorted(missing_ids)} not found for notification.")
+    items = [item for item in items if item[0] in existing_ids]
+    if not items:
+        return 0
+
+    timestamp = datetime.utcnow()
     try:
-        notification = Notification(user_id=recipient_id,
-                                    message=message,
-                                    related_url=related_url)
-        db.session.add(notification)
-        print(f"Notification created for User {recipient_id}: {message}") # Отладка
+        db.session.execute(insert(Notification), [
+            {'user_id': user_id, 'message': message, 'related_url': related_url,
+             'timestamp': timestamp, 'is_read': False}
+            for user_id, message, related_url in items
+        ])
+        # Счетчики меняются в той же транзакции; пользователи с одинаковым приростом - одним UPDATE
+        added = Counter(user_id for user_id, _, _ in items)
+        users_by_delta = defaultdict(list)
+        for user_id, delta in added.items():
+            users_by_delta[delta].append(user_id)
+        counter = User.unread_notifications_count
+        for delta, user_ids in users_by_delta.items():
+            User.query.filter(User.id.in_(user_ids)).update(
+                {counter: counter + delta}, synchronize_session=False
+            )
+        invalidate_user(*existing_ids)
+        queue_publish(existing_ids) # Открытые SSE-потоки получат сигнал после коммита
+        print(f"Notifications created for Users {sorted(existing_ids)}: {len(items)}") # Отладка
     except Exception as e:
-        print(f"ERROR creating notification for User {recipient_id}: {e}")
+        print(f"ERROR creating notifications for Users {sorted(existing_ids)}: {e}")
+        raise
+    return len(items)
+
+def add_notification(recipient_id, message, related_url=None):
+    """Создает уведомление для одного пользователя (см. add_notifications)."""
+    if not recipient_id:
+        print("WARNING: Tried to send notification without recipient_id")
+        return
+    add_notifications([recipient_id], message, related_url)
 
 # --- Примеры сообщений ---
 def notify_task_assigned(task, assigner, assignee):
@@ -32,29 +120,46 @@ def notify_task_assigned(task, assigner, assignee):
         url = url_for('projects.view_project', project_id=task.project_id, _anchor=f'task-{task.id}')
         add_notification(assignee.id, msg, url)
 
-def notify_new_comment(comment, task):
-    """Уведомляет участников задачи о новом комментарии."""
+def notify_tasks_assigned(assignments, assigner):
+    """
+    Уведомления о назначении сразу многих задач (пакетные операции API): одним bulk INSERT.
+    assignments - пары (задача, ID исполнителя); задача - любой объект с id, title и project_id.
+    """
+    items = []
+    for task, assignee_id in assignments:
+        if assignee_id and assignee_id != assigner.id: # Не уведомляем себя
+            msg = f"Пользователь @{assigner.username} назначил вам задачу: '{task.title}'"
+            url = url_for('projects.view_project', project_id=task.project_id, _anchor=f'task-{task.id}')
+            items.append((assignee_id, msg, url))
+    return _insert_notifications(items)
+
+def notify_new_comment(comment, task, project=None, author=None):
+    """
+    Уведомляет участников задачи о новом комментарии.
+    project и author можно передать уже загруженными, чтобы не делать ленивых запросов.
+    """
+    project = project or task.project
+    author = author or comment.author
     recipients = set() # Используем set для уникальности ID
     commenter_id = comment.user_id
 
     # Уведомить владельца проекта (если он не автор комментария)
-    if task.project.owner_id != commenter_id:
-        recipients.add(task.project.owner_id)
+    if project.owner_id != commenter_id:
+        recipients.add(project.owner_id)
 
     # Уведомить исполнителя задачи (если назначен и не автор комментария)
     if task.assignee_id and task.assignee_id != commenter_id:
         recipients.add(task.assignee_id)
 
     # Уведомить создателя задачи (если он не владелец, не исполнитель и не автор комментария)
-    if task.creator_id not in [task.project.owner_id, task.assignee_id, commenter_id]:
+    if task.creator_id not in [project.owner_id, task.assignee_id, commenter_id]:
          recipients.add(task.creator_id)
 
 
-    msg = f"Новый комментарий от @{comment.author.username} к задаче '{task.title}'"
+    msg = f"Новый комментарий от @{author.username} к задаче '{task.title}'"
     url = url_for('projects.view_project', project_id=task.project_id, _anchor=f'task-{task.id}')
 
-    for user_id in recipients:
-        add_notification(user_id, msg, url)
+    add_notifications(recipients, msg, url)
 
 
 def notify_user_added_to_project(user_added, project, adder):
@@ -0,0 +1,145 @@
+# app/utils/pagination.py
+import base64
+import enum
+import json
+from datetime import datetime
+from flask import abort, request
+from sqlalchemy import and_, or_, tuple_, Enum as SAEnum, DateTime
+
+
+class InvalidCursor(ValueError):
+    """Курсор пагинации поврежден или не соответствует порядку сортировки."""
+
+
+class KeysetPage:
+    """
+    Страница keyset-пагинации (по курсору вместо OFFSET).
+    Курсоры - непрозрачные строки для параметров ?after=... / ?before=...
+    """
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+# --- Кодирование курсора ---
+def _dump_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.name
+    return value
+
+def _load_value(column, value):
+    if value is None:
+        return None
+    column_type = column.type
+    if isinstance(column_type, DateTime):
+        return datetime.fromisoformat(value)
+    if isinstance(column_type, SAEnum) and column_type.enum_class is not None:
+        return column_type.enum_class[value]
+    return value
+
+def encode_cursor(item, order):
+    values = [_dump_value(getattr(item, column.key)) for column, _ in order]
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, order):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if not isinstance(values, list) or len(values) != len(order):
+            raise InvalidCursor(cursor)
+        return [_load_value(column, value) for (column, _), value in zip(order, values)]
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor(cursor) from e
+
+
+# --- Построение условия "после курсора" ---
+def seek_clause(order, values, backwards):
+    """
+    Условие лексикографического сравнения ключа сортировки с курсором.
+    Если все направления одинаковые - используем сравнение кортежей (row value),
+    оно превращается в один диапазон по составному индексу.
+    """
+    directions = {direction for _, direction in order}
+    columns = [column for column, _ in order]
+    if len(directions) == 1:
+        ascending = (directions.pop() == 'asc') != backwards
+        key, bound = tuple_(*columns), tuple_(*values)
+        return key > bound if ascending else key < bound
+
+    # Разные направления - раскрываем в OR по префиксам: (a > x) OR (a = x AND b < y) ...
+    clauses = []
+    for i, (column, direction) in enumerate(order):
+        ascending = (direction == 'asc') != backwards
+        prefix = [order[j][0] == values[j] for j in range(i)]
+        step = column > values[i] if ascending else column < values[i]
+        clauses.append(and_(*prefix, step))
+    return or_(*clauses)
+
+def _order_by(order, backwards):
+    result = []
+    for column, direction in order:
+        ascending = (direction == 'asc') != backwards
+        result.append(column.asc() if ascending else column.desc())
+    return result
+
+
+def keyset_paginate(query, order, after=None, before=None, per_page=20):
+    """
+    Keyset-пагинация запроса.
+    order - список пар (колонка, 'asc' | 'desc'); последняя колонка должна быть уникальной (обычно id),
+    чтобы порядок был стабильным. Каждая страница - ограниченный диапазон индекса, без OFFSET.
+    """
+    backwards = before is not None and after is None
+    cursor = before if backwards else after
+
+    if cursor:
+        query = query.filter(seek_clause(order, decode_cursor(cursor, order), backwards))
+    rows = query.order_by(*_order_by(order, backwards)).limit(per_page + 1).all()
+
+    has_more = len(rows) > per_page
+    items = rows[:per_page]
+    if backwards:
+        items.reverse()
+
+    if not items:
+        return KeysetPage(items)
+
+    if backwards:
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, bool(cursor)
+
+    return KeysetPage(
+        items,
+        next_cursor=encode_cursor(items[-1], order) if has_next else None,
+        prev_cursor=encode_cursor(items[0], order) if has_prev else None
+    )
+
+
+def keyset_page_from_request(query, order, per_page=20):
+    """Берет курсоры из ?after= / ?before= текущего запроса; на битый курсор отвечает 400."""
+    try:
+        return keyset_paginate(query, order,
+                               after=request.args.get('after') or None,
+                               before=request.args.get('before') or None,
+                               per_page=per_page)
+    except InvalidCursor:
+        abort(400, description="Неверный курсор пагинации.")
@@ -0,0 +1,145 @@
+# app/utils/passwords.py
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+from flask import current_app
+from app.utils.server import worker_kind, request_concurrency
+
+# Стоимость bcrypt по умолчанию (как у Flask-Bcrypt); задается BCRYPT_LOG_ROUNDS
+DEFAULT_LOG_ROUNDS = 12
+
+
+class PasswordHashingBusy(Exception):
+    """Очередь хеширования паролей переполнена: запрос нужно повторить позже (HTTP 503)."""
+
+
+# --- Ограниченный пул хеширования ---
+# bcrypt отпускает GIL на время вычисления, поэтому несколько потоков пула хешируют параллельно,
+# а число одновременных хеширований не превышает PASSWORD_HASH_WORKERS (обычно число ядер).
+# Волна входов после выкладки ждет в очереди ограниченной длины, остальным запросам остается CPU;
+# сверх PASSWORD_HASH_QUEUE_LIMIT запрос сразу получает 503 вместо долгого ожидания.
+# Очередь своя у каждого процесса и имеет смысл, только когда процесс обслуживает много запросов
+# сразу (воркеры gthread и gevent): по умолчанию хешированием занята не больше половины потоков
+# (соединений) воркера, остальные отвечают на прочие запросы. Синхронный воркер обслуживает один
+# запрос, ждать в очереди в нем некому - там хеш считается прямо в потоке запроса, без пула,
+# а от волны входов его защищает только очередь соединений Gunicorn.
+class PasswordHashingPool:
+    def __init__(self):
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    @staticmethod
+    def _workers():
+        return current_app.config.get('PASSWORD_HASH_WORKERS') or os.cpu_count() or 1
+
+    def _queue_limit(self):
+        limit = current_app.config.get('PASSWORD_HASH_QUEUE_LIMIT')
+        if limit:
+            return limit
+        concurrency = request_concurrency()
+        if concurrency is None: # Не под Gunicorn (flask run): по два ожидающих на поток пула
+            return self._workers() * 2
+        return max(1, min(concurrency // 2, self._workers() * 2))
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def run(self, func, *args):
+        """Выполняет func(*args) в пуле и ждет результат; PasswordHashingBusy, если очередь заполнена."""
+        kind = worker_kind()
+        if kind == 'sync':
+            return func(*args) # Один запрос на процесс: пул добавил бы только переключение потока
+        limit = self._queue_limit()
+        with self._lock:
+            if self._in_flight >= limit:
+                raise PasswordHashingBusy()
+            self._in_flight += 1
+        try:
+            if kind == 'gevent':
+                # Воркеры gevent: потоки подменены гринлетами, поэтому считаем в настоящих потоках хаба,
+                # ждет только текущий гринлет
+                import gevent
+                threadpool = gevent.get_hub().threadpool
+                threadpool.maxsize = self._workers()
+                return threadpool.apply(func, args)
+            return self._get_executor().submit(func, *args).result()
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._workers(),
+                                                    thread_name_prefix='password-hash')
+            return self._executor
+
+
+password_pool = PasswordHashingPool()
+
+
+# --- Хеширование и проверка ---
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+def _check(password_hash, password):
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+    except ValueError: # Поврежденный или не-bcrypt хеш
+        return False
+
+def log_rounds():
+    return current_app.config.get('BCRYPT_LOG_ROUNDS') or DEFAULT_LOG_ROUNDS
+
+def hash_password(password, rounds=None):
+    """bcrypt-хеш пароля со стоимостью BCRYPT_LOG_ROUNDS (формат совместим с Flask-Bcrypt)."""
+    return password_pool.run(_hash, password, rounds or log_rounds())
+
+def verify_password(password_hash, password):
+    if not password_hash:
+        return False
+    return password_pool.run(_check, password_hash, password)
+
+def hash_cost(password_hash):
+    """Стоимость (log2 раундов), с которой построен хеш вида $2b$12$..., или None."""
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+def needs_rehash(password_hash):
+    """Хеш построен с другой стоимостью, чем задана сейчас (пересчитывается при следующем входе)."""
+    return hash_cost(password_hash) != log_rounds()
+
+
+# --- Замер пропускной способности (flask bench-passwords) ---
+def benchmark(rounds, seconds=2.0, threads=None):
+    """
+    Сколько проверок пароля (= входов) в секунду выдерживает машина при стоимости rounds:
+    в одном потоке (одно ядро) и в threads потоках одновременно.
+    Возвращает (мс на проверку, входов/с на одно ядро, входов/с всего, потоков).
+    """
+    threads = threads or os.cpu_count() or 1
+    password_hash = _hash('benchmark-password', rounds)
+
+    def loop(deadline):
+        done = 0
+        while time.perf_counter() < deadline:
+            _check(password_hash, 'benchmark-password')
+            done += 1
+        return done
+
+    started = time.perf_counter()
+    single = loop(started + seconds)
+    single_rate = single / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        futures = [executor.submit(loop, started + seconds) for _ in range(threads)]
+        total = sum(future.result() for future in futures)
+    total_rate = total / (time.perf_counter() - started)
+    return 1000.0 / single_rate, single_rate, total_rate, threads
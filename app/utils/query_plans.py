@@ -0,0 +1,99 @@
+# app/utils/query_plans.py
+import re
+from datetime import datetime
+from sqlalchemy import select, union, text
+from app.extensions import db
+from app.models import (
+    Project, Task, Comment, File, Notification, TaskStatus, TaskPriority, project_members
+)
+from app.utils.pagination import seek_clause
+
+# Пример значений параметров; планировщику важна форма запроса, а не данные
+SAMPLE_ID = 1
+SAMPLE_IDS = [1, 2, 3]
+SAMPLE_TIME = datetime(2025, 1, 1)
+
+
+def hot_queries():
+    """
+    Горячие запросы приложения в той же форме, в какой их строят view.
+    Возвращает список пар (название, select).
+    """
+    from app.projects.routes import TASK_PAGE_ORDER, TASKS_PER_PAGE, PROJECTS_PER_PAGE
+    from app.projects.export import export_query
+
+    task_cursor = [TaskStatus.TODO, TaskPriority.MEDIUM, SAMPLE_TIME, SAMPLE_ID]
+    feed_order = [(Notification.timestamp, 'desc'), (Notification.id, 'desc')]
+    project_order = [(Project.created_at, 'desc'), (Project.id, 'desc')]
+    member_project_ids = select(project_members.c.project_id).where(project_members.c.user_id == SAMPLE_ID)
+
+    def ordered(order):
+        return [column.asc() if direction == 'asc' else column.desc() for column, direction in order]
+
+    return [
+        # projects.view_project -> load_project_page: первая и следующая страницы задач
+        ('task page', select(Task).where(Task.project_id == SAMPLE_ID)
+            .order_by(*ordered(TASK_PAGE_ORDER)).limit(TASKS_PER_PAGE + 1)),
+        ('task page after cursor', select(Task).where(Task.project_id == SAMPLE_ID,
+                                                      seek_clause(TASK_PAGE_ORDER, task_cursor, False))
+            .order_by(*ordered(TASK_PAGE_ORDER)).limit(TASKS_PER_PAGE + 1)),
+        ('tasks by assignee', select(Task.id).where(Task.assignee_id == SAMPLE_ID)),
+        ('comments of task page', select(Comment).where(Comment.task_id.in_(SAMPLE_IDS))
+            .order_by(Comment.task_id, Comment.created_at.asc(), Comment.id)),
+        ('files of task page', select(File).where(File.task_id.in_(SAMPLE_IDS)).order_by(File.task_id, File.id)),
+        ('files of project', select(File).where(File.project_id == SAMPLE_ID)),
+        ('project members', select(project_members.c.user_id).where(project_members.c.project_id == SAMPLE_ID)),
+        # User.can_access_project -> accessible_project_ids
+        ('accessible project ids', union(select(Project.id).where(Project.owner_id == SAMPLE_ID),
+                                         member_project_ids)),
+        # projects.list_projects
+        ('project list page', select(Project).where(
+                (Project.owner_id == SAMPLE_ID) | Project.id.in_(member_project_ids))
+            .order_by(*ordered(project_order)).limit(PROJECTS_PER_PAGE + 1)),
+        # dashboard.notifications: лента и пометка прочитанными
+        ('notification feed', select(Notification).where(Notification.user_id == SAMPLE_ID)
+            .order_by(*ordered(feed_order)).limit(21)),
+        ('notification feed after cursor', select(Notification).where(
+                Notification.user_id == SAMPLE_ID, seek_clause(feed_order, [SAMPLE_TIME, SAMPLE_ID], False))
+            .order_by(*ordered(feed_order)).limit(21)),
+        # projects.export_project / flask export: выгрузка задач и комментариев проекта
+        ('task export', export_query(SAMPLE_ID, 'tasks')),
+        ('comment export', export_query(SAMPLE_ID, 'comments')),
+        ('unread notifications', select(Notification.id).where(
+                Notification.user_id == SAMPLE_ID, Notification.is_read.is_(False))),
+    ]
+
+
+# --- Разбор планов ---
+_SQLITE_FULL_SCAN = re.compile(r'^SCAN (?!CONSTANT ROW)(\S+)(?!.*USING (COVERING )?INDEX)')
+_POSTGRES_FULL_SCAN = re.compile(r'Seq Scan on (\S+)')
+
+
+def explain(statement):
+    """Возвращает строки плана выполнения запроса для текущей БД."""
+    dialect = db.engine.dialect
+    # Значения подставляем литералами: EXPLAIN выполняется как отдельная строка SQL
+    sql = str(statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+    if dialect.name == 'sqlite':
+        return [row[-1] for row in db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}'))]
+    return [row[0] for row in db.session.execute(text(f'EXPLAIN {sql}'))]
+
+
+def full_scans(plan_lines):
+    """Имена таблиц, которые план читает полным сканированием."""
+    pattern = _SQLITE_FULL_SCAN if db.engine.dialect.name == 'sqlite' else _POSTGRES_FULL_SCAN
+    tables = []
+    for line in plan_lines:
+        match = pattern.search(line.strip())
+        if match:
+            tables.append(match.group(1))
+    return tables
+
+
+def check_query_plans():
+    """Проверяет все горячие запросы; возвращает список (название, план, таблицы с полным сканом)."""
+    results = []
+    for name, statement in hot_queries():
+        plan = explain(statement)
+        results.append((name, plan, full_scans(plan)))
+    return results
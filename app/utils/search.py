@@ -0,0 +1,185 @@
+# app/utils/search.py
+import re
+from dataclasses import dataclass
+from typing import Optional
+from markupsafe import Markup, escape
+from sqlalchemy import select, text
+from app.extensions import db
+from app.models import Project, Task
+from app.utils.access import accessible_project_ids
+
+# --- Полнотекстовый индекс (SQLite FTS5) ---
+# Одна виртуальная таблица на задачи, комментарии и проекты. Тип и ID записи закодированы в rowid
+# (rowid = id * 4 + тип), поэтому триггеры обновляют и удаляют строку индекса по rowid, без просмотра.
+# Индекс поддерживают триггеры БД: он не расходится с данными ни при изменениях через ORM,
+# ни при массовых UPDATE/DELETE. Схема та же, что в миграции 7c1e9a4b2d60.
+SEARCH_TABLE = 'search_index'
+KIND_PROJECT = 1
+KIND_TASK = 2
+KIND_COMMENT = 3
+# Сколько результатов показываем и сколько слов запроса учитываем
+SEARCH_RESULTS_LIMIT = 50
+SEARCH_MAX_TERMS = 10
+# Маркеры найденных слов во фрагменте (заменяются на <mark> после экранирования)
+_HIT_START, _HIT_END = '\x02', '\x03'
+
+
+def _fold(expression):
+    # unicode61 не приравнивает "ё" к "е": приводим текст при индексации и запрос при поиске
+    return f"replace(replace({expression}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+SCHEMA_STATEMENTS = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+        title, body, project_id UNINDEXED, task_id UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )""",
+    # Проекты; триггер на UPDATE только по name/description - частые изменения data_version его не трогают
+    f"""CREATE TRIGGER IF NOT EXISTS search_project_ai AFTER INSERT ON project BEGIN
+        INSERT INTO search_index (rowid, title, body, project_id, task_id)
+        VALUES (NEW.id * 4 + 1, {_fold('NEW.name')}, {_fold("COALESCE(NEW.description, '')")}, NEW.id, NULL);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS search_project_au AFTER UPDATE OF name, description ON project BEGIN
+        DELETE FROM search_index WHERE rowid = OLD.id * 4 + 1;
+        INSERT INTO search_index (rowid, title, body, project_id, task_id)
+        VALUES (NEW.id * 4 + 1, {_fold('NEW.name')}, {_fold("COALESCE(NEW.description, '')")}, NEW.id, NULL);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_project_ad AFTER DELETE ON project BEGIN
+        DELETE FROM search_index WHERE rowid = OLD.id * 4 + 1;
+    END""",
+    # Задачи
+    f"""CREATE TRIGGER IF NOT EXISTS search_task_ai AFTER INSERT ON task BEGIN
+        INSERT INTO search_index (rowid, title, body, project_id, task_id)
+        VALUES (NEW.id * 4 + 2, {_fold('NEW.title')}, {_fold("COALESCE(NEW.description, '')")}, NEW.project_id, NEW.id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS search_task_au AFTER UPDATE OF title, description, project_id ON task BEGIN
+        DELETE FROM search_index WHERE rowid = OLD.id * 4 + 2;
+        INSERT INTO search_index (rowid, title, body, project_id, task_id)
+        VALUES (NEW.id * 4 + 2, {_fold('NEW.title')}, {_fold("COALESCE(NEW.description, '')")}, NEW.project_id, NEW.id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_task_ad AFTER DELETE ON task BEGIN
+        DELETE FROM search_index WHERE rowid = OLD.id * 4 + 2;
+    END""",
+    # Комментарии (проект берется из задачи)
+    f"""CREATE TRIGGER IF NOT EXISTS search_comment_ai AFTER INSERT ON comment BEGIN
+        INSERT INTO search_index (rowid, title, body, project_id, task_id)
+        VALUES (NEW.id * 4 + 3, '', {_fold('NEW.body')},
+                (SELECT project_id FROM task WHERE id = NEW.task_id), NEW.task_id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS search_comment_au AFTER UPDATE OF body ON comment BEGIN
+        DELETE FROM search_index WHERE rowid = OLD.id * 4 + 3;
+        INSERT INTO search_index (rowid, title, body, project_id, task_id)
+        VALUES (NEW.id * 4 + 3, '', {_fold('NEW.body')},
+                (SELECT project_id FROM task WHERE id = NEW.task_id), NEW.task_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_comment_ad AFTER DELETE ON comment BEGIN
+        DELETE FROM search_index WHERE rowid = OLD.id * 4 + 3;
+    END""",
+]
+
+# Наполнение индекса из таблиц целиком (flask rebuild-search-index)
+_POPULATE_STATEMENTS = [
+    f"""INSERT INTO search_index (rowid, title, body, project_id, task_id)
+       SELECT id * 4 + 1, {_fold('name')}, {_fold("COALESCE(description, '')")}, id, NULL FROM project""",
+    f"""INSERT INTO search_index (rowid, title, body, project_id, task_id)
+       SELECT id * 4 + 2, {_fold('title')}, {_fold("COALESCE(description, '')")}, project_id, id FROM task""",
+    f"""INSERT INTO search_index (rowid, title, body, project_id, task_id)
+       SELECT comment.id * 4 + 3, '', {_fold('comment.body')}, task.project_id, comment.task_id
+       FROM comment JOIN task ON task.id = comment.task_id""",
+]
+
+
+@dataclass(frozen=True)
+class SearchHit:
+    kind: int
+    id: int
+    project_id: int
+    task_id: Optional[int]
+    title: str
+    snippet: Markup
+    project_name: str = ''
+    task_title: str = ''
+
+
+def search_supported():
+    """FTS5-индекс есть только в SQLite."""
+    return db.engine.dialect.name == 'sqlite'
+
+
+def build_match_query(raw_query):
+    """
+    Превращает ввод пользователя в безопасное выражение FTS5: каждое слово в кавычках
+    (операторы и спецсимволы FTS5 не интерпретируются), все слова обязательны,
+    слова от 3 символов ищутся по префиксу ("отч" найдет "отчет").
+    Возвращает None, если в запросе нет слов.
+    """
+    folded = (raw_query or '').replace('ё', 'е').replace('Ё', 'Е')
+    terms = re.findall(r'\w+', folded)[:SEARCH_MAX_TERMS]
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' if len(term) >= 3 else f'"{term}"' for term in terms)
+
+
+def _highlight(fragment):
+    # Экранируем текст пользователя, затем превращаем маркеры FTS5 в разметку
+    return Markup(str(escape(fragment)).replace(_HIT_START, '<mark>').replace(_HIT_END, '</mark>'))
+
+
+def search(user_id, raw_query, limit=SEARCH_RESULTS_LIMIT):
+    """
+    Ищет по задачам, комментариям и проектам, доступным пользователю (владелец или участник).
+    Результаты упорядочены по релевантности (BM25, совпадение в названии весит больше).
+    Названия проектов и задач для найденного подгружаются двумя запросами на всю выдачу.
+    """
+    match_query = build_match_query(raw_query)
+    project_ids = accessible_project_ids(user_id)
+    if match_query is None or not project_ids:
+        return []
+
+    rows = db.session.execute(
+        text(f"""
+            SELECT rowid, project_id, task_id, title,
+                   snippet(search_index, -1, :hit_start, :hit_end, '…', 16) AS fragment
+            FROM search_index
+            WHERE search_index MATCH :query
+              AND project_id IN ({', '.join(str(int(pid)) for pid in project_ids)})
+            ORDER BY bm25(search_index, 5.0, 1.0)
+            LIMIT :limit
+        """),
+        {'query': match_query, 'hit_start': _HIT_START, 'hit_end': _HIT_END, 'limit': limit}
+    ).all()
+    if not rows:
+        return []
+
+    task_ids = {row.task_id for row in rows if row.task_id is not None}
+    projects = dict(db.session.execute(
+        select(Project.id, Project.name).where(Project.id.in_({row.project_id for row in rows}))
+    ).all())
+    tasks = dict(db.session.execute(select(Task.id, Task.title).where(Task.id.in_(task_ids))).all()) \
+        if task_ids else {}
+
+    hits = []
+    for row in rows:
+        # Запись могла исчезнуть после построения индекса - такие строки пропускаем
+        if row.project_id not in projects or (row.task_id is not None and row.task_id not in tasks):
+            continue
+        hits.append(SearchHit(kind=row.rowid % 4, id=row.rowid // 4, project_id=row.project_id,
+                              task_id=row.task_id, title=row.title, snippet=_highlight(row.fragment),
+                              project_name=projects[row.project_id], task_title=tasks.get(row.task_id, '')))
+    return hits
+
+
+def rebuild_search_index():
+    """
+    Создает индекс и триггеры, если их нет, и заполняет индекс заново из таблиц
+    (одна транзакция: поиск во время перестроения видит старый индекс). Возвращает число записей.
+    """
+    with db.engine.begin() as connection:
+        for statement in SCHEMA_STATEMENTS:
+            connection.exec_driver_sql(statement)
+        connection.exec_driver_sql(f"DELETE FROM {SEARCH_TABLE}")
+        for statement in _POPULATE_STATEMENTS:
+            connection.exec_driver_sql(statement)
+        # Слияние сегментов индекса - быстрее последующие запросы
+        connection.exec_driver_sql(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+        return connection.exec_driver_sql(f"SELECT count(*) FROM {SEARCH_TABLE}").scalar()
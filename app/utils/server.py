@@ -0,0 +1,50 @@
+# app/utils/server.py
+try:
+    from gevent import monkey as gevent_monkey
+except ImportError: # gevent не установлен - обычные потоки
+    gevent_monkey = None
+
+# --- Модель воркеров, под которой запущено приложение ---
+# Gunicorn с gunicorn.conf.py по умолчанию запускает воркеры gevent: сокеты, очереди и блокировки
+# стандартной библиотеки подменены зелеными, и ожидающее соединение не занимает системный поток.
+# Синхронный воркер (или gthread) обслуживает столько запросов, сколько у него потоков.
+# Фактическую модель сообщает хук post_worker_init из gunicorn.conf.py (set_gunicorn_worker);
+# без Gunicorn (flask run, тесты) она неизвестна.
+_worker = {'kind': None, 'concurrency': None}
+
+
+def gevent_active():
+    """Процесс работает под gevent (воркер Gunicorn -k gevent пропатчил стандартную библиотеку)."""
+    return gevent_monkey is not None and gevent_monkey.is_module_patched('socket')
+
+
+def set_gunicorn_worker(worker):
+    """Запоминает класс воркера Gunicorn и число запросов, которые он обслуживает одновременно."""
+    name = type(worker).__name__.lower()
+    if 'gevent' in name:
+        _worker.update(kind='gevent', concurrency=worker.cfg.worker_connections)
+    elif 'thread' in name: # gthread (в том числе sync с threads > 1)
+        _worker.update(kind='gthread', concurrency=worker.cfg.threads)
+    else:
+        _worker.update(kind='sync', concurrency=1)
+
+
+def worker_kind():
+    """'gevent', 'gthread', 'sync' или None (не под Gunicorn)."""
+    return _worker['kind'] or ('gevent' if gevent_active() else None)
+
+
+def request_concurrency():
+    """Сколько запросов процесс обслуживает одновременно (None - неизвестно)."""
+    return _worker['concurrency']
+
+
+def notification_stream_enabled(app):
+    """
+    Открывать ли поток уведомлений (SSE). NOTIFICATION_STREAM: 'auto' - только под gevent,
+    где тысячи открытых соединений не занимают воркеры; '1' - всегда; '0' - никогда.
+    """
+    mode = str(app.config.get('NOTIFICATION_STREAM') or 'auto').lower()
+    if mode == 'auto':
+        return gevent_active()
+    return mode in ('1', 'true', 'on', 'yes')
@@ -8,8 +8,84 @@ class Config:
         'sqlite:///' + os.path.join(basedir, 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # --- Профиль движка БД (app/utils/db_profiles.py) ---
+    # 'auto' - по DATABASE_URL: SQLite -> 'sqlite-wal', иначе 'server'.
+    # Также 'sqlite-legacy' (без WAL, для сетевых ФС) и 'server-small' (маленький пул на процесс).
+    # Фактические настройки показывает flask db-info
+    DATABASE_PROFILE = os.environ.get('DATABASE_PROFILE') or 'auto'
+    # Переопределения параметров профиля (пусто - значение профиля)
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ['SQLITE_BUSY_TIMEOUT_MS']) if os.environ.get('SQLITE_BUSY_TIMEOUT_MS') else None
+    SQLITE_CACHE_SIZE_KB = int(os.environ['SQLITE_CACHE_SIZE_KB']) if os.environ.get('SQLITE_CACHE_SIZE_KB') else None
+    SQLITE_MMAP_SIZE = int(os.environ['SQLITE_MMAP_SIZE']) if os.environ.get('SQLITE_MMAP_SIZE') else None
+    DB_POOL_SIZE = int(os.environ['DB_POOL_SIZE']) if os.environ.get('DB_POOL_SIZE') else None
+    DB_MAX_OVERFLOW = int(os.environ['DB_MAX_OVERFLOW']) if os.environ.get('DB_MAX_OVERFLOW') else None
+    DB_POOL_RECYCLE = int(os.environ['DB_POOL_RECYCLE']) if os.environ.get('DB_POOL_RECYCLE') else None
+
+    # --- Хеширование паролей ---
+    # Стоимость bcrypt (log2 числа раундов); при изменении хеши пересчитываются при входе.
+    # Подобрать значение помогает flask bench-passwords
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS') or 12)
+    # Одновременных хеширований в процессе (по умолчанию - число ядер)
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS') or 0) or None
+    # Сколько входов процесса может хешировать или ждать хеширования; сверх этого - ответ 503.
+    # По умолчанию - половина потоков (соединений) воркера gthread/gevent, но не больше 2 на поток пула;
+    # в синхронных воркерах пула и очереди нет
+    PASSWORD_HASH_QUEUE_LIMIT = int(os.environ.get('PASSWORD_HASH_QUEUE_LIMIT') or 0) or None
+
+    # --- Кэш прав доступа к проектам ---
+    # Время жизни (сек) межзапросного кэша ID доступных проектов; 0 - только в пределах запроса
+    PROJECT_ACCESS_CACHE_TTL = int(os.environ.get('PROJECT_ACCESS_CACHE_TTL') or 0)
+
+    # --- Кэш пользователя (Flask-Login) ---
+    # Время жизни (сек) кэша текущего пользователя с ролью; 0 - загружать из БД на каждом запросе
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL') or 30)
+
+    # --- JSON API (/api/v1) ---
+    # Максимум элементов в одном пакетном запросе (POST /api/v1/tasks/batch)
+    API_BATCH_MAX_ITEMS = int(os.environ.get('API_BATCH_MAX_ITEMS') or 500)
+
+    # --- Дневные агрегаты статусов (flask rollup-status-events) ---
+    # На PostgreSQL и др. события обрабатываются только через столько секунд после появления:
+    # должно быть больше самой долгой транзакции, пишущей события (пакет API, порция импорта)
+    STATUS_ROLLUP_SETTLE_SECONDS = int(os.environ.get('STATUS_ROLLUP_SETTLE_SECONDS') or 300)
+
+    # --- Кэш отчетов по проектам ---
+    # Максимальное число отчетов в памяти процесса (LRU)
+    REPORT_CACHE_SIZE = int(os.environ.get('REPORT_CACHE_SIZE') or 256)
+
+    # --- Поток уведомлений (SSE) ---
+    # 'auto' - только под воркерами gevent (gunicorn.conf.py), '1' - всегда, '0' - выключен
+    NOTIFICATION_STREAM = os.environ.get('NOTIFICATION_STREAM') or 'auto'
+    # Как часто поток сам проверяет БД (уведомления из других воркеров), сек
+    NOTIFICATION_STREAM_POLL_SECONDS = int(os.environ.get('NOTIFICATION_STREAM_POLL_SECONDS') or 15)
+    # Максимальная длительность одного соединения; затем браузер переподключается
+    NOTIFICATION_STREAM_MAX_SECONDS = int(os.environ.get('NOTIFICATION_STREAM_MAX_SECONDS') or 600)
+
     # --- Настройки Загрузки Файлов ---
     UPLOAD_FOLDER = os.path.join(basedir, 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024
+    # Порционная загрузка больших файлов: каждая порция - отдельный запрос (меньше MAX_CONTENT_LENGTH)
+    UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE') or 8 * 1024 * 1024)
+    # Лимит размера одного файла по умолчанию (для проекта можно задать свой: flask set-upload-limit)
+    UPLOAD_MAX_FILE_SIZE = int(os.environ.get('UPLOAD_MAX_FILE_SIZE') or 1024 * 1024 * 1024)
+    # Хранилище содержимого файлов: 'local' (UPLOAD_FOLDER/blobs с подкаталогами) или 'модуль:Класс'
+    FILE_STORAGE_BACKEND = os.environ.get('FILE_STORAGE_BACKEND') or 'local'
+    # Число уровней подкаталогов (по 2 символа хеша): 2 -> blobs/ab/cd/abcd...
+    FILE_STORAGE_SHARD_DEPTH = int(os.environ.get('FILE_STORAGE_SHARD_DEPTH') or 2)
+    # Сверять содержимое с SHA-256 при скачивании (проверка кэшируется по размеру и mtime)
+    FILE_VERIFY_ON_DOWNLOAD = (os.environ.get('FILE_VERIFY_ON_DOWNLOAD') or '1') != '0'
+    # Отдача файлов фронтовым прокси после проверки прав: '' (приложение), 'x-accel' (Nginx), 'x-sendfile'
+    FILE_OFFLOAD_MODE = os.environ.get('FILE_OFFLOAD_MODE') or ''
+    # Для 'x-accel': internal-location Nginx, указывающая на UPLOAD_FOLDER
+    FILE_OFFLOAD_PREFIX = os.environ.get('FILE_OFFLOAD_PREFIX') or '/protected-uploads/'
+    # Превью картинок (нужен Pillow): размер стороны в пикселях, число процессов, лимит кэша на диске
+    THUMBNAILS_ENABLED = (os.environ.get('THUMBNAILS_ENABLED') or '1') != '0'
+    THUMBNAIL_SIZE = int(os.environ.get('THUMBNAIL_SIZE') or 160)
+    THUMBNAIL_WORKERS = int(os.environ.get('THUMBNAIL_WORKERS') or 2)
+    THUMBNAIL_CACHE_MAX_BYTES = int(os.environ.get('THUMBNAIL_CACHE_MAX_BYTES') or 256 * 1024 * 1024)
+    # Срок кэширования превью браузером (сек); содержимое файла не меняется
+    THUMBNAIL_MAX_AGE = 365 * 24 * 3600
+    # Незавершенные загрузки старше этого срока удаляет flask cleanup-uploads (часы)
+    UPLOAD_PARTIAL_TTL_HOURS = int(os.environ.get('UPLOAD_PARTIAL_TTL_HOURS') or 24)
     # Расширения, которые разрешено загружать
     ALLOWED_EXTENSIONS = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 'zip', 'rar'}
@@ -0,0 +1,29 @@
+# gunicorn.conf.py
+# Настройки Gunicorn для production; файл подхватывается автоматически при запуске из корня проекта:
+#   gunicorn            (или gunicorn -c gunicorn.conf.py)
+# Значения переопределяются переменными окружения GUNICORN_*.
+import os
+
+wsgi_app = 'run:app'
+bind = os.environ.get('GUNICORN_BIND') or '127.0.0.1:8000' # Для Nginx - например, unix:/run/klopit/gunicorn.sock
+
+# Асинхронные воркеры gevent: поток уведомлений (SSE) держит соединение открытым до
+# NOTIFICATION_STREAM_MAX_SECONDS, и под синхронными воркерами каждая открытая вкладка занимала бы
+# воркер целиком. Под gevent ожидающие соединения - зеленые потоки, воркер обслуживает тысячи.
+# С другим классом воркеров ('sync', 'gthread') приложение не открывает поток уведомлений.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS') or 'gevent'
+workers = int(os.environ.get('GUNICORN_WORKERS') or 2)
+# gevent: одновременных соединений на воркер
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS') or 2000)
+# gthread: потоков на воркер
+threads = int(os.environ.get('GUNICORN_THREADS') or 1)
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT') or 60)
+graceful_timeout = 30
+accesslog = '-'
+
+
+def post_worker_init(worker):
+    # Модель воркера - приложению: от нее зависят поток уведомлений и очередь хеширования паролей
+    from app.utils.server import set_gunicorn_worker
+    set_gunicorn_worker(worker)
@@ -0,0 +1,37 @@
+"""Add content-addressed blob storage with reference counts
+
+Revision ID: 0a7d35e9c412
+Revises: f2c64a1b8e39
+Create Date: 2026-10-18 14:22:03.118734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0a7d35e9c412'
+down_revision = 'f2c64a1b8e39'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('blob',
+    sa.Column('hash', sa.String(length=64), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('ref_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('hash')
+    )
+    # Существующие файлы лежат под собственными именами; content_hash проставит flask dedupe-files
+    op.execute("UPDATE file SET content_hash = NULL")
+    with op.batch_alter_table('file', schema=None) as batch_op:
+        batch_op.create_index('ix_file_content_hash', ['content_hash'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('file', schema=None) as batch_op:
+        batch_op.drop_index('ix_file_content_hash')
+
+    op.drop_table('blob')
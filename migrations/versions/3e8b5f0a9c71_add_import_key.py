@@ -0,0 +1,29 @@
+"""Add import_key table for bulk imports from external trackers
+
+Revision ID: 3e8b5f0a9c71
+Revises: 7c1e9a4b2d60
+Create Date: 2026-10-18 17:42:19.618304
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3e8b5f0a9c71'
+down_revision = '7c1e9a4b2d60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('import_key',
+    sa.Column('kind', sa.String(length=16), nullable=False),
+    sa.Column('external_id', sa.String(length=64), nullable=False),
+    sa.Column('local_id', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('kind', 'external_id')
+    )
+
+
+def downgrade():
+    op.drop_table('import_key')
@@ -0,0 +1,95 @@
+"""Add SQLite FTS5 search index over tasks, comments and projects
+
+Revision ID: 7c1e9a4b2d60
+Revises: 0a7d35e9c412
+Create Date: 2026-10-18 15:10:44.502913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c1e9a4b2d60'
+down_revision = '0a7d35e9c412'
+branch_labels = None
+depends_on = None
+
+
+# Индекс и триггеры, которые его поддерживают (копия app/utils/search.py на момент миграции)
+SCHEMA_STATEMENTS = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+        title, body, project_id UNINDEXED, task_id UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS search_project_ai AFTER INSERT ON project BEGIN
+        INSERT INTO search_index (rowid, title, body, project_id, task_id)
+        VALUES (NEW.id * 4 + 1, replace(replace(NEW.name, 'ё', 'е'), 'Ё', 'Е'), replace(replace(COALESCE(NEW.description, ''), 'ё', 'е'), 'Ё', 'Е'), NEW.id, NULL);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_project_au AFTER UPDATE OF name, description ON project BEGIN
+        DELETE FROM search_index WHERE rowid = OLD.id * 4 + 1;
+        INSERT INTO search_index (rowid, title, body, project_id, task_id)
+        VALUES (NEW.id * 4 + 1, replace(replace(NEW.name, 'ё', 'е'), 'Ё', 'Е'), replace(replace(COALESCE(NEW.description, ''), 'ё', 'е'), 'Ё', 'Е'), NEW.id, NULL);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_project_ad AFTER DELETE ON project BEGIN
+        DELETE FROM search_index WHERE rowid = OLD.id * 4 + 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_task_ai AFTER INSERT ON task BEGIN
+        INSERT INTO search_index (rowid, title, body, project_id, task_id)
+        VALUES (NEW.id * 4 + 2, replace(replace(NEW.title, 'ё', 'е'), 'Ё', 'Е'), replace(replace(COALESCE(NEW.description, ''), 'ё', 'е'), 'Ё', 'Е'), NEW.project_id, NEW.id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_task_au AFTER UPDATE OF title, description, project_id ON task BEGIN
+        DELETE FROM search_index WHERE rowid = OLD.id * 4 + 2;
+        INSERT INTO search_index (rowid, title, body, project_id, task_id)
+        VALUES (NEW.id * 4 + 2, replace(replace(NEW.title, 'ё', 'е'), 'Ё', 'Е'), replace(replace(COALESCE(NEW.description, ''), 'ё', 'е'), 'Ё', 'Е'), NEW.project_id, NEW.id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_task_ad AFTER DELETE ON task BEGIN
+        DELETE FROM search_index WHERE rowid = OLD.id * 4 + 2;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_comment_ai AFTER INSERT ON comment BEGIN
+        INSERT INTO search_index (rowid, title, body, project_id, task_id)
+        VALUES (NEW.id * 4 + 3, '', replace(replace(NEW.body, 'ё', 'е'), 'Ё', 'Е'),
+                (SELECT project_id FROM task WHERE id = NEW.task_id), NEW.task_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_comment_au AFTER UPDATE OF body ON comment BEGIN
+        DELETE FROM search_index WHERE rowid = OLD.id * 4 + 3;
+        INSERT INTO search_index (rowid, title, body, project_id, task_id)
+        VALUES (NEW.id * 4 + 3, '', replace(replace(NEW.body, 'ё', 'е'), 'Ё', 'Е'),
+                (SELECT project_id FROM task WHERE id = NEW.task_id), NEW.task_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_comment_ad AFTER DELETE ON comment BEGIN
+        DELETE FROM search_index WHERE rowid = OLD.id * 4 + 3;
+    END""",
+]
+
+POPULATE_STATEMENTS = [
+    """INSERT INTO search_index (rowid, title, body, project_id, task_id)
+       SELECT id * 4 + 1, replace(replace(name, 'ё', 'е'), 'Ё', 'Е'), replace(replace(COALESCE(description, ''), 'ё', 'е'), 'Ё', 'Е'), id, NULL FROM project""",
+    """INSERT INTO search_index (rowid, title, body, project_id, task_id)
+       SELECT id * 4 + 2, replace(replace(title, 'ё', 'е'), 'Ё', 'Е'), replace(replace(COALESCE(description, ''), 'ё', 'е'), 'Ё', 'Е'), project_id, id FROM task""",
+    """INSERT INTO search_index (rowid, title, body, project_id, task_id)
+       SELECT comment.id * 4 + 3, '', replace(replace(comment.body, 'ё', 'е'), 'Ё', 'Е'), task.project_id, comment.task_id
+       FROM comment JOIN task ON task.id = comment.task_id""",
+]
+
+TRIGGERS = ['search_project_ai', 'search_project_au', 'search_project_ad',
+            'search_task_ai', 'search_task_au', 'search_task_ad',
+            'search_comment_ai', 'search_comment_au', 'search_comment_ad']
+
+
+def upgrade():
+    # FTS5 есть только в SQLite; на других СУБД поиск отключен
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for statement in SCHEMA_STATEMENTS:
+        op.execute(statement)
+    for statement in POPULATE_STATEMENTS:
+        op.execute(statement)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for trigger in TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    op.execute("DROP TABLE IF EXISTS search_index")
@@ -0,0 +1,34 @@
+"""Add denormalized unread notifications counter to User
+
+Revision ID: a41c9e2d7b10
+Revises: 297dc083222a
+Create Date: 2026-10-18 10:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a41c9e2d7b10'
+down_revision = '297dc083222a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('unread_notifications_count', sa.Integer(),
+                                      server_default='0', nullable=False))
+
+    # Заполняем счетчик для существующих пользователей одним UPDATE
+    op.execute(
+        'UPDATE "user" SET unread_notifications_count = ('
+        'SELECT COUNT(*) FROM notification '
+        'WHERE notification.user_id = "user".id AND notification.is_read = false)'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('unread_notifications_count')
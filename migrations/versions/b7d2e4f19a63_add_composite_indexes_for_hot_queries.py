@@ -0,0 +1,46 @@
+"""Add composite indexes for hot query paths
+
+Revision ID: b7d2e4f19a63
+Revises: a41c9e2d7b10
+Create Date: 2026-10-18 11:02:15.530871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2e4f19a63'
+down_revision = 'a41c9e2d7b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Порядок задач на странице проекта (см. TASK_PAGE_ORDER в app/projects/routes.py)
+    op.create_index('ix_task_project_order', 'task',
+                    ['project_id', 'status', sa.text('priority DESC'),
+                     sa.text('created_at DESC'), sa.text('id DESC')], unique=False)
+    op.create_index('ix_task_assignee_id', 'task', ['assignee_id'], unique=False)
+    op.create_index('ix_comment_task_created', 'comment', ['task_id', 'created_at'], unique=False)
+    op.create_index('ix_file_task_id', 'file', ['task_id'], unique=False)
+    op.create_index('ix_file_project_id', 'file', ['project_id'], unique=False)
+    op.create_index('ix_project_owner_created', 'project', ['owner_id', 'created_at'], unique=False)
+    op.create_index('ix_notification_user_read_timestamp', 'notification',
+                    ['user_id', 'is_read', 'timestamp'], unique=False)
+    op.create_index('ix_notification_user_timestamp', 'notification',
+                    ['user_id', 'timestamp', 'id'], unique=False)
+    op.create_index('ix_project_members_project_user', 'project_members',
+                    ['project_id', 'user_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_project_members_project_user', table_name='project_members')
+    op.drop_index('ix_notification_user_timestamp', table_name='notification')
+    op.drop_index('ix_notification_user_read_timestamp', table_name='notification')
+    op.drop_index('ix_project_owner_created', table_name='project')
+    op.drop_index('ix_file_project_id', table_name='file')
+    op.drop_index('ix_file_task_id', table_name='file')
+    op.drop_index('ix_comment_task_created', table_name='comment')
+    op.drop_index('ix_task_assignee_id', table_name='task')
+    op.drop_index('ix_task_project_order', table_name='task')
@@ -0,0 +1,26 @@
+"""Add data_version to Project for report cache invalidation
+
+Revision ID: c3f81a6d5e27
+Revises: b7d2e4f19a63
+Create Date: 2026-10-18 11:47:03.904512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f81a6d5e27'
+down_revision = 'b7d2e4f19a63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('project', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('data_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('project', schema=None) as batch_op:
+        batch_op.drop_column('data_version')
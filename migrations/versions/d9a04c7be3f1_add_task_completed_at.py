@@ -0,0 +1,31 @@
+"""Add completed_at to Task for time-series reporting
+
+Revision ID: d9a04c7be3f1
+Revises: c3f81a6d5e27
+Create Date: 2026-10-18 12:21:38.477160
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9a04c7be3f1'
+down_revision = 'c3f81a6d5e27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('completed_at', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_task_completed_at'), ['completed_at'], unique=False)
+
+    # Для уже выполненных задач точный момент неизвестен - берем дату создания как приближение
+    op.execute("UPDATE task SET completed_at = created_at WHERE status = 'DONE'")
+
+
+def downgrade():
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_task_completed_at'))
+        batch_op.drop_column('completed_at')
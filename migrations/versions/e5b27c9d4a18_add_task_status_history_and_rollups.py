@@ -0,0 +1,65 @@
+"""Add append-only task status history and daily rollups
+
+Revision ID: e5b27c9d4a18
+Revises: d9a04c7be3f1
+Create Date: 2026-10-18 13:05:12.304519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b27c9d4a18'
+down_revision = 'd9a04c7be3f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('task_status_event',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('task_id', sa.Integer(), nullable=False),
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('from_status', sa.SmallInteger(), nullable=True),
+    sa.Column('to_status', sa.SmallInteger(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('task_status_event', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_task_status_event_task_id'), ['task_id'], unique=False)
+
+    op.create_table('task_status_daily',
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('status', sa.SmallInteger(), nullable=False),
+    sa.Column('entered', sa.Integer(), nullable=False),
+    sa.Column('left', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('project_id', 'day', 'status')
+    )
+    op.create_table('analytics_watermark',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('last_event_id', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+    # Начальная история: по одному событию "создана в текущем статусе" на каждую существующую задачу
+    op.execute("""
+        INSERT INTO task_status_event (task_id, project_id, user_id, from_status, to_status, created_at)
+        SELECT id, project_id, NULL, NULL,
+               CASE status WHEN 'TODO' THEN 1 WHEN 'IN_PROGRESS' THEN 2
+                           WHEN 'DONE' THEN 3 WHEN 'ARCHIVED' THEN 4 END,
+               COALESCE(created_at, CURRENT_TIMESTAMP) -- task.created_at допускает NULL
+        FROM task ORDER BY id
+    """)
+
+
+def downgrade():
+    op.drop_table('analytics_watermark')
+    op.drop_table('task_status_daily')
+    with op.batch_alter_table('task_status_event', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_task_status_event_task_id'))
+
+    op.drop_table('task_status_event')
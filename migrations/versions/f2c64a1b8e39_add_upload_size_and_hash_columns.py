@@ -0,0 +1,34 @@
+"""Add file size/hash and per-project upload limit for chunked uploads
+
+Revision ID: f2c64a1b8e39
+Revises: e5b27c9d4a18
+Create Date: 2026-10-18 13:48:27.915036
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c64a1b8e39'
+down_revision = 'e5b27c9d4a18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('file', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('size', sa.BigInteger(), nullable=True))
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+
+    with op.batch_alter_table('project', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('max_upload_size', sa.BigInteger(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('project', schema=None) as batch_op:
+        batch_op.drop_column('max_upload_size')
+
+    with op.batch_alter_table('file', schema=None) as batch_op:
+        batch_op.drop_column('content_hash')
+        batch_op.drop_column('size')